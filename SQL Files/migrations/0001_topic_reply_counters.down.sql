@@ -0,0 +1,3 @@
+ALTER TABLE `topics`
+  DROP COLUMN `reply_count`,
+  DROP COLUMN `last_reply_at`;
@@ -0,0 +1,16 @@
+--
+-- Reply counters kept on `topics` by replies_services.create_reply
+--
+
+ALTER TABLE `topics`
+  ADD COLUMN `reply_count` int(11) NOT NULL DEFAULT 0,
+  ADD COLUMN `last_reply_at` datetime DEFAULT NULL;
+
+--
+-- Backfill from existing replies (same as `python manage.py repair-counters`)
+--
+
+UPDATE `topics` t
+  LEFT JOIN (SELECT `topics_id_topic`, COUNT(*) AS `reply_count`, MAX(`created_on`) AS `last_reply_at`
+             FROM `replies` GROUP BY `topics_id_topic`) r ON r.`topics_id_topic` = t.`id_topic`
+  SET t.`reply_count` = COALESCE(r.`reply_count`, 0), t.`last_reply_at` = r.`last_reply_at`;
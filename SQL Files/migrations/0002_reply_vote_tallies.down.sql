@@ -0,0 +1,3 @@
+ALTER TABLE `replies`
+  DROP COLUMN `upvotes`,
+  DROP COLUMN `downvotes`;
@@ -0,0 +1,16 @@
+--
+-- Vote tallies kept on `replies` by replies_services.new_vote/update_vote/remove_vote
+--
+
+ALTER TABLE `replies`
+  ADD COLUMN `upvotes` int(11) NOT NULL DEFAULT 0,
+  ADD COLUMN `downvotes` int(11) NOT NULL DEFAULT 0;
+
+--
+-- Backfill from existing votes (same as `python manage.py repair-votes`)
+--
+
+UPDATE `replies` r
+  LEFT JOIN (SELECT `replies_id_reply`, SUM(`is_upvote` = 1) AS `upvotes`, SUM(`is_upvote` = -1) AS `downvotes`
+             FROM `votes` GROUP BY `replies_id_reply`) v ON v.`replies_id_reply` = r.`id_reply`
+  SET r.`upvotes` = COALESCE(v.`upvotes`, 0), r.`downvotes` = COALESCE(v.`downvotes`, 0);
@@ -0,0 +1,2 @@
+ALTER TABLE `topics` DROP KEY `ft_topics_title`;
+ALTER TABLE `replies` DROP KEY `ft_replies_content`;
@@ -0,0 +1,6 @@
+--
+-- FULLTEXT indexes behind topics_services.view_all_topics search (MATCH ... AGAINST in boolean mode)
+--
+
+ALTER TABLE `topics` ADD FULLTEXT KEY `ft_topics_title` (`title`);
+ALTER TABLE `replies` ADD FULLTEXT KEY `ft_replies_content` (`content`);
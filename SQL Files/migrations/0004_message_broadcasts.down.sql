@@ -0,0 +1 @@
+DROP TABLE `message_broadcasts`;
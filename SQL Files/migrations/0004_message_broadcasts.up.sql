@@ -0,0 +1,22 @@
+--
+-- Outbox of admin broadcasts, delivered in chunks by services.broadcast_services.
+-- `last_recipient` is the highest user id delivered so far, so a restarted worker resumes where it stopped.
+--
+
+CREATE TABLE `message_broadcasts` (
+  `id_broadcast` int(11) NOT NULL AUTO_INCREMENT,
+  `id_message` int(11) NOT NULL,
+  `id_category` int(11) DEFAULT NULL,
+  `status` varchar(10) NOT NULL DEFAULT 'pending',
+  `total_recipients` int(11) NOT NULL DEFAULT 0,
+  `delivered` int(11) NOT NULL DEFAULT 0,
+  `last_recipient` int(11) NOT NULL DEFAULT 0,
+  `created_on` datetime NOT NULL,
+  `finished_on` datetime DEFAULT NULL,
+  PRIMARY KEY (`id_broadcast`),
+  KEY `idx_message_broadcasts_status` (`status`),
+  KEY `fk_message_broadcasts_messages1_idx` (`id_message`),
+  KEY `fk_message_broadcasts_categories1_idx` (`id_category`),
+  CONSTRAINT `fk_message_broadcasts_messages1` FOREIGN KEY (`id_message`) REFERENCES `messages` (`id_message`) ON DELETE NO ACTION ON UPDATE NO ACTION,
+  CONSTRAINT `fk_message_broadcasts_categories1` FOREIGN KEY (`id_category`) REFERENCES `categories` (`id_category`) ON DELETE NO ACTION ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
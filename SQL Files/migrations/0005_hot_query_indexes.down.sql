@@ -0,0 +1,13 @@
+ALTER TABLE `topics`
+  DROP KEY `idx_topics_category_title`,
+  DROP KEY `idx_topics_created_on`;
+
+ALTER TABLE `replies`
+  DROP KEY `idx_replies_topic_created_on`,
+  DROP KEY `idx_replies_created_on`;
+
+ALTER TABLE `votes` DROP KEY `idx_votes_reply_upvote`;
+
+ALTER TABLE `messages` DROP KEY `idx_messages_author_subject`;
+
+ALTER TABLE `private_categories` DROP KEY `idx_private_categories_user_access`;
@@ -0,0 +1,30 @@
+--
+-- Composite indexes for the hot filters and sorts in services/*; InnoDB appends the primary key
+-- to every secondary index, so the (..., id) keyset tie-breakers are covered as well.
+-- users_has_messages(id_recipient, id_message) is already its primary key.
+-- `python manage.py check-plans` EXPLAINs these queries and fails on a full scan.
+--
+
+-- categories_services.get_topics_by_cat_id: WHERE id_category = ? ORDER BY title, id_topic
+-- topics_services.view_all_topics sorted by date: ORDER BY created_on DESC, id_topic DESC
+ALTER TABLE `topics`
+  ADD KEY `idx_topics_category_title` (`id_category`, `title`),
+  ADD KEY `idx_topics_created_on` (`created_on`);
+
+-- topics_services.get_topic_replies: WHERE topics_id_topic = ? ORDER BY created_on DESC
+-- topics_services.view_all_topics sorted by date: ORDER BY created_on DESC, id_reply DESC
+ALTER TABLE `replies`
+  ADD KEY `idx_replies_topic_created_on` (`topics_id_topic`, `created_on`),
+  ADD KEY `idx_replies_created_on` (`created_on`);
+
+-- replies_services tallies and repair_vote_tallies: SUM(is_upvote ...) per reply, from the index alone
+ALTER TABLE `votes`
+  ADD KEY `idx_votes_reply_upvote` (`replies_id_reply`, `is_upvote`);
+
+-- messages_services.get_messages_user: WHERE id_author = ?, partitioned by subject
+ALTER TABLE `messages`
+  ADD KEY `idx_messages_author_subject` (`id_author`, `subject`);
+
+-- access_services: a user's private categories and write access, from the index alone
+ALTER TABLE `private_categories`
+  ADD KEY `idx_private_categories_user_access` (`users_id_user`, `categories_id_category`, `has_write_access`);
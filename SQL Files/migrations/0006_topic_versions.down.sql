@@ -0,0 +1,4 @@
+ALTER TABLE `topics`
+  DROP KEY `idx_topics_category_version`,
+  DROP COLUMN `version`,
+  DROP COLUMN `updated_on`;
@@ -0,0 +1,11 @@
+--
+-- Row version of a topic page: bumped with every change that shows on it (edit, lock, replies, best reply, votes),
+-- so the topic and category pages can answer conditional GETs without loading the replies
+--
+
+ALTER TABLE `topics`
+  ADD COLUMN `version` int(11) NOT NULL DEFAULT 0,
+  ADD COLUMN `updated_on` datetime DEFAULT NULL,
+  ADD KEY `idx_topics_category_version` (`id_category`, `version`, `updated_on`);
+
+UPDATE `topics` SET `updated_on` = GREATEST(`created_on`, COALESCE(`last_reply_at`, `created_on`));
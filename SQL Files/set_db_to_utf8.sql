@@ -42,6 +42,41 @@ LOCK TABLES `categories` WRITE;
 /*!40000 ALTER TABLE `categories` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `message_broadcasts`
+--
+
+DROP TABLE IF EXISTS `message_broadcasts`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `message_broadcasts` (
+  `id_broadcast` int(11) NOT NULL AUTO_INCREMENT,
+  `id_message` int(11) NOT NULL,
+  `id_category` int(11) DEFAULT NULL,
+  `status` varchar(10) NOT NULL DEFAULT 'pending',
+  `total_recipients` int(11) NOT NULL DEFAULT 0,
+  `delivered` int(11) NOT NULL DEFAULT 0,
+  `last_recipient` int(11) NOT NULL DEFAULT 0,
+  `created_on` datetime NOT NULL,
+  `finished_on` datetime DEFAULT NULL,
+  PRIMARY KEY (`id_broadcast`),
+  KEY `idx_message_broadcasts_status` (`status`),
+  KEY `fk_message_broadcasts_messages1_idx` (`id_message`),
+  KEY `fk_message_broadcasts_categories1_idx` (`id_category`),
+  CONSTRAINT `fk_message_broadcasts_messages1` FOREIGN KEY (`id_message`) REFERENCES `messages` (`id_message`) ON DELETE NO ACTION ON UPDATE NO ACTION,
+  CONSTRAINT `fk_message_broadcasts_categories1` FOREIGN KEY (`id_category`) REFERENCES `categories` (`id_category`) ON DELETE NO ACTION ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `message_broadcasts`
+--
+
+LOCK TABLES `message_broadcasts` WRITE;
+/*!40000 ALTER TABLE `message_broadcasts` DISABLE KEYS */;
+/*!40000 ALTER TABLE `message_broadcasts` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `messages`
 --
@@ -58,6 +93,7 @@ CREATE TABLE `messages` (
   `id_author` int(11) NOT NULL,
   PRIMARY KEY (`id_message`),
   KEY `fk_messages_users1_idx` (`id_author`),
+  KEY `idx_messages_author_subject` (`id_author`,`subject`),
   CONSTRAINT `fk_messages_users1` FOREIGN KEY (`id_author`) REFERENCES `users` (`id_user`) ON DELETE NO ACTION ON UPDATE NO ACTION
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -85,6 +121,7 @@ CREATE TABLE `private_categories` (
   PRIMARY KEY (`categories_id_category`,`users_id_user`),
   KEY `fk_categories_has_users_users1_idx` (`users_id_user`),
   KEY `fk_categories_has_users_categories_idx` (`categories_id_category`),
+  KEY `idx_private_categories_user_access` (`users_id_user`,`categories_id_category`,`has_write_access`),
   CONSTRAINT `fk_categories_has_users_categories` FOREIGN KEY (`categories_id_category`) REFERENCES `categories` (`id_category`) ON DELETE CASCADE ON UPDATE NO ACTION,
   CONSTRAINT `fk_categories_has_users_users1` FOREIGN KEY (`users_id_user`) REFERENCES `users` (`id_user`) ON DELETE CASCADE ON UPDATE NO ACTION
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
@@ -113,9 +150,14 @@ CREATE TABLE `replies` (
   `users_id_user` int(11) NOT NULL,
   `created_on` datetime NOT NULL,
   `is_best` tinyint(1) NOT NULL DEFAULT 0,
+  `upvotes` int(11) NOT NULL DEFAULT 0,
+  `downvotes` int(11) NOT NULL DEFAULT 0,
   PRIMARY KEY (`id_reply`),
   KEY `fk_table1_topics1_idx` (`topics_id_topic`),
   KEY `fk_replies_users1_idx` (`users_id_user`),
+  KEY `idx_replies_topic_created_on` (`topics_id_topic`,`created_on`),
+  KEY `idx_replies_created_on` (`created_on`),
+  FULLTEXT KEY `ft_replies_content` (`content`),
   CONSTRAINT `fk_replies_users1` FOREIGN KEY (`users_id_user`) REFERENCES `users` (`id_user`) ON UPDATE NO ACTION,
   CONSTRAINT `fk_table1_topics1` FOREIGN KEY (`topics_id_topic`) REFERENCES `topics` (`id_topic`) ON UPDATE NO ACTION
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
@@ -130,6 +172,31 @@ LOCK TABLES `replies` WRITE;
 /*!40000 ALTER TABLE `replies` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `schema_migrations`
+--
+
+DROP TABLE IF EXISTS `schema_migrations`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `schema_migrations` (
+  `version` int(11) NOT NULL,
+  `name` varchar(100) NOT NULL,
+  `applied_on` datetime NOT NULL,
+  PRIMARY KEY (`version`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `schema_migrations`
+--
+
+LOCK TABLES `schema_migrations` WRITE;
+/*!40000 ALTER TABLE `schema_migrations` DISABLE KEYS */;
+INSERT INTO `schema_migrations` VALUES (1,'topic_reply_counters','2023-10-19 14:21:31'),(2,'reply_vote_tallies','2023-10-19 14:21:31'),(3,'fulltext_search','2023-10-19 14:21:31'),(4,'message_broadcasts','2023-10-19 14:21:31'),(5,'hot_query_indexes','2023-10-19 14:21:31'),(6,'topic_versions','2023-10-19 14:21:31');
+/*!40000 ALTER TABLE `schema_migrations` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `topics`
 --
@@ -145,10 +212,18 @@ CREATE TABLE `topics` (
   `id_category` int(11) NOT NULL,
   `id_author` int(11) NOT NULL,
   `is_locked` tinyint(1) NOT NULL DEFAULT 0,
+  `reply_count` int(11) NOT NULL DEFAULT 0,
+  `last_reply_at` datetime DEFAULT NULL,
+  `version` int(11) NOT NULL DEFAULT 0,
+  `updated_on` datetime DEFAULT NULL,
   PRIMARY KEY (`id_topic`),
   UNIQUE KEY `title_UNIQUE` (`title`),
   KEY `fk_topics_categories1_idx` (`id_category`),
   KEY `fk_topics_users1_idx` (`id_author`),
+  KEY `idx_topics_category_title` (`id_category`,`title`),
+  KEY `idx_topics_created_on` (`created_on`),
+  KEY `idx_topics_category_version` (`id_category`,`version`,`updated_on`),
+  FULLTEXT KEY `ft_topics_title` (`title`),
   CONSTRAINT `fk_topics_categories1` FOREIGN KEY (`id_category`) REFERENCES `categories` (`id_category`) ON UPDATE NO ACTION,
   CONSTRAINT `fk_topics_users1` FOREIGN KEY (`id_author`) REFERENCES `users` (`id_user`) ON UPDATE NO ACTION
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
@@ -232,6 +307,7 @@ CREATE TABLE `votes` (
   PRIMARY KEY (`replies_id_reply`,`users_id_user`),
   KEY `fk_replies_has_users_users1_idx` (`users_id_user`),
   KEY `fk_replies_has_users_replies1_idx` (`replies_id_reply`),
+  KEY `idx_votes_reply_upvote` (`replies_id_reply`,`is_upvote`),
   CONSTRAINT `fk_replies_has_users_replies1` FOREIGN KEY (`replies_id_reply`) REFERENCES `replies` (`id_reply`) ON UPDATE NO ACTION,
   CONSTRAINT `fk_replies_has_users_users1` FOREIGN KEY (`users_id_user`) REFERENCES `users` (`id_user`) ON UPDATE NO ACTION
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
@@ -0,0 +1,83 @@
+'''Login and refresh latency with the refresh token bound to its access token by bcrypt (before)
+and by a keyed HMAC (after). No database is needed: the user is served from the auth cache.
+
+    python -m benchmarks.auth_tokens_bench [rounds]
+'''
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+os.environ.setdefault("FORUM_SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("FORUM_ALGORITHM", "HS256")
+
+from jose import jwt
+from common import auth
+from models.user import User
+
+
+PASSWORD = "2Wsx3edc+"
+
+
+def bcrypt_token_response(user: User):
+    '''token_response as it was before the HMAC binding'''
+    access_token = auth.create_access_token(
+        data={"sub": user.username, "is_admin": user.is_admin},
+        expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES))
+    refresh_token = auth.create_refresh_token(
+        data={"sub": user.username, "access_token": auth.get_password_hash(access_token)},
+        expires_delta=timedelta(minutes=auth.REFRESH_TOKEN_EXPIRE_MINUTES))
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+async def bcrypt_refresh(access_token: str, refresh_token: str):
+    payload = jwt.decode(refresh_token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    assert auth.verify_password(access_token, payload["access_token"])
+    return await auth.find_user(payload["sub"])
+
+
+def measure(func, rounds: int) -> list[float]:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<18} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main(rounds: int):
+    loop = asyncio.new_event_loop()
+    user = User(id=1, username="benchmark", password=auth.get_password_hash(PASSWORD), is_admin=0)
+    auth.user_cache.set(user.username, user)
+
+    def login(token_response):
+        def run():
+            assert auth.verify_password(PASSWORD, user.password)
+            token_response(user)
+        return run
+
+    def refresh(token_response, verify):
+        tokens = token_response(user)
+        def run():
+            loop.run_until_complete(verify(tokens["access_token"], tokens["refresh_token"]))
+            token_response(user)
+        return run
+
+    print(f"{rounds} rounds each")
+    report("login  (bcrypt)", measure(login(bcrypt_token_response), rounds))
+    report("login  (hmac)", measure(login(auth.token_response), rounds))
+    report("refresh (bcrypt)", measure(refresh(bcrypt_token_response, bcrypt_refresh), rounds))
+    report("refresh (hmac)", measure(refresh(auth.token_response, auth.refresh_access_token), rounds))
+    loop.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,103 @@
+'''Requests/sec on a trivial endpoint with no token middleware, with the old BaseHTTPMiddleware
+implementation and with the ASGI TokenValidationMiddleware. Requests are fed straight into the
+ASGI app, so the numbers are the framework and middleware overhead only.
+
+    python -m benchmarks.middleware_bench [requests]
+'''
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import Mock
+
+os.environ.setdefault("FORUM_SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("FORUM_ALGORITHM", "HS256")
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, RedirectResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from common import auth
+
+
+class BaseHTTPTokenValidationMiddleware(BaseHTTPMiddleware):
+    '''TokenValidationMiddleware as it was before the ASGI rewrite'''
+
+    async def dispatch(self, request: Request, call_next):
+        request.state.principal = None
+        access_token = request.cookies.get("access_token")
+        if request.url.path in auth.TokenValidationMiddleware.bypass or not access_token or access_token == auth.DUMMY_ACCESS_TOKEN:
+            return await call_next(request)
+        try:
+            request.state.principal = await auth.decode_principal(access_token)
+        except Exception:
+            return RedirectResponse(url="/users/token/refresh", status_code=303)
+        return await call_next(request)
+
+
+def build_app(middleware=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping(request: Request):
+        return PlainTextResponse("pong")
+
+    if middleware:
+        app.add_middleware(middleware)
+    return app
+
+
+async def drive(app, cookie: bytes, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"cookie", cookie)],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message["status"]
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # a client that stays connected
+            await asyncio.Event().wait()
+
+        await app(dict(scope), receive, send)
+    return requests / (time.perf_counter() - start)
+
+
+def main(requests: int):
+    user = Mock(id=1, username="benchmark", is_admin=0)
+    access_token = auth.token_response(user)["access_token"]
+    cookie = f"access_token={access_token}".encode()
+
+    print(f"{requests} requests each, signed-in cookie")
+    for name, middleware in (
+        ("no middleware", None),
+        ("BaseHTTPMiddleware", BaseHTTPTokenValidationMiddleware),
+        ("ASGI middleware", auth.TokenValidationMiddleware),
+    ):
+        app = build_app(middleware)
+        asyncio.run(drive(app, cookie, requests // 10))
+        rate = asyncio.run(drive(app, cookie, requests))
+        print(f"{name:<20} {rate:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,104 @@
+'''Search latency over a large replies table: the old leading-wildcard LIKE scan against
+MATCH ... AGAINST on a FULLTEXT index, both returning the first page of 10.
+
+Needs a local MariaDB (same credentials as the app). The data goes into a scratch schema,
+FORUM_BENCH_DB (default ktg_forum_bench), and is reused by later runs of the same size.
+
+    python -m benchmarks.search_bench [replies] [rounds]
+'''
+import os
+import random
+import statistics
+import sys
+import time
+from mariadb import connect
+
+
+BENCH_DB = os.environ.get("FORUM_BENCH_DB", "ktg_forum_bench")
+BATCH_SIZE = 10_000
+WORDS_PER_REPLY = 30
+VOCABULARY_SIZE = 50_000
+
+
+def bench_connect(database=None):
+    return connect(
+        user='root',
+        password=os.environ.get("mariadb_root_pwd"),
+        host='localhost',
+        port=3306,
+        database=database,
+        autocommit=True,
+    )
+
+
+def vocabulary(rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+def load(conn, replies: int, words: list[str], rng: random.Random):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM replies")
+    if cursor.fetchone()[0] == replies:
+        return
+    print(f"loading {replies} replies ...")
+    cursor.execute("DROP TABLE IF EXISTS replies")
+    cursor.execute('''CREATE TABLE replies (
+                        id_reply int(11) NOT NULL AUTO_INCREMENT,
+                        content longtext NOT NULL,
+                        created_on datetime NOT NULL,
+                        PRIMARY KEY (id_reply)) ENGINE=InnoDB''')
+    # a zipf-like draw, so some words are common and most are rare, as in real text
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    for start in range(0, replies, BATCH_SIZE):
+        rows = [(' '.join(rng.choices(words, weights, k=WORDS_PER_REPLY)), '2023-10-19 10:00:00')
+                for _ in range(min(BATCH_SIZE, replies - start))]
+        cursor.executemany("INSERT INTO replies (content, created_on) VALUES (?, ?)", rows)
+    print("building FULLTEXT index ...")
+    cursor.execute("ALTER TABLE replies ADD FULLTEXT KEY ft_replies_content (content)")
+
+
+def measure(conn, sql: str, params: tuple, rounds: int) -> float:
+    cursor = conn.cursor()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(replies: int, rounds: int):
+    rng = random.Random(42)
+    words = vocabulary(rng)
+
+    with bench_connect() as conn:
+        conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {BENCH_DB}")
+    with bench_connect(BENCH_DB) as conn:
+        conn.cursor().execute("CREATE TABLE IF NOT EXISTS replies (id_reply int(11) NOT NULL AUTO_INCREMENT PRIMARY KEY)")
+        load(conn, replies, words, rng)
+
+        searches = {
+            "common word": [words[0]],
+            "rare word": [words[len(words) // 2]],
+            "two words": [words[10], words[5000]],
+        }
+        print(f"{replies} replies, median of {rounds} rounds")
+        for name, terms in searches.items():
+            like_sql = ("SELECT id_reply, content FROM replies WHERE "
+                        + " or ".join("content like ?" for _ in terms)
+                        + " ORDER BY created_on DESC LIMIT 10")
+            like_ms = measure(conn, like_sql, tuple(f"%{term}%" for term in terms), rounds)
+
+            against = ' '.join(f"{term}*" for term in terms)
+            match_sql = '''SELECT id_reply, content FROM replies
+                           WHERE MATCH(content) AGAINST (? IN BOOLEAN MODE)
+                           ORDER BY MATCH(content) AGAINST (? IN BOOLEAN MODE) DESC, created_on DESC LIMIT 10'''
+            match_ms = measure(conn, match_sql, (against, against), rounds)
+            print(f"{name:<12} LIKE {like_ms:10.2f} ms   FULLTEXT {match_ms:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 5)
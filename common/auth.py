@@ -1,4 +1,4 @@
-from models.user import User
+from models.user import User, Principal
 from typing import Annotated
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
@@ -7,12 +7,16 @@ import re
 import common.responses as responses
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from data.database import read_query
+from data.async_database import read_query
+from common.cache import TTLCache
+from common.executor import BoundedExecutor, ExecutorBusy
+from common import tracing
 from datetime import datetime, timedelta
-import time
+import hashlib
+import hmac
 from jose import JWTError, jwt
 import os
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 
 
@@ -21,6 +25,11 @@ ALGORITHM = os.environ.get("FORUM_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 2
 REFRESH_TOKEN_EXPIRE_MINUTES = 3000
 DUMMY_ACCESS_TOKEN = "dummy_access_token"
+USER_CACHE_TTL_SECONDS = float(os.environ.get("FORUM_USER_CACHE_TTL", 60))
+USER_CACHE_MAX_SIZE = int(os.environ.get("FORUM_USER_CACHE_SIZE", 10000))
+HASHING_MAX_WORKERS = int(os.environ.get("FORUM_HASHING_WORKERS", os.cpu_count() or 1))
+HASHING_MAX_PENDING = int(os.environ.get("FORUM_HASHING_MAX_PENDING", 32))
+HASHING_WAIT_TIMEOUT = float(os.environ.get("FORUM_HASHING_WAIT_TIMEOUT", 5))
 
 
 
@@ -50,27 +59,91 @@ def verify_password(password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+
+# bcrypt is CPU-bound and releases the GIL while hashing, so it runs on its own small thread pool;
+# when the pool and its queue are full, callers get a 503 instead of piling up behind it
+_hashing_executor = BoundedExecutor(
+    "hashing",
+    max_workers=HASHING_MAX_WORKERS,
+    max_pending=HASHING_MAX_PENDING,
+    wait_timeout=HASHING_WAIT_TIMEOUT,
+)
+
+
+def hashing_stats() -> dict:
+    return _hashing_executor.stats()
+
+
+async def _run_hashing(func, *args):
+    try:
+        with tracing.span("hashing"):
+            return await _hashing_executor.run(func, *args)
+    except ExecutorBusy:
+        raise HTTPException(
+            status_code=responses.ServiceUnavailable().status_code,
+            detail="Too many sign-ins in progress, please try again",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def verify_password_async(password, hashed_password):
+    return await _run_hashing(verify_password, password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_hashing(get_password_hash, password)
+
 def get_time():
     return datetime.utcnow()    
 
 
-def find_user (username:str):
-    user_db = read_query("select id_user, username, password, is_admin from users where username=?",(username,))
+# users by lowercased username (the column compares case-insensitively), so authenticated requests
+# don't query the users table every time
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+async def find_user (username:str):
+    user = user_cache.get(username.lower())
+    if user is not None:
+        return user
+    # a user changed and invalidated while this read runs is not cached as it was
+    generation = user_cache.generation
+    user_db = await read_query("select id_user, username, password, is_admin from users where username=?",(username,))
     if len(user_db) == 0:
         return
     id_db, username_db, password_db, is_admin_db = user_db[0]
     user = User(id = id_db, username = username_db, password = password_db, is_admin = is_admin_db)
+    user_cache.set(username.lower(), user, generation)
     return user
 
 
-def authenticate_user(username: str, password: str):
-    user = find_user(username)
+def invalidate_user(username: str | None = None, user_id: int | None = None):
+    '''drop a cached user after its row changed'''
+    if username is not None:
+        user_cache.pop(username.lower())
+    if user_id is not None:
+        user_cache.pop_where(lambda user: user.id == user_id)
+
+
+async def authenticate_user(username: str, password: str):
+    user = await find_user(username)
     if not user:
         return 
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         return 
     return user
 
+def bind_access_token(access_token: str) -> str:
+    '''keyed fingerprint of the access token a refresh token is issued for'''
+    key = f"{SECRET_KEY}:refresh-binding".encode()
+    return hmac.new(key, access_token.encode(), hashlib.sha256).hexdigest()
+
+async def access_token_matches(access_token: str, binding: str) -> bool:
+    if binding.startswith("$2"):
+        # refresh tokens issued before the HMAC binding carry a bcrypt hash of the access token
+        return await verify_password_async(access_token, binding)
+    return hmac.compare_digest(bind_access_token(access_token), binding)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -100,10 +173,10 @@ def token_response(user: User|None = None):
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "is_admin": user.is_admin}, expires_delta=access_token_expires
+        data={"sub": user.username, "id": user.id, "is_admin": user.is_admin}, expires_delta=access_token_expires
     )
     refresh_token_expires = timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
-    modified_access_token = get_password_hash(access_token)
+    modified_access_token = bind_access_token(access_token)
     refresh_token = create_refresh_token(data={"sub": user.username, "access_token": modified_access_token}, expires_delta=refresh_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
@@ -123,7 +196,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = find_user(username=token_data.username)
+    user = await find_user(username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -138,7 +211,9 @@ async def refresh_access_token(access_token: str, refresh_token: str):
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         modified_access_token = payload.get("access_token") 
         try:
-            verified_access_token = verify_password(access_token, modified_access_token) 
+            verified_access_token = await access_token_matches(access_token, modified_access_token)
+        except HTTPException:
+            raise
         except:
             raise credentials_exception
         if not verified_access_token:
@@ -149,35 +224,69 @@ async def refresh_access_token(access_token: str, refresh_token: str):
         token_data = TokenData(username=username)
     except JWTError as err:
         raise credentials_exception
-    user = find_user(username=token_data.username)
+    user = await find_user(username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
 
-class TokenValidationMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        bypass = ["/users/token", "/users", "/users/guest", "/users/token/refresh"]
-        if request.url.path in bypass:
-            response = await call_next(request)
-            return response
-        else:
-            access_token = request.cookies.get("access_token")
+async def decode_principal(token: str) -> Principal | None:
+    '''Principal of a valid access token, None when the token is not an access token.
+    Raises JWTError when the token is malformed, tampered with or expired.'''
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is None or payload.get("access_token") is not None:
+        return
+    user_id = payload.get("id")
+    if user_id is None:
+        # tokens issued before the id claim was added
+        user = await find_user(username)
+        if user is None:
+            return
+        return Principal(id=user.id, username=user.username, is_admin=user.is_admin)
+    return Principal(id=user_id, username=username, is_admin=payload.get("is_admin") or 0)
+
+
+def get_optional_principal(request: Request) -> Principal | None:
+    '''the principal TokenValidationMiddleware attached to the request; None for guests'''
+    return getattr(request.state, "principal", None)
+
+
+def get_principal(request: Request) -> Principal:
+    principal = get_optional_principal(request)
+    if principal is None:
+        raise HTTPException(
+            status_code=responses.Unauthorized().status_code,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+
+class TokenValidationMiddleware:
+    '''Plain ASGI middleware: the access token cookie is decoded here once and the result is left
+    on request.state.principal for get_principal; expired or invalid tokens are sent to the refresh endpoint.'''
+
+    bypass = {"/users/token", "/users", "/users/guest", "/users/token/refresh"}
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        request.state.principal = None
+        access_token = request.cookies.get("access_token")
+        if request.url.path in self.bypass or not access_token or access_token == DUMMY_ACCESS_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        try:
+            with tracing.span("auth"):
+                request.state.principal = await decode_principal(access_token)
+        except Exception:
             refresh_token = request.cookies.get("refresh_token")
-            
-            if not access_token or access_token == DUMMY_ACCESS_TOKEN:
-                response = await call_next(request)
-                return response
-            
-            else:
-                try:
-                    decoded_access_token = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-                    if decoded_access_token:
-                        if decoded_access_token.get("exp") > int(time.time()):
-                            response = await call_next(request)
-                            return response   
-                        else:
-                            return RedirectResponse(url=f"/users/token/refresh?redirect={request.url.path}&access_token={access_token}&refresh_token={refresh_token}", status_code=303)      
-                    else:
-                        return RedirectResponse(url=f"/users/token/refresh?redirect={request.url.path}&access_token={access_token}&refresh_token={refresh_token}", status_code=303)
-                except Exception as exc:
-                    return RedirectResponse(url=f"/users/token/refresh?redirect={request.url.path}&access_token={access_token}&refresh_token={refresh_token}", status_code=303)   
+            response = RedirectResponse(url=f"/users/token/refresh?redirect={request.url.path}&access_token={access_token}&refresh_token={refresh_token}", status_code=303)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
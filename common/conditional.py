@@ -0,0 +1,58 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+
+# part of every version ETag; set it per deploy so pages rendered by older templates are not revalidated
+RELEASE = os.environ.get("FORUM_RELEASE", "")
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    '''If-None-Match against etag with the weak comparison RFC 9110 asks for on GET'''
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(candidate == "*" or candidate.removeprefix("W/") == opaque
+               for candidate in (part.strip() for part in if_none_match.split(",")))
+
+
+def weak_etag(*parts) -> str:
+    '''W/"..." of the values a page is rendered from, e.g. the row versions behind it'''
+    return 'W/"' + hashlib.blake2b(repr((RELEASE,) + parts).encode(), digest_size=16).hexdigest() + '"'
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None = None) -> bool:
+    '''If-None-Match decides when the client sent one, If-Modified-Since only otherwise'''
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return _utc(last_modified).replace(microsecond=0) <= _utc(since)
+
+
+def validator_headers(etag: str, last_modified: datetime | None = None) -> dict[str, str]:
+    '''ETag and Last-Modified of a page; no-cache makes the browser ask every time, with them'''
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag: str, last_modified: datetime | None = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
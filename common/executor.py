@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+class BoundedExecutor:
+    '''Runs blocking callables on a thread pool from async code, with backpressure.
+
+    max_workers  - callables running at the same time
+    max_pending  - callables allowed to queue for a free thread; further callers wait
+    wait_timeout - seconds a caller waits for a queue slot before ExecutorBusy is raised
+                   (None waits forever, 0 rejects immediately when the queue is full)
+    '''
+
+    def __init__(self, name: str, max_workers: int, max_pending: int = 0, wait_timeout: float | None = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {
+            'waiting': 0,
+            'queued': 0,
+            'running': 0,
+            'completed': 0,
+            'rejected': 0,
+        }
+
+    async def run(self, func, *args, **kwargs):
+        '''Runs func(*args, **kwargs) on the pool; contextvars of the caller are visible inside func.
+        A thread can't be interrupted: a caller cancelled once func started waits for it to return before
+        CancelledError goes on, so its cleanup doesn't overlap func and the slot is held until then.'''
+        return await self._run(None, func, args, kwargs)
+
+    async def run_owned(self, release, func, *args, **kwargs):
+        '''run, for a func returning something that has to be given back, like a checked-out connection:
+        if the caller is cancelled, release(result) is called on the pool once func returned.'''
+        return await self._run(release, func, args, kwargs)
+
+    async def _run(self, release, func, args, kwargs):
+        slots = self._loop_slots()
+        self._count('waiting', 1)
+        try:
+            if self.wait_timeout is None or not slots.locked():
+                await slots.acquire()
+            elif self.wait_timeout == 0:
+                raise ExecutorBusy(f'{self.name}: queue is full')
+            else:
+                try:
+                    await asyncio.wait_for(slots.acquire(), self.wait_timeout)
+                except asyncio.TimeoutError:
+                    raise ExecutorBusy(f'{self.name}: no free slot within {self.wait_timeout}s')
+        except ExecutorBusy:
+            self._count('rejected', 1)
+            raise
+        finally:
+            self._count('waiting', -1)
+
+        self._count('queued', 1)
+        try:
+            ctx = contextvars.copy_context()
+            call = functools.partial(ctx.run, self._call, func, args, kwargs)
+            future = asyncio.get_running_loop().run_in_executor(self._threads, call)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                await _finished(future)
+                if release is not None and not future.cancelled() and future.exception() is None:
+                    self._threads.submit(ctx.run, release, future.result())
+                raise
+        finally:
+            slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, 'max_workers': self.max_workers, 'max_pending': self.max_pending}
+
+    def shutdown(self):
+        self._threads.shutdown(wait=True)
+
+    def _call(self, func, args, kwargs):
+        with self._lock:
+            self._stats['queued'] -= 1
+            self._stats['running'] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._stats['running'] -= 1
+                self._stats['completed'] += 1
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        '''asyncio primitives are bound to one event loop, so every loop gets its own semaphore.'''
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_workers + self.max_pending)
+        return slots
+
+    def _count(self, key: str, delta: int):
+        with self._lock:
+            self._stats[key] += delta
+
+
+async def _finished(future: asyncio.Future):
+    '''waits until future is done, through any further cancellation'''
+    while not future.done():
+        try:
+            await asyncio.wait([future])
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlencode
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from common.auth import DUMMY_ACCESS_TOKEN
+from common.conditional import etag_matches
+from common.request_metrics import match_route
+
+
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("FORUM_PAGE_CACHE_BYTES", 32 * 1024 * 1024))
+PAGE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("FORUM_PAGE_CACHE_ENTRY_BYTES", 1024 * 1024))
+PAGE_CACHE_TTL_SECONDS = float(os.environ.get("FORUM_PAGE_CACHE_TTL", 300))
+# bookkeeping of an entry on top of its body and headers, roughly
+_ENTRY_OVERHEAD_BYTES = 512
+
+TOPICS_TAG = "topics"
+CATEGORIES_TAG = "categories"
+
+# the public views shared by every anonymous and guest visitor, and the tag each page starts with;
+# path params fill in the tag, the view adds the topics it shows with tag()
+CACHED_ROUTES = {
+    "/topics/": TOPICS_TAG,
+    "/topics/{id}": "topic:{id}",
+    "/categories/": CATEGORIES_TAG,
+    "/categories/{cat_id}": "category:{cat_id}",
+}
+
+
+def topic_tag(topic_id: int) -> str:
+    return f"topic:{topic_id}"
+
+
+def category_tag(category_id: int) -> str:
+    return f"category:{category_id}"
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class CachedPage(NamedTuple):
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+
+
+class PageCache:
+    '''Rendered pages by key, least recently used dropped first once their size passes max_bytes.
+    Every page carries tags (topic:5, category:2, topics...) and invalidate() drops the pages with any of them.
+    generation moves on every invalidation, so a page rendered from data read before one is not stored.'''
+
+    def __init__(self, max_bytes: int = PAGE_CACHE_MAX_BYTES, max_entry_bytes: int = PAGE_CACHE_MAX_ENTRY_BYTES,
+                 ttl: float = PAGE_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._pages: OrderedDict = OrderedDict()
+        self._tags: dict[str, set] = {}
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    @staticmethod
+    def size(page: CachedPage) -> int:
+        return len(page.body) + sum(len(name) + len(value) for name, value in page.headers) + _ENTRY_OVERHEAD_BYTES
+
+    def _drop(self, key):
+        page, tags, _ = self._pages.pop(key)
+        self._bytes -= self.size(page)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key) -> CachedPage | None:
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            page, _, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._pages.move_to_end(key)
+            self._stats['hits'] += 1
+            return page
+
+    def set(self, key, page: CachedPage, tags: set[str], generation: int) -> bool:
+        '''Stores page unless it is too big or something was invalidated since generation; returns whether it did.'''
+        size = self.size(page)
+        with self._lock:
+            if size > self.max_entry_bytes or generation != self.generation:
+                return False
+            if key in self._pages:
+                self._drop(key)
+            self._pages[key] = (page, frozenset(tags), time.monotonic() + self.ttl)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._pages)))
+                self._stats['evictions'] += 1
+            self._stats['stores'] += 1
+            return True
+
+    def invalidate(self, *tags: str) -> int:
+        '''Drops the pages carrying any of tags; returns how many were dropped.'''
+        with self._lock:
+            self.generation += 1
+            keys = set().union(*(self._tags.get(tag, ()) for tag in tags))
+            for key in keys:
+                self._drop(key)
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._pages.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._pages), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+rendered_pages = PageCache()
+
+# tags of the page being rendered, while the middleware may store it
+_page_tags: ContextVar[set[str] | None] = ContextVar("page_tags", default=None)
+
+
+def tag(*tags: str):
+    '''adds tags to the page being rendered, e.g. topic:5 for every topic a list shows, so it is dropped with them'''
+    page_tags = _page_tags.get()
+    if page_tags is not None:
+        page_tags.update(tags)
+
+
+def invalidate(*tags: str) -> int:
+    return rendered_pages.invalidate(*tags)
+
+
+def clear():
+    rendered_pages.clear()
+
+
+def _is_anonymous(request: Request) -> bool:
+    access_token = request.cookies.get("access_token")
+    return (not access_token or access_token == DUMMY_ACCESS_TOKEN) and "authorization" not in request.headers
+
+
+def _normalized_query(scope: Scope) -> str:
+    return urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+
+
+def _cached_headers(headers: list[tuple[bytes, bytes]], etag: str | None) -> list[tuple[bytes, bytes]]:
+    names = {name for name, _ in headers}
+    added = [(b"cache-control", b"no-cache"), (b"vary", b"Cookie")]
+    if etag is not None:
+        added.insert(0, (b"etag", etag.encode()))
+    return headers + [(name, value) for name, value in added if name not in names]
+
+
+async def _send_page(page: CachedPage, if_none_match: str | None, send: Send, cache_status: bytes):
+    if etag_matches(if_none_match, page.etag):
+        await send({"type": "http.response.start", "status": 304,
+                    "headers": [(b"etag", page.etag.encode()), (b"cache-control", b"no-cache"), (b"x-page-cache", cache_status)]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send({"type": "http.response.start", "status": page.status, "headers": page.headers + [(b"x-page-cache", cache_status)]})
+    await send({"type": "http.response.body", "body": page.body})
+
+
+class PageCacheMiddleware:
+    '''Plain ASGI middleware serving CACHED_ROUTES to visitors without a session (anonymous, or the guest
+    token of /users/guest) from rendered_pages, before the token check, the SQL and the template render.
+    Pages are keyed by scheme, Host, route, path params and sorted query params, carry the view's ETag or a strong one
+    of the body, and are answered with 304 when If-None-Match matches. Only complete 200 responses without cookies are stored.
+    Streamed responses (no Content-Length) are forwarded chunk by chunk and kept as well if they end within
+    max_entry_bytes, so caching costs them no time to first byte.'''
+
+    def __init__(self, app: ASGIApp, cache: PageCache | None = None):
+        self.app = app
+        self.cache = rendered_pages if cache is None else cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        route, path_params = match_route(scope)
+        route_tag = CACHED_ROUTES.get(route)
+        request = Request(scope)
+        if route_tag is None or not _is_anonymous(request):
+            await self.app(scope, receive, send)
+            return
+
+        # pages hold links built from the Host header (url_for), so a forged Host must not reach other visitors
+        key = (scope.get("scheme", "http"), request.headers.get("host", ""), route,
+               tuple(sorted(path_params.items())), _normalized_query(scope))
+        if_none_match = request.headers.get("if-none-match")
+        page = self.cache.get(key)
+        if page is not None:
+            await _send_page(page, if_none_match, send, b"hit")
+            return
+
+        generation = self.cache.generation
+        tags = {route_tag.format(**path_params)}
+        start: Message | None = None
+        chunks: list[bytes] = []
+        size, passthrough, streamed = 0, False, False
+
+        def store(body: bytes) -> CachedPage:
+            headers = list(start.get("headers", []))
+            # a view with its own version ETag keeps it, so a revalidation is answered the same with or without the cache
+            etag = next((value.decode() for name, value in headers if name == b"etag"), None) or etag_for(body)
+            page = CachedPage(start["status"], _cached_headers(headers, etag), body, etag)
+            self.cache.set(key, page, tags, generation)
+            return page
+
+        async def send_buffered(message: Message):
+            nonlocal start, size, passthrough, streamed
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+                headers = dict(message.get("headers", []))
+                if message["status"] != 200 or b"set-cookie" in headers:
+                    passthrough = True
+                    await send(message)
+                elif b"content-length" not in headers:
+                    # a streamed page goes out as it is rendered, and is kept as well when it turns out small enough
+                    streamed = True
+                    await send({**message, "headers": _cached_headers(list(message.get("headers", [])), None)
+                                + [(b"x-page-cache", b"miss")]})
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if streamed:
+                    await send(message)
+                    if size > self.cache.max_entry_bytes:
+                        passthrough = True
+                        chunks.clear()
+                    elif not message.get("more_body", False):
+                        store(b"".join(chunks))
+                    return
+                if message.get("more_body", False) and size <= self.cache.max_entry_bytes:
+                    return
+                body = b"".join(chunks)
+                if message.get("more_body", False):
+                    # too big to keep: send what there is and stream the rest
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body, "more_body": True})
+                    return
+                await _send_page(store(body), if_none_match, send, b"miss")
+
+        token = _page_tags.set(tags)
+        try:
+            await self.app(scope, receive, send_buffered)
+        finally:
+            _page_tags.reset(token)
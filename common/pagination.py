@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from fastapi import HTTPException
+import common.responses as responses
+
+
+PAGE_SIZE = 10
+# largest page a client may ask for where the page size is a parameter
+MAX_PAGE_SIZE = 100
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    raise TypeError(f"cannot put {type(value).__name__} into a cursor")
+
+
+def _decode_value(value: dict):
+    if "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(position) -> str:
+    '''opaque, url-safe token for the sort key of the last row on a page'''
+    data = json.dumps(position, default=_encode_value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=responses.BadRequest().status_code, detail="Invalid cursor")
+
+
+def decode_cursor(cursor: str | None, shape: tuple[type, ...] | None = None):
+    '''the position in cursor; with shape, checked to be a list of values of those types, as check_position does'''
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(data, object_hook=_decode_value)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise _invalid_cursor()
+    return position if shape is None else check_position(position, shape)
+
+
+def check_position(position, shape: tuple[type, ...]) -> list:
+    '''position if it is a list of values of the types in shape, e.g. (datetime, int); BadRequest otherwise,
+    so a cursor that decodes but was not made by encode_cursor never reaches the query'''
+    if (not isinstance(position, list) or len(position) != len(shape)
+            or not all(isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(position, shape))):
+        raise _invalid_cursor()
+    return position
+
+
+def keyset(columns: tuple[str, ...], position, descending: bool = False) -> tuple[str, list]:
+    '''WHERE condition and params for the rows that follow position in ORDER BY columns.
+    Written out as (a > ?) OR (a = ? AND b > ?) rather than a row comparison, so it can use an index range.'''
+    if not isinstance(position, list) or len(position) != len(columns):
+        raise _invalid_cursor()
+    op = "<" if descending else ">"
+    conditions, params = [], []
+    for i, column in enumerate(columns):
+        equal = [f"{previous} = ?" for previous in columns[:i]]
+        conditions.append("(" + " AND ".join(equal + [f"{column} {op} ?"]) + ")")
+        params.extend(position[:i + 1])
+    return "(" + " OR ".join(conditions) + ")", params
+
+
+def next_cursor(items: list, key, page_size: int = PAGE_SIZE) -> str | None:
+    '''cursor for the page after items, None when items was the last page'''
+    if len(items) < page_size:
+        return None
+    return encode_cursor(key(items[-1]))
+
+
+class StreamedPage:
+    '''A page a template loops over while its rows are read, instead of a list: rows is an async iterator
+    of the page's items, key gives the sort key of one. next_cursor is set once the loop is over.'''
+
+    def __init__(self, rows, key, page_size: int = PAGE_SIZE):
+        self.rows = rows
+        self.key = key
+        self.page_size = page_size
+        self.next_cursor = None
+
+    async def __aiter__(self):
+        count, last = 0, None
+        async for item in self.rows:
+            count, last = count + 1, item
+            yield item
+        if count >= self.page_size:
+            self.next_cursor = encode_cursor(self.key(last))
+
+    async def aclose(self):
+        await self.rows.aclose()
@@ -0,0 +1,182 @@
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from common import tracing
+
+
+SLOW_REQUEST_SECONDS = float(os.environ.get("FORUM_SLOW_REQUEST_MS", 1000)) / 1000
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+
+slow_request_logger = logging.getLogger("common.slow_requests")
+
+# trace ids accepted from the X-Request-ID header of a proxy in front of the app
+_TRACE_ID = re.compile(r"^[\w.-]{1,64}$")
+_SCOPE_KEY = "forum.route"
+
+
+def match_route(scope: Scope) -> tuple[str, dict]:
+    '''The path template the request is routed to, e.g. /topics/{id}, and its path params.
+    Resolved against the application's routes the same way its router does it, once per request:
+    the result is kept in the scope for the middlewares further in.'''
+    matched = scope.get(_SCOPE_KEY)
+    if matched is not None:
+        return matched
+    matched, partial = None, None
+    for route in getattr(scope.get("app"), "routes", ()):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            matched = route.path, child_scope.get("path_params", {})
+            break
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    scope[_SCOPE_KEY] = matched = matched or (partial or UNMATCHED_ROUTE, {})
+    return matched
+
+
+def route_template(scope: Scope) -> str:
+    '''the path template of the request, so metrics don't get a label per id'''
+    return match_route(scope)[0]
+
+
+class RouteMetrics:
+    '''Latency histograms, status counts, in-flight requests and time per trace phase, by (method, route).'''
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._routes: dict[tuple[str, str], dict] = {}
+
+    def _new_entry(self, in_flight: int = 0) -> dict:
+        return {'in_flight': in_flight, 'count': 0, 'seconds': 0.0, 'buckets': [0] * (len(self.buckets) + 1),
+                'statuses': {}, 'phases': {}}
+
+    def _entry(self, method: str, route: str) -> dict:
+        entry = self._routes.get((method, route))
+        if entry is None:
+            entry = self._routes[(method, route)] = self._new_entry()
+        return entry
+
+    def started(self, method: str, route: str):
+        with self._lock:
+            self._entry(method, route)['in_flight'] += 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float, phases: dict[str, float]):
+        with self._lock:
+            entry = self._entry(method, route)
+            entry['in_flight'] -= 1
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['buckets'][bisect_left(self.buckets, seconds)] += 1
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            for phase, phase_seconds in phases.items():
+                entry['phases'][phase] = entry['phases'].get(phase, 0.0) + phase_seconds
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [{'method': method, 'route': route, **entry, 'buckets': list(entry['buckets']),
+                     'statuses': dict(entry['statuses']), 'phases': dict(entry['phases'])}
+                    for (method, route), entry in sorted(self._routes.items())]
+
+    def reset(self):
+        '''drops the finished requests; routes with requests in flight keep their gauge'''
+        with self._lock:
+            self._routes = {key: self._new_entry(entry['in_flight'])
+                            for key, entry in self._routes.items() if entry['in_flight']}
+
+
+route_metrics = RouteMetrics()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_lines(metrics: RouteMetrics) -> list[str]:
+    '''metrics in the Prometheus text exposition format, labelled by method and route template'''
+    snapshot = metrics.snapshot()
+    bounds = [str(bound) for bound in metrics.buckets] + ["+Inf"]
+    lines = ["# HELP forum_http_request_duration_seconds Request latency, by route",
+             "# TYPE forum_http_request_duration_seconds histogram"]
+    for entry in snapshot:
+        labels = f'method="{entry["method"]}",route="{_label(entry["route"])}"'
+        cumulative = 0
+        for bound, count in zip(bounds, entry['buckets']):
+            cumulative += count
+            lines.append(f'forum_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'forum_http_request_duration_seconds_sum{{{labels}}} {entry["seconds"]}')
+        lines.append(f'forum_http_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+
+    lines += ["# HELP forum_http_requests_total Finished requests, by route and status",
+              "# TYPE forum_http_requests_total counter"]
+    for entry in snapshot:
+        labels = f'method="{entry["method"]}",route="{_label(entry["route"])}"'
+        lines.extend(f'forum_http_requests_total{{{labels},status="{status}"}} {count}'
+                     for status, count in sorted(entry['statuses'].items()))
+
+    lines += ["# HELP forum_http_requests_in_flight Requests being handled, by route",
+              "# TYPE forum_http_requests_in_flight gauge"]
+    lines.extend(f'forum_http_requests_in_flight{{method="{entry["method"]}",route="{_label(entry["route"])}"}} {entry["in_flight"]}'
+                 for entry in snapshot)
+
+    lines += ["# HELP forum_http_request_phase_seconds_total Time spent in auth, sql, db_wait, render..., by route",
+              "# TYPE forum_http_request_phase_seconds_total counter"]
+    for entry in snapshot:
+        labels = f'method="{entry["method"]}",route="{_label(entry["route"])}"'
+        lines.extend(f'forum_http_request_phase_seconds_total{{{labels},phase="{phase}"}} {seconds}'
+                     for phase, seconds in sorted(entry['phases'].items()))
+    return lines
+
+
+def _incoming_trace_id(scope: Scope) -> str | None:
+    trace_id = Headers(scope=scope).get("x-request-id")
+    return trace_id if trace_id and _TRACE_ID.match(trace_id) else None
+
+
+class RequestMetricsMiddleware:
+    '''Plain ASGI middleware, the outermost one: times every request into route_metrics and starts the
+    trace the auth, database and template layers add their time to. The trace id and the breakdown are
+    sent back in the X-Trace-Id and Server-Timing headers; requests slower than FORUM_SLOW_REQUEST_MS
+    are logged with their breakdown, and the slow query log carries the same trace id.'''
+
+    def __init__(self, app: ASGIApp, metrics: RouteMetrics | None = None):
+        self.app = app
+        self.metrics = route_metrics if metrics is None else metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], route_template(scope)
+        trace = tracing.Trace(_incoming_trace_id(scope))
+        token = tracing.current_trace.set(trace)
+        status = 500
+
+        async def send_with_trace(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Trace-Id", trace.id)
+                headers.append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        self.metrics.started(method, route)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            tracing.current_trace.reset(token)
+            seconds = trace.elapsed()
+            phases = trace.phases()
+            self.metrics.finished(method, route, status, seconds, phases)
+            if seconds >= SLOW_REQUEST_SECONDS:
+                slow_request_logger.warning("slow request %s %s (%s, %d, %.1f ms, trace %s): %s", method, scope["path"],
+                                            route, status, seconds * 1000, trace.id,
+                                            ", ".join(f"{phase} {phase_seconds * 1000:.1f} ms"
+                                                      for phase, phase_seconds in phases.items()) or "no phases")
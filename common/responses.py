@@ -43,4 +43,9 @@ class BestReplyExists(Response):
 
 class CONFLICT(Response):
     def __init__(self, content= ''):
-        super().__init__(content=content, status_code=status.HTTP_409_CONFLICT)
\ No newline at end of file
+        super().__init__(content=content, status_code=status.HTTP_409_CONFLICT)
+
+
+class ServiceUnavailable(Response):
+    def __init__(self, content=''):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=content)
@@ -0,0 +1,131 @@
+import logging
+import os
+import time
+import typing
+import anyio
+import jinja2
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import URL
+from common import tracing
+
+
+TEMPLATES_DIR = "templates"
+# production: templates are only read at startup, edits need a restart
+PRODUCTION = os.environ.get("FORUM_ENV", "development") == "production"
+# compiled templates survive restarts here; jinja's per-user temp directory by default
+TEMPLATE_CACHE_DIR = os.environ.get("FORUM_TEMPLATE_CACHE_DIR") or None
+# a streamed page goes out in writes of about this size rather than one per template fragment
+STREAM_CHUNK_BYTES = int(os.environ.get("FORUM_TEMPLATE_STREAM_CHUNK_BYTES", 16 * 1024))
+
+logger = logging.getLogger(__name__)
+
+
+@jinja2.pass_context
+def _url_for(context: dict, name: str, **path_params: typing.Any) -> URL:
+    return context["request"].url_for(name, **path_params)
+
+
+def _create_environment(enable_async: bool = False) -> jinja2.Environment:
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    # async templates compile to different code from the same source, so they are cached under another name
+    cache_pattern = "__jinja2_async_%s.cache" if enable_async else "__jinja2_%s.cache"
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=not PRODUCTION,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR, cache_pattern),
+        enable_async=enable_async,
+        # every template stays compiled in memory, not just the 400 most recent
+        cache_size=-1,
+    )
+    env.globals["url_for"] = _url_for
+    env.template_class = tracing.TracedTemplate
+    return env
+
+
+# the one environment behind every router's templates
+environment = _create_environment()
+# the same templates for streamed pages: generate_async() loops over async iterables of rows as they arrive
+streaming_environment = _create_environment(enable_async=True)
+
+_preload_stats = {'templates': 0, 'seconds': 0.0}
+
+
+class Templates(Jinja2Templates):
+    '''Jinja2Templates on the shared environment; directory is where the router keeps its templates
+    under templates/, and names are looked up there as before.'''
+
+    def __init__(self, directory: str = TEMPLATES_DIR):
+        prefix = os.path.relpath(directory, TEMPLATES_DIR).replace(os.sep, "/")
+        self.prefix = "" if prefix == "." else prefix + "/"
+        super().__init__(directory)
+
+    def _create_env(self, directory, **env_options) -> jinja2.Environment:
+        return environment
+
+    def get_template(self, name: str) -> jinja2.Template:
+        return self.env.get_template(self.prefix + name)
+
+    def StreamingTemplateResponse(self, name: str, context: dict, status_code: int = 200,
+                                  headers: typing.Mapping[str, str] | None = None) -> StreamingResponse:
+        '''TemplateResponse sent as the template renders, for pages over rows read while they are sent:
+        async iterables in context (data.async_database.stream_query and what is built on it) are looped
+        over row by row, and the first bytes go out before the last row is read. Values of the context
+        with an aclose() are closed once the page is done, also when the client leaves half way.'''
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+        template = streaming_environment.get_template(self.prefix + name)
+        response = StreamingResponse(_render_chunks(template, context), status_code=status_code,
+                                     headers=headers, media_type="text/html")
+        response.template, response.context = template, context
+        return response
+
+
+async def _render_chunks(template: jinja2.Template, context: dict):
+    '''template.generate_async(context) in writes of STREAM_CHUNK_BYTES; the time spent producing them,
+    rows waited for included, goes to the trace as render'''
+    chunks = template.generate_async(context)
+    buffer, size, seconds = [], 0, 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = (await chunks.__anext__()).encode()
+            except StopAsyncIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - started
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_BYTES:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield b"".join(buffer)
+    finally:
+        tracing.add("render", seconds)
+        with anyio.CancelScope(shield=True):
+            await chunks.aclose()
+            for value in context.values():
+                if hasattr(value, "aclose"):
+                    await value.aclose()
+
+
+def preload() -> int:
+    '''Compiles every template under templates/, for both environments, now rather than on its first
+    request, from the bytecode cache where it is current; returns how many there are and logs how long it took.'''
+    started = time.perf_counter()
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+        streaming_environment.get_template(name)
+    seconds = time.perf_counter() - started
+    _preload_stats.update(templates=len(names), seconds=seconds)
+    logger.info("compiled %d templates in %.1f ms", len(names), seconds * 1000)
+    return len(names)
+
+
+def template_stats() -> dict:
+    return dict(_preload_stats)
@@ -0,0 +1,76 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+import jinja2
+
+
+class Trace:
+    '''Where the time of one request went: seconds and counts per phase (auth, sql, db_wait, render).
+    Database statements add to it from the executor threads, hence the lock.'''
+
+    __slots__ = ('id', 'started', '_seconds', '_counts', '_lock')
+
+    def __init__(self, trace_id: str | None = None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self._seconds: dict[str, float] = {}
+        self._counts: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self._seconds[phase] = self._seconds.get(phase, 0.0) + seconds
+            self._counts[phase] = self._counts.get(phase, 0) + 1
+
+    def phases(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._seconds)
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        '''Server-Timing header value, shown per request in the browser's network panel'''
+        counts = self.counts()
+        parts = [f'{phase};dur={seconds * 1000:.1f};desc="{counts[phase]}x"' for phase, seconds in self.phases().items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+
+# trace of the request being handled; copied into the executor threads with the rest of the context
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def current_trace_id() -> str | None:
+    trace = current_trace.get()
+    return trace.id if trace else None
+
+
+def add(phase: str, seconds: float):
+    '''adds time spent on phase to the current request's trace, if any'''
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(phase, seconds)
+
+
+@contextmanager
+def span(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(phase, time.perf_counter() - started)
+
+
+class TracedTemplate(jinja2.Template):
+    '''template whose rendering time goes into the request's trace'''
+
+    def render(self, *args, **kwargs):
+        with span("render"):
+            return super().render(*args, **kwargs)
@@ -0,0 +1,92 @@
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+import anyio
+from common.executor import BoundedExecutor
+from data import database
+import os
+
+
+EXECUTOR_MAX_WORKERS = int(os.environ.get("FORUM_DB_EXECUTOR_WORKERS", database.POOL_MAX_SIZE))
+EXECUTOR_MAX_PENDING = int(os.environ.get("FORUM_DB_EXECUTOR_MAX_PENDING", 100))
+EXECUTOR_WAIT_TIMEOUT = float(os.environ.get("FORUM_DB_EXECUTOR_WAIT_TIMEOUT", 30))
+
+
+# mariadb is a blocking driver: statements run on a thread pool sized to the connection pool
+_executor = BoundedExecutor(
+    "database",
+    max_workers=EXECUTOR_MAX_WORKERS,
+    max_pending=EXECUTOR_MAX_PENDING,
+    wait_timeout=EXECUTOR_WAIT_TIMEOUT,
+)
+
+
+def executor_stats() -> dict:
+    return _executor.stats()
+
+
+async def read_query(sql: str, sql_params=()):
+    return await _executor.run(database.read_query, sql, sql_params)
+
+
+async def insert_query(sql: str, sql_params=()) -> int:
+    return await _executor.run(database.insert_query, sql, sql_params)
+
+
+async def insert_many(sql: str, rows) -> int:
+    return await _executor.run(database.insert_many, sql, rows)
+
+
+async def update_query(sql: str, sql_params=()) -> int:
+    return await _executor.run(database.update_query, sql, sql_params)
+
+
+async def stream_query(sql: str, sql_params=(), batch_size: int = database.STREAM_BATCH_SIZE):
+    '''Async iterator over the rows of a read, fetched batch_size at a time on the executor, so a page can
+    be sent while its rows are still read. The connection is held until the iterator is exhausted or closed,
+    STREAM_TIMEOUT at most: then the rows left are read into memory, however far the client has got.
+    Close it (contextlib.aclosing) when stopping early.'''
+    # cancelled while the statement runs, the stream is closed once it has been opened
+    stream = await _executor.run_owned(database.RowStream.close, database.RowStream, sql, sql_params)
+    deadline = asyncio.get_running_loop().call_later(database.STREAM_TIMEOUT, _release_stream, stream)
+    try:
+        while rows := await _executor.run(stream.fetch, batch_size):
+            for row in rows:
+                yield row
+    finally:
+        deadline.cancel()
+        # also when the client went away and the response was cancelled, or the connection is lost to the pool
+        with anyio.CancelScope(shield=True):
+            await _executor.run(stream.close)
+
+
+# releases started by a deadline, referenced until they are done
+_releasing: set[asyncio.Task] = set()
+
+
+def _release_stream(stream: database.RowStream):
+    task = asyncio.ensure_future(_executor.run(stream.release))
+    _releasing.add(task)
+    task.add_done_callback(_releasing.discard)
+
+
+@asynccontextmanager
+async def transaction():
+    '''Async unit of work, see data.database.transaction. The transaction's connection is bound
+    to the calling task's context, so every awaited query inside the block reuses it.'''
+    if database._transaction_connection.get() is not None:
+        yield
+        return
+    # cancelled while begin runs, the connection is rolled back and returned once it has one
+    conn = await _executor.run_owned(functools.partial(database.end_transaction, commit=False), database.begin_transaction)
+    token = database._transaction_connection.set(conn)
+    committed = False
+    try:
+        yield
+        committed = True
+    finally:
+        database._transaction_connection.reset(token)
+        # a statement cancelled in the block has returned by now (see BoundedExecutor.run), so this is the
+        # only thing on the connection; shielded, so a cancelled request still ends its transaction
+        with anyio.CancelScope(shield=True):
+            await _executor.run(database.end_transaction, conn, committed)
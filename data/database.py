@@ -1,9 +1,30 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from mariadb import connect
 from mariadb.connections import Connection
+from data.pool import ConnectionPool
+from data.query_stats import QueryStats
+from common import tracing
 import os
+import threading
+import time
 
 
-def _get_connection() -> Connection:
+POOL_MIN_SIZE = int(os.environ.get("FORUM_DB_POOL_MIN_SIZE", 1))
+POOL_MAX_SIZE = int(os.environ.get("FORUM_DB_POOL_MAX_SIZE", 10))
+POOL_IDLE_TIMEOUT = float(os.environ.get("FORUM_DB_POOL_IDLE_TIMEOUT", 300))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("FORUM_DB_POOL_CHECKOUT_TIMEOUT", 10))
+POOL_PING_AFTER = float(os.environ.get("FORUM_DB_POOL_PING_AFTER", 1))
+# rows fetched per round trip by a RowStream
+STREAM_BATCH_SIZE = int(os.environ.get("FORUM_DB_STREAM_BATCH_SIZE", 200))
+# RowStreams holding a connection at once; the others read their rows into memory first, like read_query
+MAX_STREAMS = int(os.environ.get("FORUM_DB_MAX_STREAMS", max(1, POOL_MAX_SIZE // 2)))
+# seconds a RowStream may hold its connection before the rows left are read into memory
+STREAM_TIMEOUT = float(os.environ.get("FORUM_DB_STREAM_TIMEOUT", 10))
+
+
+def _connect() -> Connection:
     return connect(
         user='root',
         password=os.environ.get("mariadb_root_pwd"),
@@ -11,30 +32,267 @@ def _get_connection() -> Connection:
         host='localhost',
         port=3306,
         database="ktg_forum_api",
+        autocommit=True,
     )
 
 
-def read_query(sql: str, sql_params=()):
+_pool = ConnectionPool(
+    _connect,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    idle_timeout=POOL_IDLE_TIMEOUT,
+    checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+    ping_after=POOL_PING_AFTER,
+)
+
+
+# connection of the transaction opened by transaction() in the current context, if any
+_transaction_connection: ContextVar[Connection | None] = ContextVar("transaction_connection", default=None)
+
+
+@contextmanager
+def _get_connection():
+    '''Yields the current transaction's connection, or checks one out of the pool for a single statement.'''
+    conn = _transaction_connection.get()
+    if conn is not None:
+        yield conn
+        return
+    with _pool.connection() as conn:
+        yield conn
+
+
+# timing, row counts and connection wait of every statement below, by SQL fingerprint
+query_stats = QueryStats()
+
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+class _Statement:
+    __slots__ = ('conn', 'rows')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = 0
+
+
+@contextmanager
+def _statement(sql: str, sql_params):
+    '''Connection for one statement; the caller sets rows, the time is recorded in query_stats
+    and in the trace of the request that ran it.'''
+    started = time.perf_counter()
     with _get_connection() as conn:
-        cursor = conn.cursor()
+        statement = _Statement(conn)
+        acquired = time.perf_counter()
+        failed = False
+        try:
+            yield statement
+        except Exception:
+            failed = True
+            raise
+        finally:
+            finished = time.perf_counter()
+            trace = tracing.current_trace.get()
+            if trace is not None:
+                trace.add("db_wait", acquired - started)
+                trace.add("sql", finished - acquired)
+            query_stats.record(sql, sql_params, acquired - started, finished - acquired, statement.rows,
+                               failed=failed, trace_id=trace.id if trace else None)
+
+
+class RowStream:
+    '''Rows of one read fetched batch by batch instead of all at once, for responses sent while they are read.
+    At most MAX_STREAMS of them hold a connection of their own (never the current transaction's), until release()
+    or close(); past that, and on release(), the rows left are read into memory and the connection goes back
+    right away, so slow clients can't take up the pool. The connection wait and the time spent executing and
+    fetching are recorded like a statement's when the connection is returned.'''
+
+    def __init__(self, sql: str, sql_params=()):
+        self.sql, self.sql_params = sql, sql_params
+        self.rows = 0
+        self._trace = tracing.current_trace.get()
+        self._failed = False
+        self._cursor = None
+        self._buffer: deque | None = None
+        # fetch() runs on an executor thread, release() may come from another one at the deadline
+        self._lock = threading.RLock()
+        self._slot = _stream_slots.acquire(blocking=False)
+        started = time.perf_counter()
+        try:
+            self._conn = _pool.acquire()
+        except Exception:
+            self._release_slot()
+            raise
+        self._wait = time.perf_counter() - started
+        self._seconds = 0.0
+        self._add("db_wait", self._wait)
+        with self._timed():
+            # unbuffered: rows come off the socket as they are fetched, not all of them on execute
+            self._cursor = self._conn.cursor(buffered=False)
+            self._cursor.execute(sql, sql_params)
+        if not self._slot:
+            self.release()
+
+    @contextmanager
+    def _timed(self):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self._seconds += seconds
+            self._add("sql", seconds)
+            if self._failed:
+                self.close()
+
+    def _add(self, phase: str, seconds: float):
+        if self._trace is not None:
+            self._trace.add(phase, seconds)
+
+    def fetch(self, size: int = STREAM_BATCH_SIZE) -> list:
+        '''the next size rows, an empty list once they ran out'''
+        with self._lock:
+            if self._buffer is not None:
+                return [self._buffer.popleft() for _ in range(min(size, len(self._buffer)))]
+            if self._conn is None:
+                return []
+            with self._timed():
+                rows = self._cursor.fetchmany(size)
+                self.rows += len(rows)
+                return rows
+
+    def release(self):
+        '''Reads the rows not fetched yet into memory and returns the connection; fetch() goes on from memory.'''
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._timed():
+                rest = self._cursor.fetchall()
+            self.rows += len(rest)
+            self._buffer = deque(rest)
+            self._return_connection()
+
+    def close(self):
+        '''Discards the rows not fetched and returns the connection if it is still held; closing twice does nothing.'''
+        with self._lock:
+            self._buffer = None
+            self._return_connection()
+
+    def _return_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if self._cursor is not None:
+                self._cursor.close()
+        finally:
+            _pool.release(conn)
+            self._release_slot()
+            query_stats.record(self.sql, self.sql_params, self._wait, self._seconds, self.rows, failed=self._failed,
+                               trace_id=self._trace.id if self._trace else None)
+
+    def _release_slot(self):
+        if self._slot:
+            self._slot = False
+            _stream_slots.release()
+
+
+def begin_transaction() -> Connection:
+    conn = _pool.acquire()
+    try:
+        conn.begin()
+    except Exception:
+        _pool.release(conn)
+        raise
+    return conn
+
+
+def end_transaction(conn: Connection, commit: bool):
+    '''Commits or rolls back and returns the connection to the pool.'''
+    try:
+        if commit:
+            conn.commit()
+        else:
+            conn.rollback()
+    except Exception:
+        if commit:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        _pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    '''Unit of work: every query inside the with-block runs on one connection and commits once at the end.
+    Exceptions roll the whole block back. Nested blocks join the outer transaction.'''
+    if _transaction_connection.get() is not None:
+        yield
+        return
+    conn = begin_transaction()
+    token = _transaction_connection.set(conn)
+    committed = False
+    try:
+        yield
+        committed = True
+    finally:
+        _transaction_connection.reset(token)
+        end_transaction(conn, commit=committed)
+
+
+def open_pool():
+    _pool.open()
+
+
+def close_pool():
+    _pool.close()
+
+
+def pool_stats() -> dict:
+    return _pool.stats()
+
+
+def read_query(sql: str, sql_params=()):
+    with _statement(sql, sql_params) as statement:
+        cursor = statement.conn.cursor()
         cursor.execute(sql, sql_params)
 
-        return list(cursor)
+        result = list(cursor)
+        statement.rows = len(result)
+        return result
 
 
 def insert_query(sql: str, sql_params=()) -> int:
-    with _get_connection() as conn:
-        cursor = conn.cursor()
+    with _statement(sql, sql_params) as statement:
+        cursor = statement.conn.cursor()
         cursor.execute(sql, sql_params)
-        conn.commit()
 
+        statement.rows = cursor.rowcount
         return cursor.lastrowid
 
 
+def insert_many(sql: str, rows) -> int:
+    '''One statement for many rows: executemany sends them to the server in bulk, not one round trip per row.'''
+    rows = list(rows)
+    if not rows:
+        return 0
+    with _statement(sql, rows) as statement:
+        cursor = statement.conn.cursor()
+        cursor.executemany(sql, rows)
+
+        statement.rows = cursor.rowcount
+        return cursor.rowcount
+
+
 def update_query(sql: str, sql_params=()) -> int:
-    with _get_connection() as conn:
-        cursor = conn.cursor()
+    with _statement(sql, sql_params) as statement:
+        cursor = statement.conn.cursor()
         cursor.execute(sql, sql_params)
-        conn.commit()
 
+        statement.rows = cursor.rowcount
         return cursor.rowcount
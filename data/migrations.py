@@ -0,0 +1,124 @@
+import os
+import re
+from datetime import datetime
+from typing import NamedTuple
+from data import database
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SQL Files", "migrations")
+
+_FILE_NAME = re.compile(r"^(\d+)_(\w+)\.up\.sql$")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    up: str
+    down: str
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> list[Migration]:
+    '''NNNN_name.up.sql / NNNN_name.down.sql pairs in directory, by version'''
+    migrations = []
+    for file_name in os.listdir(directory):
+        match = _FILE_NAME.match(file_name)
+        if not match:
+            continue
+        up = os.path.join(directory, file_name)
+        down = up[:-len(".up.sql")] + ".down.sql"
+        if not os.path.exists(down):
+            raise ValueError(f"{file_name} has no {os.path.basename(down)}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), up, down))
+    migrations.sort()
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql: str) -> list[str]:
+    '''Statements of a script, split on the semicolons outside quotes and comments; comments are dropped.'''
+    statements, current = [], []
+    i, quote = 0, None
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            current.append(char)
+            if char == "\\" and quote != "`":
+                current.append(sql[i + 1:i + 2])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+            current.append(char)
+        elif sql.startswith("--", i) or char == "#":
+            end = sql.find("\n", i)
+            i = len(sql) if end == -1 else end
+            continue
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = len(sql) if end == -1 else end + 2
+            continue
+        elif char == ";":
+            statements.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def _run_script(path: str):
+    with open(path, encoding="utf-8") as file:
+        for statement in split_statements(file.read()):
+            database.update_query(statement)
+
+
+def _ensure_table():
+    database.update_query('''CREATE TABLE IF NOT EXISTS schema_migrations (
+                            version int(11) NOT NULL PRIMARY KEY,
+                            name varchar(100) NOT NULL,
+                            applied_on datetime NOT NULL)''')
+
+
+def applied_versions() -> list[int]:
+    _ensure_table()
+    return [row[0] for row in database.read_query("SELECT version FROM schema_migrations ORDER BY version")]
+
+
+def migrate(target: int | None = None, migrations: list[Migration] | None = None) -> list[Migration]:
+    '''Applies the pending migrations up to target (all of them by default), oldest first.
+    DDL commits implicitly in MariaDB, so each version is recorded right after its script succeeds:
+    a failed script stops the run and leaves the earlier versions applied.'''
+    migrations = discover() if migrations is None else migrations
+    applied = set(applied_versions())
+    done = []
+    for migration in migrations:
+        if migration.version in applied or (target is not None and migration.version > target):
+            continue
+        _run_script(migration.up)
+        database.insert_query("INSERT INTO schema_migrations (version, name, applied_on) VALUES (?, ?, ?)",
+                              (migration.version, migration.name, datetime.utcnow()))
+        done.append(migration)
+    return done
+
+
+def rollback(steps: int = 1, migrations: list[Migration] | None = None) -> list[Migration]:
+    '''Runs the down scripts of the last steps applied migrations, newest first.'''
+    migrations = {migration.version: migration for migration in (discover() if migrations is None else migrations)}
+    done = []
+    for version in reversed(applied_versions()[-steps:] if steps > 0 else []):
+        migration = migrations.get(version)
+        if migration is None:
+            raise ValueError(f"migration {version} is applied but its scripts are missing")
+        _run_script(migration.down)
+        database.update_query("DELETE FROM schema_migrations WHERE version = ?", (version,))
+        done.append(migration)
+    return done
+
+
+def status(migrations: list[Migration] | None = None) -> list[tuple[Migration, bool]]:
+    applied = set(applied_versions())
+    return [(migration, migration.version in applied) for migration in (discover() if migrations is None else migrations)]
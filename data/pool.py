@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _PooledConnection:
+    __slots__ = ('conn', 'created_at', 'released_at')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class ConnectionPool:
+    '''Thread-safe pool of reusable database connections.
+
+    connect          - zero-argument callable that opens a new connection
+    min_size         - connections kept open even when idle
+    max_size         - hard cap on open connections (idle + checked out)
+    idle_timeout     - seconds an idle connection above min_size is kept before closing
+    checkout_timeout - seconds to wait for a free connection before raising PoolTimeout
+    ping_after       - connections idle at least this many seconds are pinged on checkout
+    '''
+
+    def __init__(self, connect, min_size: int = 1, max_size: int = 10, idle_timeout: float = 300.0,
+                 checkout_timeout: float = 10.0, ping_after: float = 1.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f'Invalid pool size: min_size={min_size}, max_size={max_size}')
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+
+        self._idle: deque[_PooledConnection] = deque()
+        self._in_use: dict[int, _PooledConnection] = {}
+        self._opening = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+        }
+
+    def open(self):
+        '''Pre-open min_size connections.'''
+        with self._lock:
+            self._closed = False
+            missing = self.min_size - self._size()
+            self._opening += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            try:
+                pooled = _PooledConnection(self._connect())
+            except Exception:
+                with self._lock:
+                    self._opening -= 1
+                    self._available.notify()
+                raise
+            with self._lock:
+                self._opening -= 1
+                self._stats['created'] += 1
+                self._idle.append(pooled)
+                self._available.notify()
+
+    def close(self):
+        '''Close all idle connections; checked out ones are closed when released.'''
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                'size': self._size(),
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            pooled = self._checkout(deadline)
+            if pooled is None:
+                return self._open_checked_out()
+
+            if self._healthy(pooled):
+                with self._lock:
+                    self._stats['reused'] += 1
+                return pooled.conn
+
+            with self._lock:
+                self._in_use.pop(id(pooled.conn), None)
+                self._stats['health_check_failures'] += 1
+            self._close(pooled)
+
+    def release(self, conn):
+        with self._lock:
+            pooled = self._in_use.pop(id(conn), None)
+            if pooled is None:
+                return
+            if self._closed:
+                discard = True
+            else:
+                discard = False
+                pooled.released_at = time.monotonic()
+                self._idle.append(pooled)
+            expired = self._expired()
+            self._available.notify()
+        if discard:
+            self._close(pooled)
+        for stale in expired:
+            self._close(stale)
+
+    def _checkout(self, deadline: float) -> _PooledConnection | None:
+        '''Reserve an idle connection, or a slot for a new one (returns None). Waits while the pool is full.'''
+        with self._lock:
+            if self._closed:
+                raise PoolTimeout('Connection pool is closed')
+            self._stats['checkouts'] += 1
+            waited = False
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use[id(pooled.conn)] = pooled
+                    return pooled
+                if self._size() < self.max_size:
+                    self._opening += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection available within {self.checkout_timeout}s')
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                self._available.wait(remaining)
+
+    def _open_checked_out(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._opening -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._stats['created'] += 1
+            self._in_use[id(conn)] = _PooledConnection(conn)
+        return conn
+
+    def _healthy(self, pooled: _PooledConnection) -> bool:
+        if time.monotonic() - pooled.released_at < self.ping_after:
+            return True
+        try:
+            pooled.conn.ping()
+            return True
+        except Exception:
+            return False
+
+    def _expired(self) -> list[_PooledConnection]:
+        '''Pop idle connections past idle_timeout, keeping min_size open. Caller holds the lock.'''
+        expired = []
+        now = time.monotonic()
+        while (self._idle and self._size() > self.min_size
+               and now - self._idle[0].released_at >= self.idle_timeout):
+            expired.append(self._idle.popleft())
+        return expired
+
+    def _size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _close(self, pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['closed'] += 1
+            self._available.notify()
@@ -0,0 +1,67 @@
+from typing import NamedTuple
+from datetime import datetime
+from data import database
+from common import pagination
+from services import access_services, categories_services, messages_services, topics_services
+
+
+class HotQuery(NamedTuple):
+    name: str
+    sql: str
+    params: tuple
+
+
+# sample arguments for the builders; EXPLAIN only needs values of the right types
+_CATEGORIES = frozenset({1, 2})
+_CREATED_ON = datetime(2024, 1, 1)
+
+
+def _hot_queries() -> list[HotQuery]:
+    '''the SQL services/* build on every page view, with the indexes of migrations 0005 and 0006 behind it;
+    first pages and keyset (next) pages both, as they filter differently'''
+    return [
+        HotQuery("categories a user can read",
+                 *categories_services.categories_query(_CATEGORIES, None, None, 1)),
+        HotQuery("next page of categories",
+                 *categories_services.categories_query(_CATEGORIES, None, ["General", 1], 1)),
+        HotQuery("topics of a category by title",
+                 *categories_services.category_topics_query(1, None, False, None, 1)),
+        HotQuery("next page of topics of a category",
+                 *categories_services.category_topics_query(1, None, False, ["Title", 1], 1)),
+        HotQuery("version of the topics of a category", categories_services.CATEGORY_VERSION_QUERY, (1,)),
+        HotQuery("latest topics",
+                 *topics_services.search_query(topics_services.TOPICS_SELECT, 't.title', 't.id_topic', 't.created_on',
+                                               _CATEGORIES, '', True, True, None, 0)),
+        HotQuery("next page of latest topics",
+                 *topics_services.search_query(topics_services.TOPICS_SELECT, 't.title', 't.id_topic', 't.created_on',
+                                               _CATEGORIES, '', True, True, [_CREATED_ON, 1], 0)),
+        HotQuery("latest replies",
+                 *topics_services.search_query(topics_services.REPLIES_SELECT, 'r.content', 'r.id_reply', 'r.created_on',
+                                               _CATEGORIES, '', True, True, None, 0)),
+        HotQuery("page of replies of a topic", *topics_services.replies_query(1, None, pagination.PAGE_SIZE)),
+        HotQuery("next page of replies of a topic",
+                 *topics_services.replies_query(1, pagination.encode_cursor([_CREATED_ON, 1]), pagination.PAGE_SIZE)),
+        HotQuery("version of a topic", topics_services.TOPIC_VERSION_QUERY, (1,)),
+        HotQuery("conversations of a user", *messages_services.conversations_query(1, True, True, 1)),
+        HotQuery("conversations of a user with others by subject",
+                 *messages_services.user_conversations_query(1, ["admin"], True, True, 1)),
+        HotQuery("private categories of a user", access_services.PRIVATE_CATEGORIES_QUERY, (1,)),
+    ]
+
+
+HOT_QUERIES = _hot_queries()
+
+# columns of a MariaDB EXPLAIN row
+_TABLE, _TYPE = 2, 3
+
+
+def full_scans(queries: list[HotQuery] = HOT_QUERIES) -> list[tuple[str, str]]:
+    '''(query name, table) for every table a hot query reads with a full scan.
+    Run it against a database with realistic data: on near-empty tables the optimizer
+    may prefer a scan even when the index is there.'''
+    scans = []
+    for query in queries:
+        for row in database.read_query("EXPLAIN " + query.sql, query.params):
+            if row[_TYPE] == "ALL":
+                scans.append((query.name, row[_TABLE]))
+    return scans
@@ -0,0 +1,96 @@
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+
+
+SLOW_QUERY_SECONDS = float(os.environ.get("FORUM_SLOW_QUERY_MS", 500)) / 1000
+# longest repr of the parameters written to the slow query log
+SLOW_QUERY_MAX_PARAMS_LENGTH = 500
+
+slow_query_logger = logging.getLogger("data.slow_queries")
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"(?<![\w`])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    '''The statement with literals replaced by ?, IN lists of any length folded into IN (...)
+    and whitespace collapsed, so every call of one query in services/* counts under one key.'''
+    sql = _STRING.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip().lower()
+    sql = _NUMBER.sub("?", sql)
+    return _IN_LIST.sub("in (...)", sql)
+
+
+class QueryStats:
+    '''Per-fingerprint totals of the statements run through data.database.'''
+
+    def __init__(self, slow_query_seconds: float = SLOW_QUERY_SECONDS):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._queries: dict[str, dict] = {}
+
+    def record(self, sql: str, sql_params, acquire_seconds: float, seconds: float, rows: int, failed: bool = False,
+               trace_id: str | None = None):
+        key = fingerprint(sql)
+        slow = seconds >= self.slow_query_seconds
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = {'count': 0, 'errors': 0, 'slow': 0, 'rows': 0, 'seconds': 0.0,
+                                              'max_seconds': 0.0, 'acquire_seconds': 0.0}
+            entry['count'] += 1
+            entry['errors'] += failed
+            entry['slow'] += slow
+            entry['rows'] += rows
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['acquire_seconds'] += acquire_seconds
+        if slow:
+            params = repr(sql_params)
+            if len(params) > SLOW_QUERY_MAX_PARAMS_LENGTH:
+                params = params[:SLOW_QUERY_MAX_PARAMS_LENGTH] + '...'
+            slow_query_logger.warning("slow query (%.1f ms, %d rows, trace %s): %s params=%s",
+                                      seconds * 1000, rows, trace_id or "-", _SPACE.sub(" ", sql).strip(), params)
+
+    def snapshot(self) -> list[dict]:
+        '''One dict per fingerprint, the most total time first.'''
+        with self._lock:
+            queries = [{'query': key, **entry} for key, entry in self._queries.items()]
+        return sorted(queries, key=lambda entry: entry['seconds'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# (metric name, snapshot key, type, help)
+_METRICS = [
+    ("forum_db_queries_total", "count", "counter", "Statements executed"),
+    ("forum_db_query_errors_total", "errors", "counter", "Statements that raised"),
+    ("forum_db_slow_queries_total", "slow", "counter", "Statements slower than the slow query threshold"),
+    ("forum_db_query_rows_total", "rows", "counter", "Rows returned or affected"),
+    ("forum_db_query_seconds_total", "seconds", "counter", "Time spent executing statements"),
+    ("forum_db_query_max_seconds", "max_seconds", "gauge", "Slowest execution"),
+    ("forum_db_connection_acquire_seconds_total", "acquire_seconds", "counter", "Time spent waiting for a connection"),
+]
+
+
+def prometheus_lines(stats: QueryStats) -> list[str]:
+    '''stats in the Prometheus text exposition format, labelled by fingerprint'''
+    snapshot = stats.snapshot()
+    lines = []
+    for name, key, kind, help in _METRICS:
+        lines.append(f"# HELP {name} {help}, by SQL fingerprint")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{query="{_label(entry["query"])}"}} {entry[key]}' for entry in snapshot)
+    return lines
@@ -1,22 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from routers.topics import topics_router
 from routers.replies import replies_router
 from routers.users import users_router
 from routers.categories import categories_router
 from routers.messages import messages_router
-from fastapi.templating import Jinja2Templates
+from routers.admin import admin_router
+from common import templating
 import uvicorn
 from common.auth import TokenValidationMiddleware
+from common.request_metrics import RequestMetricsMiddleware
+from common.page_cache import PageCacheMiddleware
+from data import database
+from services import broadcast_services
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    templating.preload()
+    database.open_pool()
+    await broadcast_services.start_worker()
+    yield
+    await broadcast_services.stop_worker()
+    database.close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(topics_router)
 app.include_router(replies_router)
 app.include_router(users_router)
 app.include_router(categories_router)
 app.include_router(messages_router)
+app.include_router(admin_router)
 app.add_middleware(TokenValidationMiddleware)
+# in front of the token check: a cached page needs none
+app.add_middleware(PageCacheMiddleware)
+# added last so it runs first and its trace covers the token check
+app.add_middleware(RequestMetricsMiddleware)
 
-templates = Jinja2Templates(directory="templates")
+templates = templating.Templates(directory="templates")
 
 @app.get("/")
 def landing_page(request: Request):
@@ -0,0 +1,91 @@
+'''Maintenance commands, run from the project root:
+
+    python manage.py migrate [--to VERSION]
+    python manage.py rollback [--steps N]
+    python manage.py migrations
+    python manage.py check-plans
+    python manage.py repair-counters [--topic ID]
+    python manage.py repair-votes [--reply ID]
+'''
+import argparse
+import asyncio
+import sys
+from data import database, migrations, query_plans
+from services import topics_services, replies_services
+
+
+def migrate(args):
+    applied = migrations.migrate(args.to)
+    for migration in applied:
+        print(f"applied {migration.version:04d} {migration.name}")
+    if not applied:
+        print("nothing to apply")
+
+
+def rollback(args):
+    for migration in migrations.rollback(args.steps):
+        print(f"rolled back {migration.version:04d} {migration.name}")
+
+
+def show_migrations(args):
+    for migration, applied in migrations.status():
+        print(f"{'applied' if applied else 'pending'}  {migration.version:04d} {migration.name}")
+
+
+def check_plans(args):
+    scans = query_plans.full_scans()
+    for name, table in scans:
+        print(f"full scan of {table}: {name}")
+    if scans:
+        sys.exit(1)
+    print(f"{len(query_plans.HOT_QUERIES)} hot queries use an index")
+
+
+async def repair_counters(args):
+    changed = await topics_services.repair_reply_counters(args.topic)
+    print(f"reply counters updated on {changed} topic(s)")
+
+
+async def repair_votes(args):
+    changed = await replies_services.repair_vote_tallies(args.reply)
+    print(f"vote tallies updated on {changed} reply(ies)")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="manage.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("migrate", help="apply the pending migrations in SQL Files/migrations")
+    command.add_argument("--to", type=int, help="stop after this version")
+    command.set_defaults(handler=migrate)
+
+    command = commands.add_parser("rollback", help="undo the last applied migrations")
+    command.add_argument("--steps", type=int, default=1, help="how many (default 1)")
+    command.set_defaults(handler=rollback)
+
+    command = commands.add_parser("migrations", help="list the migrations and whether they are applied")
+    command.set_defaults(handler=show_migrations)
+
+    command = commands.add_parser("check-plans", help="EXPLAIN the hot queries, fail if one does a full scan")
+    command.set_defaults(handler=check_plans)
+
+    repair = commands.add_parser("repair-counters", help="recompute topics.reply_count and last_reply_at from replies")
+    repair.add_argument("--topic", type=int, help="only this topic id")
+    repair.set_defaults(handler=repair_counters)
+
+    repair = commands.add_parser("repair-votes", help="recompute replies.upvotes and downvotes from votes")
+    repair.add_argument("--reply", type=int, help="only this reply id")
+    repair.set_defaults(handler=repair_votes)
+
+    args = parser.parse_args()
+    database.open_pool()
+    try:
+        result = args.handler(args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+    finally:
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -39,4 +39,27 @@ class MessageResponseModelChat(Message):
             subject = subject,
             id_parent_message = id_parent_message,
             author = author            
-        )
\ No newline at end of file
+        )
+
+class Broadcast(BaseModel):
+    id: int
+    message_id: int
+    category_id: Optional[int] = None
+    status: str
+    total_recipients: int
+    delivered: int
+    created_on: datetime
+    finished_on: Optional[datetime] = None
+
+    @classmethod
+    def from_query_result(cls, id, message_id, category_id, status, total_recipients, delivered, created_on, finished_on):
+        return cls(
+            id = id,
+            message_id = message_id,
+            category_id = category_id,
+            status = status,
+            total_recipients = total_recipients,
+            delivered = delivered,
+            created_on = created_on,
+            finished_on = finished_on
+        )
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import NamedTuple, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -15,15 +15,33 @@ class Reply(BaseModel):
     downvotes: int = 0
 
     @classmethod
-    def from_query_result(cls, id, content, topic_id, user_id, created_on, is_best):
+    def from_query_result(cls, id, content, topic_id, user_id, created_on, is_best, upvotes=0, downvotes=0):
         return cls(id=id,
                    content=content,
                    topic_id=topic_id,
                    user_id=user_id,
                    created_on=created_on,
-                   is_best=is_best)
+                   is_best=is_best,
+                   upvotes=upvotes,
+                   downvotes=downvotes)
     
 
+class ReplyRow(NamedTuple):
+    '''a reply as read, for pages streamed row by row rather than built as a list of Reply'''
+    id: int
+    content: str
+    topic_id: int
+    user_id: int | None
+    created_on: datetime
+    is_best: bool
+    upvotes: int
+    downvotes: int
+
+    @classmethod
+    def from_query_result(cls, id, content, topic_id, user_id, created_on, is_best, upvotes=0, downvotes=0):
+        return cls(id, content, topic_id, user_id, created_on, bool(is_best), upvotes, downvotes)
+
+
 class Vote(int, Enum):
     up = 1 #'upvote'
     down = -1 #'downvote'
@@ -1,4 +1,4 @@
-from typing import Annotated, Optional
+from typing import Annotated, NamedTuple, Optional
 from pydantic import BaseModel, StringConstraints
 from models.reply import Reply
 from datetime import datetime
@@ -26,6 +26,38 @@ class TopicResponse(BaseModel):
                    is_best=is_best)
 
 
+class TopicReplyRow(NamedTuple):
+    '''TopicResponse as read, for a topic page streamed row by row'''
+    id: int
+    topic_id: int
+    content: str
+    username: str
+    created: datetime
+    upvotes: int
+    downvotes: int
+    is_best: bool
+
+    @classmethod
+    def replies_from_query_results(cls, content, username, created, upvotes, downvotes, is_best, id, topic_id):
+        return cls(id, topic_id, content, username, created, upvotes, downvotes, bool(is_best))
+
+
+class TopicRow(NamedTuple):
+    '''Topic as read, for listings streamed row by row'''
+    id: int
+    title: str
+    created_on: datetime
+    text: str
+    category_id: int
+    author_id: int | str | None
+    replies: int
+    is_locked: bool
+
+    @classmethod
+    def from_query_result(cls, id, title, created_on, text, category_id, author_id, replies, is_locked):
+        return cls(id, title, created_on, text, category_id, author_id, replies, bool(is_locked))
+
+
 class Topic(BaseModel):
     id: Optional[int] = None
     title: Annotated[str, StringConstraints(min_length=2, max_length=200)]
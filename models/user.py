@@ -13,6 +13,12 @@ class User(BaseModel):
     created_on: Optional[datetime] = None
     is_admin: Optional[conint(strict=True, ge=0, le=1)] = None
 
+class Principal(BaseModel):
+    '''the signed-in user as carried by the access token'''
+    id: int
+    username: str
+    is_admin: int = 0
+
 class UserInDB(BaseModel):
     hashed_password:str
     
\ No newline at end of file
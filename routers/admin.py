@@ -0,0 +1,96 @@
+import hmac
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from common import auth, page_cache, request_metrics, templating
+import common.responses as responses
+from data import database, async_database
+from data.query_stats import prometheus_lines
+from models.user import Principal
+
+
+# bearer token of the Prometheus scraper; without it /metrics is for admins only
+METRICS_TOKEN = os.environ.get("FORUM_METRICS_TOKEN")
+
+admin_router = APIRouter()
+
+
+def _require_admin(request: Request) -> Principal:
+    user: Principal = auth.get_principal(request)
+    if not user.is_admin:
+        raise HTTPException(status_code=responses.Unauthorized().status_code,
+                            detail="You are not admin! You are not authorized to view server statistics!")
+    return user
+
+
+def _require_metrics_access(request: Request):
+    '''the scraper's "Authorization: Bearer <FORUM_METRICS_TOKEN>", or an admin's session'''
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return
+    _require_admin(request)
+
+
+def _gauge_lines(prefix: str, stats: dict) -> list[str]:
+    return [f"{prefix}_{key} {value}" for key, value in stats.items()]
+
+
+@admin_router.get('/metrics', response_class=PlainTextResponse)
+async def metrics(request: Request):
+    '''
+    Prometheus text format: per-route request latency, statuses and time per phase, per-query database
+    statistics, connection pool, database and hashing executors, user and rendered page caches, templates compiled at startup.
+    admin only; a scraper sends the FORUM_METRICS_TOKEN bearer token instead
+    '''
+    _require_metrics_access(request)
+    lines = request_metrics.prometheus_lines(request_metrics.route_metrics)
+    lines += prometheus_lines(database.query_stats)
+    lines += _gauge_lines("forum_db_pool", database.pool_stats())
+    lines += _gauge_lines("forum_db_executor", async_database.executor_stats())
+    lines += _gauge_lines("forum_hashing_executor", auth.hashing_stats())
+    lines += _gauge_lines("forum_user_cache", auth.user_cache.stats())
+    lines += _gauge_lines("forum_page_cache", page_cache.rendered_pages.stats())
+    lines += _gauge_lines("forum_templates_preloaded", templating.template_stats())
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+@admin_router.get('/admin/queries')
+async def view_query_stats(request: Request):
+    '''
+    admin only; the statements run so far by SQL fingerprint, the most total time first
+    '''
+    _require_admin(request)
+    return {
+        "slow_query_ms": database.query_stats.slow_query_seconds * 1000,
+        "pool": database.pool_stats(),
+        "executor": async_database.executor_stats(),
+        "hashing": auth.hashing_stats(),
+        "user_cache": auth.user_cache.stats(),
+        "queries": database.query_stats.snapshot(),
+    }
+
+
+@admin_router.delete('/admin/queries', status_code=204)
+async def reset_query_stats(request: Request):
+    _require_admin(request)
+    database.query_stats.reset()
+
+
+@admin_router.get('/admin/requests')
+async def view_request_stats(request: Request):
+    '''
+    admin only; latency, statuses and time spent in auth, sql, db_wait and render per route template
+    '''
+    _require_admin(request)
+    return {
+        "slow_request_ms": request_metrics.SLOW_REQUEST_SECONDS * 1000,
+        "latency_buckets": request_metrics.route_metrics.buckets,
+        "routes": request_metrics.route_metrics.snapshot(),
+    }
+
+
+@admin_router.delete('/admin/requests', status_code=204)
+async def reset_request_stats(request: Request):
+    _require_admin(request)
+    request_metrics.route_metrics.reset()
@@ -12,18 +12,21 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing import Annotated, Optional
 from pydantic import StringConstraints
 import services.categories_services as categories_services
+from services import access_services
+from services.users_services import request_usernames
 from models.categories import CategoryResponseModel, Category
 from models.topic import Topic
-from models.user import User
+from models.user import Principal
 import common.auth as auth
 import common.responses as responses
-from fastapi.templating import Jinja2Templates
+from common import conditional, page_cache, pagination
+from common.templating import Templates
 
 categories_router = APIRouter(prefix="/categories")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-templates = Jinja2Templates(directory="templates/category_templates")
+templates = Templates(directory="templates/category_templates")
 
 
 @categories_router.get("/", response_model=list[CategoryResponseModel])
@@ -31,19 +34,14 @@ async def view_categories(
     request: Request,
     name: Annotated[str | None, Query(max_length=45)] = None,
     page: Annotated[int, Query(ge=1)] = 1,
+    cursor: str | None = None,
 ):
-    token = request.cookies.get("access_token")
-    try:
-        user = await auth.get_current_user(token)
-        categories = categories_services.get_all_categories(user, name, page)
-        return templates.TemplateResponse(
-            "view_categories.html", {"request": request, "categories": categories}
-        )
-    except:
-        categories = categories_services.get_all_categories(name_filter=name, page=page)
-        return templates.TemplateResponse(
-            "view_categories.html", {"request": request, "categories": categories}
-        )
+    user = auth.get_optional_principal(request)
+    categories = await categories_services.get_all_categories(user, name, page, cursor)
+    next_cursor = pagination.next_cursor(categories, categories_services.category_position)
+    return templates.TemplateResponse(
+        "view_categories.html", {"request": request, "categories": categories, "next_cursor": next_cursor}
+    )
 
 
 @categories_router.get("/create_category", response_class=HTMLResponse)
@@ -77,23 +75,26 @@ async def view_topics_by_category_id(
     topic_title: Annotated[str, StringConstraints(min_length=1, max_length=200)] = None,
     sorted: Annotated[str, StringConstraints(pattern="^(asc|desc)$")] = "asc",
     page: Annotated[int, Query] = 1,
+    cursor: str | None = None,
 ):
-    token = request.cookies.get("access_token")
-    try:
-        user = await auth.get_current_user(token)
-        topics = categories_services.get_topics_by_cat_id(
-            cat_id=cat_id, user=user, title=topic_title, sorting=sorted, page=page
-        )
-        return templates.TemplateResponse(
-            "view_topics_by_cat.html", {"request": request, "topics": topics}
-        )
-    except:
-        topics = categories_services.get_topics_by_cat_id(
-            cat_id=cat_id, title=topic_title, sorting=sorted, page=page
-        )
-        return templates.TemplateResponse(
-            "view_topics_by_cat.html", {"request": request, "topics": topics}
-        )
+    user = auth.get_optional_principal(request)
+    # answered before the topics are read and rendered, when nothing in the category moved
+    readable = await access_services.readable_categories(user)
+    *version, last_modified = await categories_services.get_category_version(cat_id)
+    etag = conditional.weak_etag("category", cat_id, readable is None or cat_id in readable, *version)
+    if conditional.is_not_modified(request, etag, last_modified):
+        return conditional.not_modified(etag, last_modified)
+
+    topics = await categories_services.get_topics_by_cat_id(
+        cat_id=cat_id, user=user, title=topic_title, sorting=sorted, page=page, cursor=cursor,
+        usernames=request_usernames(request),
+    )
+    next_cursor = pagination.next_cursor(topics, categories_services.topic_position)
+    page_cache.tag(*(page_cache.topic_tag(topic.id) for topic in topics))
+    return templates.TemplateResponse(
+        "view_topics_by_cat.html", {"request": request, "topics": topics, "next_cursor": next_cursor},
+        headers=conditional.validator_headers(etag, last_modified),
+    )
 
 
 @categories_router.get("/{cat_id}/privileged_users")
@@ -101,8 +102,7 @@ async def get_privileged_users_by_cat(
     cat_id: Annotated[int, Path(ge=1)],
     request: Request,
 ):
-    token = request.cookies.get("access_token")
-    logged_user: User = await auth.get_current_user(token)
+    logged_user: Principal = auth.get_principal(request)
     if logged_user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
@@ -110,7 +110,7 @@ async def get_privileged_users_by_cat(
         )
 
     try:
-        privileged_users = categories_services.get_privileged_users(cat_id)
+        privileged_users = await categories_services.get_privileged_users(cat_id)
         return templates.TemplateResponse("return_view_privileged_users.html", {"request": request, "privileged_users": privileged_users})
     except:
         return templates.TemplateResponse("return_vpu_no_cont.html", {"request": request, "content": f"Category with id '{cat_id}' is not private or it doesn't exists!"})
@@ -124,8 +124,7 @@ async def create_category(
     privacy_status: str = Form(pattern="^(private|non_private)$"),
     access_status: str = Form(pattern="^(locked|unlocked)$"),
 ):
-    token = request.cookies.get("access_token")
-    user: User = await auth.get_current_user(token)
+    user: Principal = auth.get_principal(request)
     if user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
@@ -139,7 +138,7 @@ async def create_category(
     )
     
     try:
-        category = categories_services.create_new_category(category, user.id)
+        category = await categories_services.create_new_category(category, user.id)
         return templates.TemplateResponse("return_category_model.html", {"request": request, "category": category})
     except:
         return templates.TemplateResponse("return_category_duplicate.html", {"request": request, "content": f"Category with name '{category.name}' already exists!"})
@@ -149,8 +148,7 @@ async def lock_category(
     request: Request,
     cat_id: Annotated[int, Path(ge=1)]
 ):
-    token = request.cookies.get("access_token")
-    logged_user: User = await auth.get_current_user(token)
+    logged_user: Principal = auth.get_principal(request)
     if logged_user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
@@ -158,7 +156,7 @@ async def lock_category(
         )
 
     try:
-        categories_services.lock_category_by_id(cat_id)
+        await categories_services.lock_category_by_id(cat_id)
     except:
         return templates.TemplateResponse("return_lock_category.html", {"request": request, "content": f"Category with id '{cat_id}' doesnt exists or it's already locked!"})
 
@@ -170,8 +168,7 @@ async def change_privacy(
     cat_id: Annotated[int, Path(ge=1)],
     privacy_status: str = Form(pattern="^(private|non_private)$"),
 ):
-    token = request.cookies.get("access_token")
-    user: User = await auth.get_current_user(token)
+    user: Principal = auth.get_principal(request)
     if user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
@@ -179,7 +176,7 @@ async def change_privacy(
         )
 
     try:
-        response = categories_services.change_category_privacy(cat_id, privacy_status)
+        response = await categories_services.change_category_privacy(cat_id, privacy_status)
     except:
         return templates.TemplateResponse(
             "return_change_privacy.html",
@@ -203,15 +200,14 @@ async def revoke_user_access(
     cat_id: Annotated[int, Path(ge=1)],
     user_id: int = Form(ge=1),
 ):
-    token = request.cookies.get("access_token")
-    logged_user: User = await auth.get_current_user(token)
+    logged_user: Principal = auth.get_principal(request)
     if logged_user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
             detail="You are not admin! You are not authorized to revoke user access!",
         )
 
-    categories_services.revoke_access(user_id, cat_id)
+    await categories_services.revoke_access(user_id, cat_id)
     
     return templates.TemplateResponse("return_revoke_access.html", {"request": request, "content": f"If a user with the ID '{user_id}' previously had access to the category with ID '{cat_id}', they have already lost that access."})
 
@@ -222,15 +218,14 @@ async def give_user_read_access(
     cat_id: Annotated[int, Path(ge=1)],
     user_id: int = Form(ge=1),
 ):
-    token = request.cookies.get("access_token")
-    logged_user: User = await auth.get_current_user(token)
+    logged_user: Principal = auth.get_principal(request)
     if logged_user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
             detail="You are not admin! You are not authorized to give read access!",
         )
     try:
-        categories_services.give_read_access_to_user(user_id, cat_id)
+        await categories_services.give_read_access_to_user(user_id, cat_id)
     except:
         return templates.TemplateResponse(
             "return_crws_form.html",
@@ -255,8 +250,7 @@ async def give_user_write_access(
     cat_id: Annotated[int, Path(ge=1)],
     user_id: int = Form(ge=1),
 ):
-    token = request.cookies.get("access_token")
-    logged_user: User = await auth.get_current_user(token)
+    logged_user: Principal = auth.get_principal(request)
     if logged_user.is_admin == 0:
         raise HTTPException(
             status_code=responses.Unauthorized().status_code,
@@ -264,7 +258,7 @@ async def give_user_write_access(
         )
 
     try:
-        categories_services.give_write_access_to_user(user_id, cat_id)
+        await categories_services.give_write_access_to_user(user_id, cat_id)
     except:
         return templates.TemplateResponse(
             "return_crws_form.html",
@@ -4,17 +4,18 @@ from fastapi import APIRouter, Depends, Query, Body, status, Request, HTTPExcept
 from typing import Annotated, Optional
 from common import auth
 from services.messages_services import get_messages, get_messages_user, post_message, flatten
-from models.user import User
+from services import broadcast_services
+from models.user import Principal
 from common import responses
-from models.message import Message, MessageResponseModelConversation, MessageResponseModelChat
+from models.message import Message, MessageResponseModelConversation, MessageResponseModelChat, Broadcast
 from fastapi.responses import JSONResponse
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
+from common.templating import Templates
 
 
 
 messages_router = APIRouter(prefix='/messages')
-templates = Jinja2Templates(directory="templates")
+templates = Templates(directory="templates")
 
 
 
@@ -37,14 +38,46 @@ async def send_message(
                         401 Unauthorized ("Could not validate credentials") -
                         when invalid access token)
     '''
-    access_token = request.cookies.get("access_token")
-    user: User = await auth.get_current_user(access_token)
+    user: Principal = auth.get_principal(request)
     try:
         await post_message(user.id, recipients, subject, content, id_parent_message)
     except:
         return templates.TemplateResponse("no_such_user_template.html", context={"request": request})
     return templates.TemplateResponse("message_sent.html", context={"request": request})
         
+
+
+@messages_router.post('/broadcast', response_model=Broadcast, status_code=status.HTTP_202_ACCEPTED)
+async def send_broadcast(
+    request: Request,
+    subject: str = Form(...),
+    content: str = Form(...),
+    category_id: int = Form(None)
+    ):
+    '''
+    parameters: subject, content, category_id - members of this private category, all users when omitted
+    act: - admin only; stores the message and queues the delivery to the recipients
+    output: the broadcast with its progress, before any recipient is delivered;
+            GET /messages/broadcast/{id} reports the progress later on
+    '''
+    user: Principal = auth.get_principal(request)
+    if not user.is_admin:
+        raise HTTPException(status_code=responses.Unauthorized().status_code,
+                            detail="You are not admin! You are not authorized to send broadcasts!")
+    return await broadcast_services.create_broadcast(user.id, subject, content, category_id)
+
+
+@messages_router.get('/broadcast/{broadcast_id}', response_model=Broadcast)
+async def view_broadcast(request: Request, broadcast_id: int):
+    user: Principal = auth.get_principal(request)
+    if not user.is_admin:
+        raise HTTPException(status_code=responses.Unauthorized().status_code,
+                            detail="You are not admin! You are not authorized to view broadcasts!")
+    broadcast = await broadcast_services.get_broadcast(broadcast_id)
+    if broadcast is None:
+        raise HTTPException(status_code=responses.NotFound().status_code, detail=f"Broadcast {broadcast_id} not found")
+    return broadcast
+
     
 @messages_router.get("/template")
 async def get_sendtemplate(request: Request, old_content: str = Query(""), 
@@ -55,10 +88,9 @@ async def get_sendtemplate(request: Request, old_content: str = Query(""),
     if access_token == auth.DUMMY_ACCESS_TOKEN:
         response = RedirectResponse(url="/users/dashboard", status_code=303)
     else:
-        try:
-            await auth.get_current_user(access_token)
+        if auth.get_optional_principal(request):
             response = templates.TemplateResponse("send_message_template.html", context={"request": request, "old_content": old_content, "id_parent_message": id_parent_message, "previous_author": previous_author, "previous_subject": previous_subject})
-        except:   
+        else:   
             response = RedirectResponse(url="/", status_code=303)
     return response       
 
@@ -81,7 +113,7 @@ async def get_all_user(request: Request, users: str = Query(""), paginated: str
         response = RedirectResponse(url="/users/dashboard", status_code=303)
     else:
         try:
-            user = await auth.get_current_user(access_token)
+            user = auth.get_principal(request)
             if users == "":
                 if not page:
                     messages = await get_messages(user.id, sort, paginated, page=1)
@@ -111,10 +143,9 @@ async def get_viewtemplate(request: Request):
     if access_token == auth.DUMMY_ACCESS_TOKEN:
         response = RedirectResponse(url="/users/dashboard", status_code=303)
     else:
-        try:
-            await auth.get_current_user(access_token)
+        if auth.get_optional_principal(request):
             response = templates.TemplateResponse("get_messages_template.html", context={"request": request})
-        except:   
+        else:   
             response = RedirectResponse(url="/", status_code=303)
     return response   
     
\ No newline at end of file
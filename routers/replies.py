@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, Form, Query, Path, Request, Response, st
 from datetime import datetime
 from typing import Annotated
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from common.auth import get_current_user, oauth2_scheme
+from common.templating import Templates
+from common.auth import get_current_user, get_principal, oauth2_scheme
 from models.reply import Reply, Vote
 from common.reply_responses import (create_reply_response, choose_best_reply_response,
                                     vote_response, edit_reply_response)
@@ -12,7 +12,7 @@ from services import replies_services as rs
 from mariadb import _mariadb as mdb
 
 replies_router = APIRouter(prefix='/replies')
-templates = Jinja2Templates(directory="templates/reply_templates")
+templates = Templates(directory="templates/reply_templates")
 
 
 @replies_router.get('/create/{id}', response_class=HTMLResponse)
@@ -31,14 +31,13 @@ async def create_reply(
                             description='Enter text between [10 | 1000] symbols')],
         request: Request
         ) -> Reply or NotFound:
-    token = request.cookies.get("access_token")
-    user = await get_current_user(token)
-    existing_topic = rs.topic_exists(id)
+    user = get_principal(request)
+    existing_topic = await rs.topic_exists(id)
 
     if not existing_topic:
         return NotFound(content=f'Topic {id} doesn\'t exist')
         
-    if rs.topic_is_locked(existing_topic.id):
+    if await rs.topic_is_locked(existing_topic.id):
         return Locked(content=f'Topic {existing_topic.id} is locked!')
     
     new_reply = Reply(topic_id=existing_topic.id, 
@@ -47,16 +46,16 @@ async def create_reply(
                       created_on=datetime.utcnow()
                     )
     
-    if not rs.topic_is_in_a_private_category(existing_topic):
+    if not await rs.topic_is_in_a_private_category(existing_topic):
         try:
-            rs.create_reply(new_reply)
+            await rs.create_reply(new_reply)
         except mdb.IntegrityError as ie:
             return BadRequest(content=str(ie))
 
         return templates.TemplateResponse("reply_templates/create_reply.html", {"request": request, "new_reply": new_reply, "id": id})        
-    elif rs.user_has_write_access(existing_topic, user):
+    elif await rs.user_has_write_access(existing_topic, user):
         try:
-            rs.create_reply(new_reply)
+            await rs.create_reply(new_reply)
         except mdb.IntegrityError as ie:
             return BadRequest(content=str(ie))
         
@@ -78,9 +77,8 @@ async def choose_best_reply(
         ) -> Reply or NotFound:
     '''choose best reply 
         /only the author of the topic can do it/'''
-    token = request.cookies.get("access_token")
-    user = await get_current_user(token)
-    existing_topic = rs.topic_exists(topic_id)
+    user = get_principal(request)
+    existing_topic = await rs.topic_exists(topic_id)
 
     if not existing_topic:
         return NotFound(content=f'Topic {topic_id} doesn\'t exist')
@@ -89,15 +87,15 @@ async def choose_best_reply(
         return Response(status_code=status.HTTP_403_FORBIDDEN, 
                         content='You are not the author of this topic!')
     
-    if rs.topic_has_best_reply(existing_topic):
+    if await rs.topic_has_best_reply(existing_topic):
         return BestReplyExists(content='This topic already has a best reply')
     
-    existing_reply = rs.get_reply_by_id(topic_id, reply_id)
+    existing_reply = await rs.get_reply_by_id(topic_id, reply_id)
     
     if not existing_reply:
         return NotFound(content=f'Reply {reply_id} doesn\'t exist')
     
-    result = rs.choose_best(existing_reply, existing_topic.id)
+    result = await rs.choose_best(existing_reply, existing_topic.id)
     if result: existing_reply.is_best = True
 
     if result:
@@ -118,13 +116,12 @@ async def vote(
         ) -> Reply or NotFound:
     '''upvote/downvote/remove vote for a specific reply'''
 
-    token = request.cookies.get("access_token")
-    user = await get_current_user(token)
-    existing_reply = rs.get_reply_by_id(topic_id, reply_id)
+    user = get_principal(request)
+    existing_reply = await rs.get_reply_by_id(topic_id, reply_id)
     if not existing_reply:
         return NotFound(content=f'Reply {reply_id} doesn\'t exist')
     
-    votes_result = rs.check_user_vote_for_reply(user.id, existing_reply, vote)
+    votes_result = await rs.check_user_vote_for_reply(user.id, existing_reply, vote)
     if votes_result:
         upvotes, downvotes = votes_result
         return templates.TemplateResponse("templates/topic_templates/list_topics.html", 
@@ -151,10 +148,10 @@ async def edit_reply(
         ) -> Reply or NotFound:
     
     user = await get_current_user(token)
-    if not rs.topic_exists(topic_id):
+    if not await rs.topic_exists(topic_id):
         return NotFound(content=f'Topic {topic_id} doesn\'t exist')
     
-    existing_reply = rs.get_reply_by_id(topic_id, reply_id)
+    existing_reply = await rs.get_reply_by_id(topic_id, reply_id)
     if not existing_reply:
         return NotFound(content=f'Reply {reply_id} doesn\'t exist')
     
@@ -162,7 +159,7 @@ async def edit_reply(
         return Response(status_code=status.HTTP_403_FORBIDDEN, 
                         content='You are not the author of this reply!')
     
-    result = rs.edit_reply(existing_reply, new_content)
+    result = await rs.edit_reply(existing_reply, new_content)
     if result: existing_reply.content = new_content
         
     return existing_reply if result else InternalServerError
\ No newline at end of file
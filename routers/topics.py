@@ -1,21 +1,23 @@
+from contextlib import aclosing
 from datetime import datetime
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from common.auth import get_current_user
+from common.templating import Templates
+from common import conditional, page_cache, pagination
+from common.auth import get_principal, get_optional_principal
 from typing import Annotated, Optional
 from fastapi import APIRouter, Form, Query, Path, Response, status, Request
-from models.reply import Reply
+from models.reply import Reply, ReplyRow
 from models.topic import Topic
 from common.responses import BadRequest, Locked, NotFound
 from common.topic_responses import (create_topic_response, view_all_topics_response, count_topics_response, 
                                     view_topic_by_id_response, edit_topic_response, lock_topic_response)
 from mariadb import _mariadb as mdb
-from models.user import User
 from services import topics_services as ts
+from services.users_services import request_usernames
 
 topics_router = APIRouter(prefix="/topics")
 
-templates = Jinja2Templates(directory="templates/topic_templates")
+templates = Templates(directory="templates/topic_templates")
 
 @topics_router.get('/search_topics', response_class=HTMLResponse)
 async def search(request: Request): 
@@ -31,8 +33,8 @@ async def view_all(
     sort_latest_first: bool = True,
     paginated: bool = True,
     page: int = 1,
+    cursor: str | None = None,
     ) -> list[Topic|Reply]: 
-    token = request.cookies.get("access_token")
 
     '''Responds with a list of Topic resources'''
 
@@ -40,24 +42,34 @@ async def view_all(
     if search:
         search = list(set(word for word in search.split()).difference(blacklist))
 
-    try:
-        user = await get_current_user(token)
-        result = ts.view_all_topics(user=user, 
-                                    search_in_title=search, 
-                                    include_topics=include_topics, 
-                                    include_replies=include_replies, 
-                                    sort_by_date=sort_latest_first, 
-                                    paginated=paginated, 
-                                    default_page=page) 
-    except:
-        result = ts.view_all_topics(search_in_title=search, 
-                                    include_topics=include_topics, 
-                                    include_replies=include_replies, 
-                                    sort_by_date=sort_latest_first, 
-                                    paginated=paginated, 
-                                    default_page=page
-                                    )
-    return templates.TemplateResponse("list_topics.html", {"request": request, "result": result})
+    if not paginated:
+        # everything that matches: sent while it is read rather than built up in memory first
+        rows = ts.stream_all_topics(user=get_optional_principal(request),
+                                    search_in_title=search,
+                                    include_topics=include_topics,
+                                    include_replies=include_replies,
+                                    sort_by_date=sort_latest_first)
+        return templates.StreamingTemplateResponse("list_topics.html", {"request": request, "result": _tagged(rows), "next_cursor": None})
+
+    result, next_cursor = await ts.view_all_topics(user=get_optional_principal(request), 
+                                search_in_title=search, 
+                                include_topics=include_topics, 
+                                include_replies=include_replies, 
+                                sort_by_date=sort_latest_first, 
+                                paginated=paginated, 
+                                default_page=page,
+                                cursor=cursor,
+                                usernames=request_usernames(request)) 
+    page_cache.tag(*(page_cache.topic_tag(item.id if isinstance(item, Topic) else item.topic_id) for item in result))
+    return templates.TemplateResponse("list_topics.html", {"request": request, "result": result, "next_cursor": next_cursor})
+
+
+async def _tagged(rows):
+    '''rows of a streamed listing, each tagging the cached page with its topic as it goes by'''
+    async with aclosing(rows):
+        async for item in rows:
+            page_cache.tag(page_cache.topic_tag(item.topic_id if isinstance(item, ReplyRow) else item.id))
+            yield item
 
 
 @topics_router.get('/create', response_class=HTMLResponse)
@@ -73,28 +85,41 @@ async def lock_topic_form(request: Request,
 @topics_router.get('/count/', responses=count_topics_response)
 async def topics_count(request: Request,) -> int:
     '''Helping function to define the pages in the forum client'''
-    token = request.cookies.get("access_token")
-    user: User = await get_current_user(token)
+    user = get_principal(request)
     if user.is_admin:
-        topics = ts._count_topics_admin()
+        topics = await ts._count_topics_admin()
     else:
-        topics = ts._count_topics_regular(user.id)
+        topics = await ts._count_topics_regular(user)
 
     return templates.TemplateResponse("count_topics.html", {"request": request, "topics": topics})
 
 
 @topics_router.get('/{id}', response_model=Topic, responses=view_topic_by_id_response) 
-def view_topic(
+async def view_topic(
     id: Annotated[int, Path(description='The ID of the topic you want to view')],
-    request: Request
+    request: Request,
+    cursor: str | None = None,
+    page_size: Annotated[int, Query(ge=1, le=pagination.MAX_PAGE_SIZE, description='Replies per page')] = pagination.PAGE_SIZE,
     ) -> Topic or NotFound:
 
-    '''Responds with a single Topic resource and a list of Reply resources'''
+    '''Responds with a single Topic resource and one page of its Reply resources, newest first'''
+
+    version = await ts.get_topic_version(id)
+    headers = None
+    if version:
+        # answered before the replies are read and rendered, when the topic didn't change
+        etag, last_modified = conditional.weak_etag("topic", id, version[0]), version[1]
+        if conditional.is_not_modified(request, etag, last_modified):
+            return conditional.not_modified(etag, last_modified)
+        headers = conditional.validator_headers(etag, last_modified)
 
-    topic = ts.get_topic_by_id(id)
+    topic = await ts.get_topic_header(id)
     
     if topic:
-        return templates.TemplateResponse("view_topic.html", {"request": request, "topic": topic})  
+        # the replies are read while the page is sent
+        replies = ts.stream_topic_replies(topic, cursor, page_size)
+        return templates.StreamingTemplateResponse("view_topic.html", {"request": request, "topic": topic, "replies": replies},
+                                                   headers=headers)  
     else:
         return templates.TemplateResponse("view_topic.html",
                         {"request": request, "content": NotFound(content=f'Topic with id {id} is not found')})
@@ -108,9 +133,7 @@ async def create_topic(
     category_id: int = Form()
     ) -> Topic or BadRequest:
     ''' requires authentication token '''
-    token = request.cookies.get("access_token")
-
-    user = await get_current_user(token)
+    user = get_principal(request)
     new_topic = Topic(
         title=title, 
         created_on=datetime.utcnow(),
@@ -118,16 +141,16 @@ async def create_topic(
         category_id=category_id, 
         author_id=user.id
     )
-    if not ts.topic_is_in_a_private_category(new_topic):
+    if not await ts.topic_is_in_a_private_category(new_topic):
         try:
-            ts.create_topic(new_topic)
+            await ts.create_topic(new_topic)
         except mdb.IntegrityError as ie:
             return BadRequest(content=str(ie))
 
         return templates.TemplateResponse("create_topic.html", {"request": request, "new_topic": new_topic})
-    elif ts.user_has_write_access(new_topic, user):
+    elif await ts.user_has_write_access(new_topic, user):
         try:
-            ts.create_topic(new_topic)
+            await ts.create_topic(new_topic)
         except mdb.IntegrityError as ie:
             return BadRequest(content=str(ie))
 
@@ -156,9 +179,8 @@ async def edit_topic(
     '''the author (should be logged in/authenticated) 
         should be able to edit the name and/or content of the topic 
         What about admins? Maybe they can also edit other users's topics/replies'''
-    token = request.cookies.get("access_token")
-    user = await get_current_user(token)
-    existing_topic = ts.get_topic_by_id(id=id)
+    user = get_principal(request)
+    existing_topic = await ts.get_topic_header(id)
     if not existing_topic:
         return NotFound
     
@@ -169,7 +191,7 @@ async def edit_topic(
     if existing_topic.is_locked:
         return Locked(content='The topic is locked and cannot be modified!')
 
-    return ts.edit_topic(existing_topic, new_title, new_text)
+    return await ts.edit_topic(existing_topic, new_title, new_text)
     
     
 @topics_router.post('/lock/{id}', status_code=status.HTTP_200_OK, responses=lock_topic_response) 
@@ -179,9 +201,8 @@ async def lock_topic(
         ) -> Topic or NotFound:
     
     '''admin endpoint, the topic can no longer accept replies'''
-    token = request.cookies.get("access_token")
-    user = await get_current_user(token)
-    existing_topic = ts.get_topic_by_id(id=id)
+    user = get_principal(request)
+    existing_topic = await ts.get_topic_header(id)
     
     if not existing_topic: return NotFound
     
@@ -190,7 +211,7 @@ async def lock_topic(
                         status_code=status.HTTP_403_FORBIDDEN, 
                         content='You are not admin!'
                         )    
-    lock_result = ts.lock_topic(existing_topic.id)
+    lock_result = await ts.lock_topic(existing_topic.id)
     if not lock_result:
         return Response(
                         status_code=status.HTTP_208_ALREADY_REPORTED, 
@@ -1,17 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, status, Request, Form, Query
 from fastapi.security import OAuth2PasswordRequestForm
-from models.user import User
+from models.user import Principal
 import services.users_services as users_services
 from typing import Annotated
 import common.auth as auth
 import common.responses as responses
-from fastapi.templating import Jinja2Templates
+from common.templating import Templates
 from fastapi.responses import RedirectResponse
 
 
 users_router = APIRouter(prefix='/users')
 
-templates = Jinja2Templates(directory="templates")
+templates = Templates(directory="templates")
 
 
 @users_router.post('/', response_model = auth.Token, status_code= status.HTTP_201_CREATED, responses={400: {"detail": "string"}})
@@ -27,13 +27,14 @@ async def register_user(form_data: Annotated[OAuth2PasswordRequestForm, Depends(
                         or password non_conforming ("Password must be at leat 8 characters long, contain 
                         upper- and lower-case latin letters, digits and at least one of the special characters #?!@$%^&*-=+")
     '''
-    registration = users_services.register(form_data.username, form_data.password)
+    registration = await users_services.register(form_data.username, form_data.password)
     if isinstance(registration, AssertionError):
          return RedirectResponse("/", status_code=303)
     if not registration:
          return RedirectResponse("/", status_code=303) 
     username, password = registration
-    user = auth.authenticate_user(username, password)
+    # the password was checked and hashed a moment ago, no need to pay for bcrypt again
+    user = await auth.find_user(username)
     tokens = auth.token_response(user)
     response = RedirectResponse(url="/users/dashboard", status_code=303)
     response.set_cookie(key="access_token", value=tokens["access_token"], httponly=True)
@@ -52,7 +53,7 @@ async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm,
     '''
 
     
-    user = auth.authenticate_user(form_data.username, form_data.password)
+    user = await auth.authenticate_user(form_data.username, form_data.password)
     if not user:
         return RedirectResponse("/", status_code=303)   
     tokens = auth.token_response(user)
@@ -109,14 +110,13 @@ async def get_user(request: Request, username: str = Form(...)):
                         400 Bad Request ("The username provided does not exist") - 
                         if username of user to be set as admin could not be found 
     '''
-    access_token = request.cookies.get("access_token")
-    user: User = await auth.get_current_user(access_token)    
+    user: Principal = auth.get_principal(request)
     if user.is_admin == 0:
         return RedirectResponse(url="/users/dashboard", status_code=303)
-    update_user = auth.find_user(username)
+    update_user = await auth.find_user(username)
     if not update_user:
         return RedirectResponse(url="/users/adminchange?message=Wrong username provided", status_code=303,)
-    users_services.set_admin(update_user.id)
+    await users_services.set_admin(update_user.id)
     return templates.TemplateResponse("changed_to_admin.html", context={"request": request, "username": username})
 
 @users_router.get("/dashboard")
@@ -125,7 +125,7 @@ async def get_functionality(request: Request):
     if access_token == auth.DUMMY_ACCESS_TOKEN:
         user_role = "guest"
     else:
-        user = await auth.get_current_user(access_token)
+        user = auth.get_principal(request)
         if user.is_admin == 1:
             user_role  = "admin"
         else:
@@ -138,7 +138,7 @@ async def get_functionality(request: Request, message: str = Query("")):
     if access_token == auth.DUMMY_ACCESS_TOKEN:
         response = RedirectResponse(url="/users/dashboard", status_code=303)
     else:
-        user = await auth.get_current_user(access_token)
+        user = auth.get_principal(request)
         if user.is_admin == 1:
             return templates.TemplateResponse("change_admin_template.html", context={"request": request, "message": message})
         else:
@@ -0,0 +1,79 @@
+from data.async_database import read_query
+from common.cache import TTLCache
+from models.user import User
+import os
+
+
+ACCESS_CACHE_TTL_SECONDS = float(os.environ.get("FORUM_ACCESS_CACHE_TTL", 300))
+ACCESS_CACHE_MAX_SIZE = int(os.environ.get("FORUM_ACCESS_CACHE_SIZE", 10000))
+
+_PUBLIC = "public"
+
+PUBLIC_CATEGORIES_QUERY = "SELECT id_category FROM categories WHERE is_private = 0"
+# a user's readable private categories and write access to them
+PRIVATE_CATEGORIES_QUERY = '''SELECT pc.categories_id_category, pc.has_write_access
+                            FROM private_categories pc
+                            JOIN categories c ON c.id_category = pc.categories_id_category
+                            WHERE pc.users_id_user = ? AND c.is_private = 1'''
+
+
+# the ids of the public categories under _PUBLIC, and (readable, writable) private category ids by user id
+access_cache = TTLCache(maxsize=ACCESS_CACHE_MAX_SIZE, ttl=ACCESS_CACHE_TTL_SECONDS)
+
+
+async def _public_categories() -> frozenset[int]:
+    public = access_cache.get(_PUBLIC)
+    if public is None:
+        generation = access_cache.generation
+        public = frozenset(row[0] for row in await read_query(PUBLIC_CATEGORIES_QUERY))
+        access_cache.set(_PUBLIC, public, generation)
+    return public
+
+
+async def _private_categories(user_id: int) -> tuple[frozenset[int], frozenset[int]]:
+    private = access_cache.get(user_id)
+    if private is None:
+        # a change committed while this read runs invalidates after it, and then keeps it out of the cache
+        generation = access_cache.generation
+        rows = await read_query(PRIVATE_CATEGORIES_QUERY, (user_id,))
+        private = (frozenset(row[0] for row in rows), frozenset(row[0] for row in rows if row[1] == 1))
+        access_cache.set(user_id, private, generation)
+    return private
+
+
+async def readable_categories(user: User | None) -> frozenset[int] | None:
+    '''ids of the categories the user can read; None for admins, who can read all of them'''
+    if user and user.is_admin:
+        return None
+    public = await _public_categories()
+    if not user:
+        return public
+    readable, _ = await _private_categories(user.id)
+    return public | readable
+
+
+async def writable_categories(user: User) -> frozenset[int]:
+    '''ids of the categories the user can write in; private ones need write access, admins included'''
+    _, writable = await _private_categories(user.id)
+    return await _public_categories() | writable
+
+
+async def can_write(user: User, category_id: int) -> bool:
+    return category_id in await writable_categories(user)
+
+
+def category_filter(column: str, categories: frozenset[int]) -> tuple[str, list[int]]:
+    '''WHERE condition and params keeping the rows whose column is one of categories'''
+    if not categories:
+        return "FALSE", []
+    return f"{column} IN ({', '.join('?' for _ in categories)})", sorted(categories)
+
+
+def invalidate_user(user_id: int):
+    '''drop a user's cached private categories after their access changed'''
+    access_cache.pop(user_id)
+
+
+def invalidate_categories():
+    '''drop everything after a category was created or changed its privacy'''
+    access_cache.clear()
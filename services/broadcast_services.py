@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from fastapi import HTTPException
+from data.async_database import read_query, insert_query, update_query, transaction
+from models.message import Broadcast
+from services import messages_services
+import common.responses as responses
+
+
+BROADCAST_CHUNK_SIZE = int(os.environ.get("FORUM_BROADCAST_CHUNK_SIZE", 1000))
+
+logger = logging.getLogger(__name__)
+
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+
+_BROADCAST_COLUMNS = '''id_broadcast, id_message, id_category, status, total_recipients, delivered, created_on, finished_on'''
+
+
+def _recipients_query(category_id: int | None) -> tuple[str, str]:
+    '''FROM ... WHERE part selecting the recipients of a broadcast (never the author), and its id column'''
+    if category_id is None:
+        return 'FROM users WHERE id_user <> ?', 'id_user'
+    return 'FROM private_categories WHERE categories_id_category = ? AND users_id_user <> ?', 'users_id_user'
+
+
+def _recipients_params(category_id: int | None, author_id: int) -> tuple:
+    return (author_id,) if category_id is None else (category_id, author_id)
+
+
+async def create_broadcast(user_id: int, subject: str, content: str, category_id: int | None = None) -> Broadcast:
+    '''Stores the message and its outbox row and hands the delivery to the worker;
+    returns at once, however many recipients there are.'''
+    if category_id is not None:
+        category = await read_query('SELECT is_private FROM categories WHERE id_category = ?', (category_id,))
+        if not category or category[0][0] != 1:
+            raise HTTPException(status_code=responses.NotFound().status_code,
+                                detail=f"Category with id '{category_id}' is not private or it doesn't exist!")
+
+    recipients, _ = _recipients_query(category_id)
+    created_on = datetime.utcnow()
+    async with transaction():
+        total = (await read_query(f'SELECT COUNT(*) {recipients}', _recipients_params(category_id, user_id)))[0][0]
+        if total == 0:
+            raise HTTPException(status_code=responses.NotFound().status_code, detail="No recipients")
+        message_id = await insert_query('insert into messages(content, created_on, subject, id_author) values(?,?,?,?)',
+                                        (content, created_on, subject, user_id))
+        broadcast_id = await insert_query('''INSERT INTO message_broadcasts (id_message, id_category, total_recipients, created_on)
+                                          VALUES (?, ?, ?, ?)''', (message_id, category_id, total, created_on))
+
+    # after the commit, so the worker finds the outbox row
+    enqueue(broadcast_id)
+    return Broadcast(id=broadcast_id, message_id=message_id, category_id=category_id, status='pending',
+                     total_recipients=total, delivered=0, created_on=created_on)
+
+
+async def get_broadcast(broadcast_id: int) -> Broadcast | None:
+    data = await read_query(f'SELECT {_BROADCAST_COLUMNS} FROM message_broadcasts WHERE id_broadcast = ?', (broadcast_id,))
+    return next((Broadcast.from_query_result(*row) for row in data), None)
+
+
+async def deliver(broadcast_id: int) -> int:
+    '''Inserts the recipients of a broadcast in chunks of BROADCAST_CHUNK_SIZE, each chunk in its own transaction
+    together with the progress in the outbox row; returns the number of recipients delivered by this call.
+    Every app process queues the pending broadcasts on start, so each chunk starts by locking the outbox row
+    and reading the progress under that lock; a row locked by another worker is left to it.'''
+    data = await read_query('''SELECT b.id_message, b.id_category, m.id_author
+                            FROM message_broadcasts b JOIN messages m ON m.id_message = b.id_message
+                            WHERE b.id_broadcast = ? AND b.status = 'pending' ''', (broadcast_id,))
+    if not data:
+        return 0
+    message_id, category_id, author_id = data[0]
+    recipients, id_column = _recipients_query(category_id)
+    params = _recipients_params(category_id, author_id)
+
+    delivered = 0
+    while True:
+        async with transaction():
+            progress = await read_query('''SELECT last_recipient FROM message_broadcasts
+                                        WHERE id_broadcast = ? AND status = 'pending' FOR UPDATE SKIP LOCKED''',
+                                        (broadcast_id,))
+            if not progress:
+                # finished, failed, or another worker is delivering a chunk of it
+                return delivered
+            last_recipient = progress[0][0]
+            chunk = [row[0] for row in await read_query(
+                f'SELECT {id_column} {recipients} AND {id_column} > ? ORDER BY {id_column} LIMIT ?',
+                params + (last_recipient, BROADCAST_CHUNK_SIZE))]
+            if not chunk:
+                await update_query('''UPDATE message_broadcasts SET status = 'done', finished_on = ?
+                                   WHERE id_broadcast = ?''', (datetime.utcnow(), broadcast_id))
+                return delivered
+            await messages_services.add_recipients(message_id, chunk)
+            await update_query('''UPDATE message_broadcasts SET delivered = delivered + ?, last_recipient = ?
+                               WHERE id_broadcast = ?''', (len(chunk), chunk[-1], broadcast_id))
+        delivered += len(chunk)
+
+
+def enqueue(broadcast_id: int):
+    '''Without a running worker the broadcast stays pending in the outbox until the next start_worker.'''
+    if _queue is not None:
+        _queue.put_nowait(broadcast_id)
+
+
+async def _work(queue: asyncio.Queue):
+    while True:
+        broadcast_id = await queue.get()
+        try:
+            await deliver(broadcast_id)
+        except Exception:
+            logger.exception("broadcast %s failed", broadcast_id)
+            try:
+                await update_query("UPDATE message_broadcasts SET status = 'failed' WHERE id_broadcast = ?", (broadcast_id,))
+            except Exception:
+                logger.exception("could not mark broadcast %s as failed", broadcast_id)
+        finally:
+            queue.task_done()
+
+
+async def start_worker():
+    '''Starts the delivery task and queues the broadcasts left pending by the previous run.'''
+    global _queue, _worker
+    _queue = asyncio.Queue()
+    _worker = asyncio.create_task(_work(_queue))
+    for row in await read_query("SELECT id_broadcast FROM message_broadcasts WHERE status = 'pending' ORDER BY id_broadcast"):
+        _queue.put_nowait(row[0])
+
+
+async def stop_worker():
+    '''Stops the delivery task; an unfinished broadcast keeps its progress and resumes on the next start.'''
+    global _queue, _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+    _queue, _worker = None, None
@@ -1,12 +1,19 @@
 from fastapi import HTTPException
-from data.database import read_query, insert_query, update_query
+from data.async_database import read_query, insert_query, update_query, transaction
 from models.categories import Category, CategoryResponseModel, PrivilegedUsers
 from models.topic import Topic
 from models.user import User
 from datetime import datetime
 import common.responses as responses
+from common import page_cache, pagination
+from services import access_services
+from services.users_services import UsernameLoader
 from mariadb import _mariadb as mdb
 
+
+CATEGORY_VERSION_QUERY = 'SELECT COUNT(*), COALESCE(SUM(version), 0), MAX(updated_on) FROM topics WHERE id_category = ?'
+
+
 def read_category_params(info):
     id, name, created_on, privacy_status, access_status = info
 
@@ -25,7 +32,7 @@ def read_category_params(info):
     return info
 
 
-def read_topic_params(info):
+async def read_topic_params(info, author_names: dict[int, str] | None = None):
     id_topic, title, created_on, text, id_category, id_author, is_locked, replies, category_name = info
 
     if is_locked == 0:
@@ -33,7 +40,10 @@ def read_topic_params(info):
     elif is_locked == 1:
         is_locked = "locked"
 
-    author_name = find_user_by_id(id_author)
+    if author_names is not None:
+        author_name = author_names[id_author]
+    else:
+        author_name = await find_user_by_id(id_author)
 
     info = (
         id_topic,
@@ -76,50 +86,48 @@ def convert_read_write_access(data):
             data = "read"
     return data
     
-def find_user_by_id(id): 
-    query_data = read_query("SELECT username FROM users where id_user = ?", (id,))
+async def find_user_by_id(id): 
+    query_data = await read_query("SELECT username FROM users where id_user = ?", (id,))
     author_name = (next((name for name in query_data), None))[0]
 
     return author_name
 
 
-def get_all_categories(user: User = None, name_filter: str | None = None, page = int) -> list[Category] | None:
-    query = None
+def categories_query(categories: frozenset[int] | None, name_filter: str | None, position, page: int) -> tuple[str, tuple]:
+    '''SQL of get_all_categories; categories are the readable category ids, None for no restriction'''
+    query = """SELECT c.id_category, c.name, c.created_on, c.is_private, c.is_locked
+            FROM categories c"""
+    where = []
     params = []
-    if user:
-        if user.is_admin == 1:
-            query = """SELECT * FROM categories c"""
-            
-            if name_filter:
-                query += " WHERE c.name LIKE ?"
-                params.append(f"%{name_filter.lower()}%")
-        else:
-            query = """SELECT c.id_category, c.name, c.created_on, c.is_private, c.is_locked
-                    FROM categories c
-                    LEFT JOIN private_categories pc ON c.id_category = pc.categories_id_category
-                    WHERE (pc.users_id_user = ? or c.is_private = 0)"""
-            params.append(user.id)
-
-            if name_filter:
-                query += " AND c.name LIKE ?"
-                params.append(f"%{name_filter.lower()}%")
-
-    else:
-        query = """SELECT c.id_category, c.name, c.created_on, c.is_private, c.is_locked
-                FROM categories c
-                WHERE c.is_private = 0"""
-
-        if name_filter:
-            query += " AND c.name LIKE ?"
-            params.append(f"%{name_filter.lower()}%")
-
-    query += ''' ORDER BY c.name ASC
-                 LIMIT 10 OFFSET ?0'''
-    params.append(page - 1)
+    if categories is not None:
+        condition, category_params = access_services.category_filter("c.id_category", categories)
+        where.append(condition)
+        params.extend(category_params)
+
+    if name_filter:
+        where.append("c.name LIKE ?")
+        params.append(f"%{name_filter.lower()}%")
+
+    if position is not None:
+        condition, keyset_params = pagination.keyset(("c.name", "c.id_category"), position)
+        where.append(condition)
+        params.extend(keyset_params)
+
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += ''' ORDER BY c.name ASC, c.id_category ASC
+                 LIMIT ? OFFSET ?'''
+    params.extend([pagination.PAGE_SIZE, 0 if position is not None else (page - 1) * pagination.PAGE_SIZE])
+    return query, tuple(params)
+
+
+async def get_all_categories(user: User = None, name_filter: str | None = None, page = int, cursor: str | None = None) -> list[Category] | None:
+    position = pagination.decode_cursor(cursor, (str, int))
+    categories = await access_services.readable_categories(user)
     
     all_categories = [
         Category.from_query_result(*read_category_params(row))
-        for row in read_query(query, tuple(params))
+        for row in await read_query(*categories_query(categories, name_filter, position, page))
     ]
 
     return [
@@ -132,70 +140,68 @@ def get_all_categories(user: User = None, name_filter: str | None = None, page =
         for cat in all_categories
     ]
 
-def get_topics_by_cat_id(cat_id: int, user: User = None, title: str = None, sorting: str = None, page: int = 1):
-    query = None
-    params = None
-    if user:
-        if user.is_admin:
-            query = ''' WITH category AS (SELECT * FROM categories c LEFT JOIN private_categories pc ON c.id_category = pc.categories_id_category
-                        WHERE c.id_category = ?),
-                        replies_count AS (SELECT topics_id_topic, COUNT(*) as replies_count FROM replies GROUP BY topics_id_topic)
-                        SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author, t.is_locked, COALESCE(rc.replies_count, 0) as replies_count, c.name
-                        FROM topics t
-                        JOIN category c ON t.id_category = c.id_category
-                        LEFT JOIN replies_count rc ON t.id_topic = rc.topics_id_topic'''
-            params = [cat_id]
-
-            if title:
-                query += " AND t.title LIKE ?"
-                params.append(f"%{title}%")
+def category_position(category: CategoryResponseModel) -> list:
+    '''sort key of get_all_categories, for pagination.next_cursor'''
+    return [category.category_name, category.category_id]
 
-        else:
-            query = ''' WITH category AS (SELECT * FROM categories c
-                        LEFT JOIN private_categories pc ON c.id_category = pc.categories_id_category
-                        WHERE (pc.users_id_user = ? OR c.is_private = 0) AND c.id_category = ?),
-                        replies_count AS (SELECT topics_id_topic, COUNT(*) as replies_count
-                        FROM replies
-                        GROUP BY topics_id_topic)
-                        SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author, t.is_locked, COALESCE(rc.replies_count, 0) as replies_count, c.name
-                        FROM topics t
-                        JOIN category c ON t.id_category = c.id_category
-                        LEFT JOIN replies_count rc ON t.id_topic = rc.topics_id_topic'''
-
-            params = [user.id, cat_id]
-            
-            if title:
-                query += " WHERE t.title LIKE ?"
-                params.append(f"%{title}%")
+
+def topic_position(topic: Topic) -> list:
+    '''sort key of get_topics_by_cat_id, for pagination.next_cursor'''
+    return [topic.title, topic.id]
+
+
+def category_topics_query(cat_id: int, title: str | None, descending: bool, position, page: int) -> tuple[str, tuple]:
+    '''SQL of get_topics_by_cat_id'''
+    query = ''' SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author, t.is_locked, t.reply_count, c.name
+                FROM topics t
+                JOIN categories c ON t.id_category = c.id_category
+                WHERE t.id_category = ?'''
+    params = [cat_id]
+
+    if title:
+        query += " AND t.title LIKE ?"
+        params.append(f"%{title}%")
+
+    if position is not None:
+        condition, keyset_params = pagination.keyset(("t.title", "t.id_topic"), position, descending)
+        query += " AND " + condition
+        params.extend(keyset_params)
+
+    if descending:
+        query += " ORDER BY t.title DESC, t.id_topic DESC"
     else:
-        query = ''' WITH category AS (SELECT id_category, name, created_on, is_private, is_locked
-                    FROM categories WHERE is_private = 0 AND id_category = ?),
-                    replies_count AS (SELECT topics_id_topic, COUNT(*) as replies_count 
-                    FROM replies 
-                    GROUP BY topics_id_topic)
-                    SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author, t.is_locked, COALESCE(rc.replies_count, 0) as replies_count, c.name
-                    FROM topics t
-                    JOIN category c ON t.id_category = c.id_category
-                    LEFT JOIN replies_count rc ON t.id_topic = rc.topics_id_topic'''
-        params = [cat_id]
-
-        if title:
-            query += " WHERE t.title LIKE ?"
-            params.append(f"%{title}%")
-
-    if sorting.upper() == "DESC":
-        query += " ORDER BY t.title DESC"
-    elif sorting == None or sorting.upper() == "ASC":
-        query += " ORDER BY t.title ASC"
-
-    query += " LIMIT 10 OFFSET ?0"
-    params.append(page - 1)
-
-    topics = [Topic.cat_from_query_result(*(read_topic_params(row)))for row in read_query(query, tuple(params))]
+        query += " ORDER BY t.title ASC, t.id_topic ASC"
+
+    query += " LIMIT ? OFFSET ?"
+    params.extend([pagination.PAGE_SIZE, 0 if position is not None else (page - 1) * pagination.PAGE_SIZE])
+
+    return query, tuple(params)
+
+
+async def get_topics_by_cat_id(cat_id: int, user: User = None, title: str = None, sorting: str = None, page: int = 1, cursor: str | None = None,
+                               usernames: UsernameLoader | None = None):
+    categories = await access_services.readable_categories(user)
+    if categories is not None and cat_id not in categories:
+        return []
+
+    descending = sorting is not None and sorting.upper() == "DESC"
+    position = pagination.decode_cursor(cursor, (str, int))
+    rows = await read_query(*category_topics_query(cat_id, title, descending, position, page))
+    # all authors of the page in one query, not one per topic
+    author_names = await (usernames or UsernameLoader()).load_many(row[5] for row in rows)
+    topics = [Topic.cat_from_query_result(*(await read_topic_params(row, author_names))) for row in rows]
 
     return topics
 
-def get_privileged_users(cat_id: int):
+async def get_category_version(cat_id: int) -> tuple[int, int, datetime | None]:
+    '''(topics, sum of their versions, latest change) of a category; moves whenever a topic its pages list does.
+    Read from the (id_category, version, updated_on) index alone.'''
+    data = await read_query(CATEGORY_VERSION_QUERY, (cat_id,))
+    count, versions, updated_on = data[0]
+    return int(count), int(versions), updated_on
+
+
+async def get_privileged_users(cat_id: int):
     query = ''' SELECT u.username, pc.has_write_access
                 FROM users u
                 JOIN private_categories pc ON u.id_user = pc.users_id_user
@@ -203,7 +209,7 @@ def get_privileged_users(cat_id: int):
                 WHERE c.id_category = ?'''
     params = [cat_id]
     
-    privileged_users = [PrivilegedUsers.from_query_result(user[0], convert_read_write_access(user[1])) for user in read_query(query, tuple(params))]
+    privileged_users = [PrivilegedUsers.from_query_result(user[0], convert_read_write_access(user[1])) for user in await read_query(query, tuple(params))]
 
     if privileged_users == []:
         raise HTTPException(
@@ -214,7 +220,7 @@ def get_privileged_users(cat_id: int):
     return privileged_users
     
 
-def create_new_category(category: Category, user_id: int):
+async def create_new_category(category: Category, user_id: int):
     query = "INSERT INTO categories (name, created_on, is_private, is_locked) VALUES (?, ?, ?, ?)"
     params = [category.name, datetime.utcnow()]
 
@@ -227,54 +233,62 @@ def create_new_category(category: Category, user_id: int):
     else:
         params.append(0)
 
-    try:
-        category.id = insert_query(query, tuple(params))
-    except mdb.IntegrityError as i:
-        raise HTTPException(status_code=responses.CONFLICT().status_code,detail=f"Category with name '{category.name}' already exists!",)
+    async with transaction():
+        try:
+            category.id = await insert_query(query, tuple(params))
+        except mdb.IntegrityError as i:
+            raise HTTPException(status_code=responses.CONFLICT().status_code,detail=f"Category with name '{category.name}' already exists!",)
 
-    category.created_on = params[1]
+        category.created_on = params[1]
 
-    if category.privacy_status == "private":
-        insert_query(
-            "INSERT INTO private_categories (categories_id_category, users_id_user, has_write_access) VALUES(?, ?, ?)",
-            (category.id, user_id, 1),
-        )
+        if category.privacy_status == "private":
+            await insert_query(
+                "INSERT INTO private_categories (categories_id_category, users_id_user, has_write_access) VALUES(?, ?, ?)",
+                (category.id, user_id, 1),
+            )
 
+    # after the commit, so a concurrent request can't cache the old sets again
+    access_services.invalidate_categories()
+    page_cache.invalidate(page_cache.CATEGORIES_TAG)
     return category
 
 
-def change_category_privacy(cat_id: int, privacy_status: str):
+async def change_category_privacy(cat_id: int, privacy_status: str):
     new_status = convert_status(privacy_status)
     query = """UPDATE categories SET is_private = ? WHERE id_category = ?"""
     params = [new_status, cat_id]
 
-    query_result = update_query(query, tuple(params))
-
-    if query_result == 0:
-        raise HTTPException(
-            status_code=responses.NotFound().status_code,
-            detail=f"Category with id '{cat_id}' doesnt exist or it's status is already {privacy_status}!",
-        )
+    async with transaction():
+        query_result = await update_query(query, tuple(params))
 
-    else:
-        query = """DELETE FROM private_categories 
-                WHERE categories_id_category = ?"""
-        param = [cat_id,]
-        update_query(query, tuple(param))
+        if query_result == 0:
+            raise HTTPException(
+                status_code=responses.NotFound().status_code,
+                detail=f"Category with id '{cat_id}' doesnt exist or it's status is already {privacy_status}!",
+            )
 
+        else:
+            query = """DELETE FROM private_categories 
+                    WHERE categories_id_category = ?"""
+            param = [cat_id,]
+            await update_query(query, tuple(param))
+
+    access_services.invalidate_categories()
+    # what anonymous visitors can see changed everywhere
+    page_cache.clear()
     return responses.OK(
         content=f"Category '{cat_id}' changed status to '{privacy_status}'."
     )
 
 
-def give_read_access_to_user(user_id: int, cat_id: int):
+async def give_read_access_to_user(user_id: int, cat_id: int):
     query = """INSERT INTO private_categories (categories_id_category, users_id_user, has_write_access)
                 VALUES (?, ?, 0)
                 ON DUPLICATE KEY UPDATE has_write_access = 0"""
 
     params = [cat_id, user_id]
 
-    query_result = update_query(query, tuple(params))
+    query_result = await update_query(query, tuple(params))
     
     if query_result == 0:
         raise HTTPException(
@@ -282,19 +296,20 @@ def give_read_access_to_user(user_id: int, cat_id: int):
             detail=f"Category with id '{cat_id}' is not private or user with id '{user_id}' is not valid user!",
         )
     else:
+        access_services.invalidate_user(user_id)
         return responses.OK(
             content=f"'User '{user_id}' can now read topics in category '{cat_id}'."
         )
 
 
-def give_write_access_to_user(user_id: int, cat_id: int):
+async def give_write_access_to_user(user_id: int, cat_id: int):
     query = """INSERT INTO private_categories (categories_id_category, users_id_user, has_write_access)
                 VALUES (?, ?, 1)
                 ON DUPLICATE KEY UPDATE has_write_access = 1"""
 
     params = [cat_id, user_id]
 
-    query_result = update_query(query, tuple(params))
+    query_result = await update_query(query, tuple(params))
 
     if query_result == 0:
         raise HTTPException(
@@ -303,15 +318,16 @@ def give_write_access_to_user(user_id: int, cat_id: int):
         )
     
     else:
+        access_services.invalidate_user(user_id)
         return responses.OK(
         content=f"'User '{user_id}' can now write topics in category '{cat_id}'."
     )
 
-def lock_category_by_id(cat_id: int):
+async def lock_category_by_id(cat_id: int):
     query = '''UPDATE categories SET is_locked = 1 WHERE id_category = ?'''
     params = [cat_id]
 
-    query_result = update_query(query, tuple(params))
+    query_result = await update_query(query, tuple(params))
 
     if query_result == 0:
         raise HTTPException(
@@ -319,17 +335,19 @@ def lock_category_by_id(cat_id: int):
             detail=f"Category with id '{cat_id}' doesnt exists or it's already locked!",
         )
     
+    page_cache.invalidate(page_cache.CATEGORIES_TAG, page_cache.category_tag(cat_id))
     return responses.OK(content=f"Category '{cat_id}' was locked.")
 
 
-def revoke_access(user_id: int, cat_id: int):
+async def revoke_access(user_id: int, cat_id: int):
     query = """ DELETE FROM private_categories 
                 WHERE categories_id_category = ? 
                 AND users_id_user = ?"""
 
     params = [cat_id, user_id]
 
-    query_result = update_query(query, params)
+    query_result = await update_query(query, params)
+    access_services.invalidate_user(user_id)
 
     # if query_result == 0:
     #     raise HTTPException(
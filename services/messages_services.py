@@ -1,124 +1,163 @@
 from datetime import datetime
-from data.database import read_query, insert_query
+from data.async_database import read_query, insert_query, insert_many, transaction
 from models.message import Message, MessageResponseModelConversation, MessageResponseModelChat
 from fastapi import HTTPException, status
 from common import responses
 
 
 
-async def get_messages(user_id: int, sort: bool, paginated: bool, page:int):
-    conversations_with = read_query(
-        '''select distinct m.id_author, u.id_recipient 
-        from messages m 
-        join users_has_messages u on m.id_message = u.id_message 
-        join users us on u.id_recipient = us.id_user 
-        where m.id_author = ? or u.id_recipient = ?''',
-        (user_id, user_id))
-    
-    counterparties =[]
-    for party in conversations_with:
-        author_id, recipient_id = party
-        if author_id != user_id:
-            counterparties.append(author_id)
-        if recipient_id != user_id:
-            counterparties.append(recipient_id)
-    clean_counterparties = set(counterparties)
-    sql_query = '''select m.id_message, us1.username, us.username, m.subject, m.content, m.created_on, m.id_parent_message
-        from messages m join users_has_messages u on m.id_message = u.id_message 
-        join users us1 on m.id_author = us1.id_user 
-        join users us on u.id_recipient = us.id_user 
-        where (m.id_author = ? and u.id_recipient = ?) or 
-        (m.id_author = ? and u.id_recipient = ?) order by m.id_message'''
-    
-    if sort:
-        sql_query += ' Desc'
-    
+CONVERSATION_PAGE_SIZE = 10
+SUBJECT_PAGE_SIZE = 3
+# usernames per IN (...) lookup, well below the server's placeholder limit
+RECIPIENT_LOOKUP_BATCH = 1000
+
+
+def _page_bounds(page, page_size: int) -> tuple[int, int]:
+    '''first and last row_number() of a page'''
+    first = page_size * (int(page) - 1) + 1
+    return first, first + page_size - 1
+
+
+def conversations_query(user_id: int, sort: bool, paginated: bool, page) -> tuple[str, tuple]:
+    '''SQL of get_messages. The sent and the received messages are read by separate branches, each
+    served by an index (messages by id_author, users_has_messages by id_recipient), where one
+    "author or recipient" condition would scan one of the tables.'''
+    direction = 'DESC' if sort else 'ASC'
+    sql_query = f'''select id_message, author, recipient, subject, content, created_on, id_parent_message, counterparty
+        from (select exchanged.*,
+                  row_number() over (partition by counterparty order by id_message {direction}) as position,
+                  max(id_message) over (partition by counterparty) as latest_message
+              from (select m.id_message, us1.username as author, us.username as recipient, m.subject, m.content,
+                        m.created_on, m.id_parent_message, u.id_recipient as counterparty
+                    from messages m join users_has_messages u on m.id_message = u.id_message 
+                    join users us1 on m.id_author = us1.id_user 
+                    join users us on u.id_recipient = us.id_user 
+                    where m.id_author = ? and u.id_recipient <> ?
+                    union all
+                    select m.id_message, us1.username as author, us.username as recipient, m.subject, m.content,
+                        m.created_on, m.id_parent_message, m.id_author as counterparty
+                    from messages m join users_has_messages u on m.id_message = u.id_message 
+                    join users us1 on m.id_author = us1.id_user 
+                    join users us on u.id_recipient = us.id_user 
+                    where u.id_recipient = ? and m.id_author <> ?) exchanged) conversations'''
+    params = [user_id] * 4
+
     if paginated:
-        sql_query += ' LIMIT 10 OFFSET ?0'
-    
+        sql_query += ' where position between ? and ?'
+        params.extend(_page_bounds(page, CONVERSATION_PAGE_SIZE))
+
+    sql_query += ' order by latest_message desc, counterparty, position'
+    return sql_query, tuple(params)
+
+
+async def get_messages(user_id: int, sort: bool, paginated: bool, page:int):
+    '''One page of every conversation of the user, the most recently active conversation first.
+    A single query: ROW_NUMBER() numbers the messages within each conversation, so every conversation
+    is paged on its own, and the rows come back grouped by counterparty.'''
     conversations = []
-    for counterparty in clean_counterparties:
-        params = [user_id, counterparty, counterparty, user_id]
-        if paginated:
-            params.append(page-1)
-        conversations.append([MessageResponseModelConversation.get_response(*row) for row in
-                              read_query(sql_query, tuple(params))])
+    current_counterparty = None
+    for row in await read_query(*conversations_query(user_id, sort, paginated, page)):
+        *message, counterparty = row
+        if not conversations or counterparty != current_counterparty:
+            conversations.append([])
+            current_counterparty = counterparty
+        conversations[-1].append(MessageResponseModelConversation.get_response(*message))
     
     return conversations
-        
+
+
+def user_conversations_query(user_id: int, usernames: list[str], sort: bool, paginated: bool, page) -> tuple[str, tuple]:
+    '''SQL of get_messages_user, sent and received messages in separate branches as in conversations_query'''
+    direction = 'DESC' if sort else 'ASC'
+    placeholders = ', '.join('?' for _ in usernames)
+    sql_query = f'''select id_message, author, recipient, subject, content, created_on, id_parent_message, counterparty
+        from (select exchanged.*,
+                  row_number() over (partition by counterparty, subject order by id_message {direction}) as position,
+                  min(id_message) over (partition by counterparty, subject) as first_message
+              from (select m.id_message, us1.username as author, us.username as recipient, m.subject, m.content,
+                        m.created_on, m.id_parent_message, us.username as counterparty
+                    from messages m join users_has_messages u on m.id_message = u.id_message 
+                    join users us1 on m.id_author = us1.id_user 
+                    join users us on u.id_recipient = us.id_user 
+                    where m.id_author = ? and us.username in ({placeholders})
+                    union all
+                    select m.id_message, us1.username as author, us.username as recipient, m.subject, m.content,
+                        m.created_on, m.id_parent_message, us1.username as counterparty
+                    from messages m join users_has_messages u on m.id_message = u.id_message 
+                    join users us1 on m.id_author = us1.id_user 
+                    join users us on u.id_recipient = us.id_user 
+                    where u.id_recipient = ? and m.id_author <> ? and us1.username in ({placeholders})) exchanged) conversations'''
+    params = [user_id, *usernames, user_id, user_id, *usernames]
+
+    if paginated:
+        sql_query += ' where position between ? and ?'
+        params.extend(_page_bounds(page, SUBJECT_PAGE_SIZE))
+
+    sql_query += ' order by counterparty, first_message, position'
+    return sql_query, tuple(params)
+
+
 async def get_messages_user(**kwargs):
+    '''The conversations with the given usernames, split by subject, each subject paged on its own.
+    Returns one list per username, in the order given, holding one list of messages per subject.'''
     user_id = kwargs.pop("user_id")
     paginated = kwargs.pop("paginated") 
     sort = kwargs.pop("sort")
     page = kwargs.pop("page") 
-    full_conversations = []
-    for value in kwargs.values():
-        find_subjects = '''select distinct m.subject 
-            from messages m join users_has_messages u on m.id_message = u.id_message 
-            join users us1 on m.id_author = us1.id_user 
-            join users us on u.id_recipient = us.id_user 
-            where (m.id_author = ? and us.username = ?) or (us1.username = ? and u.id_recipient = ?) 
-            '''     
-    
-        subjects = read_query(find_subjects, (user_id, value, value, user_id)) 
-        
-            
-        second_sql_query = '''select m.id_message, us1.username, us.username, m.subject, m.content, m.created_on, m.id_parent_message 
-            from messages m join users_has_messages u on m.id_message = u.id_message 
-            join users us1 on m.id_author = us1.id_user 
-            join users us on u.id_recipient = us.id_user 
-            where m.subject=? and ((m.id_author = ? and us.username = ?) or (us1.username = ? and u.id_recipient = ?))  
-            order by m.id_message'''
-        
-        if sort:
-            second_sql_query += ' Desc'
-        else:
-            second_sql_query += ' Asc'
-        
-        if paginated:
-            limit = 3
-            offset = limit*(int(page) - 1)
-            second_sql_query += f' LIMIT {limit} OFFSET {offset}'
-        
-        conversations = []
-        
-        params = [user_id, value, value, user_id]
-        for subject in subjects:
-            final_params = [subject[0]]
-            final_params.extend(params)    
-            conversations.append([MessageResponseModelConversation.get_response(*row) for row in
-                                read_query(second_sql_query, tuple(final_params))])
-        
-        full_conversations.append(conversations)
-    return full_conversations   
+    usernames = list(kwargs.values())
+    if not usernames:
+        return []
+
+    # username -> subject -> messages, filled in one pass over the grouped rows;
+    # lowercased, as usernames compare case-insensitively in the database
+    by_username = {username.lower(): {} for username in usernames}
+    for row in await read_query(*user_conversations_query(user_id, usernames, sort, paginated, page)):
+        *message, counterparty = row
+        subjects = by_username.setdefault(counterparty.lower(), {})
+        subjects.setdefault(message[3], []).append(MessageResponseModelConversation.get_response(*message))
+
+    return [list(by_username[username.lower()].values()) for username in usernames]
         
         
+async def find_user_ids(usernames: list[str]) -> list[int]:
+    '''ids of the existing users among usernames, in batches of RECIPIENT_LOOKUP_BATCH'''
+    user_ids = []
+    for start in range(0, len(usernames), RECIPIENT_LOOKUP_BATCH):
+        batch = usernames[start:start + RECIPIENT_LOOKUP_BATCH]
+        rows = await read_query(f'''select id_user 
+            from users 
+            where username in ({', '.join('?' for _ in batch)})''', tuple(batch))
+        user_ids.extend(row[0] for row in rows)
+    return user_ids
+
+
+async def add_recipients(message_id: int, recipient_ids: list[int]) -> int:
+    '''all the users_has_messages rows of a message in one bulk insert'''
+    return await insert_many('insert into users_has_messages (id_recipient, id_message) values(?,?)',
+                             [(recipient_id, message_id) for recipient_id in recipient_ids])
+
+
 async def post_message(user_id: int, recipients: str, subject: str, content: str, id_parent_message: int|None = None):
-    usernames_lst = recipients.split(", ")
-    find_user_ids_sql_query = '''select id_user 
-        from users 
-        where username = ?'''
-    if len(usernames_lst)>1:
-        find_user_ids_sql_query += ' or username = ?'*(len(usernames_lst) -1)    
+    usernames_lst = list(dict.fromkeys(recipients.split(", ")))
    
-    counterparties = read_query(find_user_ids_sql_query, tuple(usernames_lst))     
-    if not counterparties:
-        raise HTTPException(responses.NotFound().status_code, detail="No such user(s)") 
-    if id_parent_message is not None:
-        reply_to_check = read_query('select id_message from messages where id_message=?',(id_parent_message,))
-    else:
-        reply_to_check = None
-    created_on = datetime.utcnow()
-    if not reply_to_check:
-        sql_insert_message='''insert into messages(content, created_on, subject, id_author) values(?,?,?,?)'''
-        sql_params =(content, created_on, subject, user_id)
-    else:
-        sql_insert_message='''insert into messages(content, created_on, subject, id_parent_message, id_author) values(?,?,?,?,?)'''
-        sql_params =(content, created_on, subject, id_parent_message, user_id)
-    message_id = insert_query(sql_insert_message, sql_params)
-    
-    for counterparty in counterparties:
-        insert_query('insert into users_has_messages (id_recipient, id_message) values(?,?)', (counterparty[0], message_id))
+    async with transaction():
+        counterparties = await find_user_ids(usernames_lst)
+        if not counterparties:
+            raise HTTPException(responses.NotFound().status_code, detail="No such user(s)") 
+        if id_parent_message is not None:
+            reply_to_check = await read_query('select id_message from messages where id_message=?',(id_parent_message,))
+        else:
+            reply_to_check = None
+        created_on = datetime.utcnow()
+        if not reply_to_check:
+            sql_insert_message='''insert into messages(content, created_on, subject, id_author) values(?,?,?,?)'''
+            sql_params =(content, created_on, subject, user_id)
+        else:
+            sql_insert_message='''insert into messages(content, created_on, subject, id_parent_message, id_author) values(?,?,?,?,?)'''
+            sql_params =(content, created_on, subject, id_parent_message, user_id)
+        message_id = await insert_query(sql_insert_message, sql_params)
+        
+        await add_recipients(message_id, counterparties)
     return message_id
 
 def flatten(nested_list):
@@ -1,115 +1,173 @@
-from data.database import read_query, insert_query, update_query
+from datetime import datetime
+from data.async_database import read_query, insert_query, update_query, transaction
 from models.reply import Reply
 from models.topic import Topic
 from models.user import User
-
-
-def create_reply(reply: Reply) -> Reply:
-    reply.id = insert_query('''insert into replies(content, topics_id_topic, users_id_user, created_on, is_best) 
-                    select ?, ?, ?, ?, ?
-                    from topics 
-                    where id_topic = ? and is_locked = 0;''', 
-                    (reply.content, reply.topic_id, reply.user_id, reply.created_on, reply.is_best, 
-                     reply.topic_id)
-                     )
+from services import access_services
+from common import page_cache
+
+
+async def create_reply(reply: Reply) -> Reply:
+    async with transaction():
+        # bumping the counters first locks the topic row, so a reply can't slip in after the topic is locked
+        if await update_query('''UPDATE topics 
+                    SET reply_count = reply_count + 1, last_reply_at = GREATEST(COALESCE(last_reply_at, ?), ?),
+                    version = version + 1, updated_on = ?
+                    WHERE id_topic = ? AND is_locked = 0;''', 
+                    (reply.created_on, reply.created_on, datetime.utcnow(), reply.topic_id)
+                    ):
+            reply.id = await insert_query('''insert into replies(content, topics_id_topic, users_id_user, created_on, is_best) 
+                    values (?, ?, ?, ?, ?);''', 
+                    (reply.content, reply.topic_id, reply.user_id, reply.created_on, reply.is_best)
+                    )
+    if reply.id is not None:
+        page_cache.invalidate(page_cache.topic_tag(reply.topic_id), page_cache.TOPICS_TAG)
     return reply
 
-def get_reply_by_id(topic_id: int, reply_id: int) -> Reply:
-    result = read_query('SELECT * FROM replies WHERE topics_id_topic = ? and id_reply = ?;',
+async def get_reply_by_id(topic_id: int, reply_id: int) -> Reply:
+    result = await read_query('''SELECT id_reply, content, topics_id_topic, users_id_user, created_on, is_best, upvotes, downvotes 
+                        FROM replies WHERE topics_id_topic = ? and id_reply = ?;''',
                         (topic_id, reply_id)
                         )
-    reply = next((Reply.from_query_result(*el) for el in result), None)
-    if reply: reply.upvotes, reply.downvotes = _count_votes(reply.id)
-    
-    return  reply
+    return next((Reply.from_query_result(*el) for el in result), None)
 
-def topic_is_locked(reply_id) -> bool:
-    result = read_query(''' SELECT is_locked FROM topics  WHERE id_topic = ?;''', (reply_id, ))
+async def topic_is_locked(reply_id) -> bool:
+    result = await read_query(''' SELECT is_locked FROM topics  WHERE id_topic = ?;''', (reply_id, ))
     return result[0][0] == 1
 
-def topic_is_in_a_private_category(topic: Topic):
+async def topic_is_in_a_private_category(topic: Topic):
     '''check topic's category status'''
-    result = read_query('''SELECT categories_id_category
+    result = await read_query('''SELECT categories_id_category
                         FROM private_categories 
                         WHERE categories_id_category = ?''', (topic.category_id,))
     
     return next(((row) for row in result), None)
 
-def user_has_write_access(topic: Topic, user: User):
+async def user_has_write_access(topic: Topic, user: User):
     '''check if the user has write access if a category is private'''
-    result = read_query('''
-                        SELECT categories_id_category, users_id_user, has_write_access 
-                        FROM private_categories 
-                        WHERE categories_id_category = ? AND users_id_user = ?''',
-                        (topic.category_id, user.id))
-    if result and result[0][-1] == 1:
-        return True
-    return False
+    return await access_services.can_write(user, topic.category_id)
+
 
+async def _touch_topic(topic_id: int):
+    '''moves the version of the topic page on, for its ETag'''
+    await update_query('UPDATE topics SET version = version + 1, updated_on = ? WHERE id_topic = ?;',
+                       (datetime.utcnow(), topic_id))
 
-def edit_reply(reply: Reply, new_content: str) -> bool:
-    result = update_query('UPDATE replies SET content = ? WHERE id_reply = ?;',
-                          (new_content, reply.id)
-                          )
+
+async def edit_reply(reply: Reply, new_content: str) -> bool:
+    async with transaction():
+        result = await update_query('UPDATE replies SET content = ? WHERE id_reply = ?;',
+                              (new_content, reply.id)
+                              )
+        await _touch_topic(reply.topic_id)
+    page_cache.invalidate(page_cache.topic_tag(reply.topic_id))
     return result == 1
 
-def topic_exists(topic_id) -> Topic:
-    result = read_query('''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author,
-            (SELECT count(*) from replies WHERE topics_id_topic = t.id_topic) as replies, t.is_locked 
+async def topic_exists(topic_id) -> Topic:
+    result = await read_query('''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author,
+            t.reply_count AS replies, t.is_locked 
             FROM topics t WHERE t.id_topic = ?''', 
             (topic_id,)
             )
     return next((Topic.from_query_result(*el) for el in result), None)
 
-def topic_has_best_reply(topic: Topic) -> bool:
-    result = read_query('select count(*) from replies where is_best=1 and topics_id_topic=?',
+async def topic_has_best_reply(topic: Topic) -> bool:
+    result = (await read_query('select count(*) from replies where is_best=1 and topics_id_topic=?',
                         (topic.id,)
-                        )[0]
+                        ))[0]
     return result[0] == 1
 
-def choose_best(reply: Reply, topic_id: int) -> Reply:
-    result = update_query('UPDATE replies SET is_best=1 WHERE id_reply=? and topics_id_topic =?;', 
-                          (reply.id, topic_id)
-                          )
+async def choose_best(reply: Reply, topic_id: int) -> Reply:
+    async with transaction():
+        result = await update_query('UPDATE replies SET is_best=1 WHERE id_reply=? and topics_id_topic =?;', 
+                              (reply.id, topic_id)
+                              )
+        await _touch_topic(topic_id)
+    page_cache.invalidate(page_cache.topic_tag(topic_id))
     return reply if result == 1 else None
 
-def check_user_vote_for_reply(user_id: int, reply: Reply, vote:int):
-    result = next((el[0] for el in read_query(
+async def check_user_vote_for_reply(user_id: int, reply: Reply, vote:int):
+    result = next((el[0] for el in await read_query(
         'SELECT is_upvote FROM ktg_forum_api.votes WHERE users_id_user=? and replies_id_reply=?;',
         (user_id, reply.id))), None)
 
     if not result and vote == 0:
         return
     if not result:
-        return new_vote(user_id, reply, vote)
+        return await new_vote(user_id, reply, vote)
     if result in (1, -1) and vote == 0:
-        return remove_vote(reply, user_id)
+        return await remove_vote(reply, user_id)
     if result in (1, -1) and vote in (1, -1):
-        return update_vote(user_id, reply, vote)
-
-def new_vote(user_id: int, reply: Reply, vote: int):
-    result = insert_query(
-        'insert into votes (replies_id_reply, users_id_user, is_upvote) values (?, ?, ?);',
-        (reply.id, user_id, vote)
-        )
-    return _count_votes(reply.id)
-
-def update_vote(user_id: int, reply: Reply, vote: int):
-    result = update_query('update votes set is_upvote = ? where replies_id_reply = ? and users_id_user = ?;',
-                          (vote, reply.id, user_id)
-                          )
-    return _count_votes(reply.id)
-
-def remove_vote(reply: Reply, user_id: int):
-    result = update_query('delete from votes where replies_id_reply = ? and users_id_user = ?;',
-                           (reply.id, user_id)
-                           )
-    return _count_votes(reply.id)
-
-def _count_votes(reply_id: int):
-    result = next((el for el in read_query('''SELECT count(v.is_upvote) AS Upvotes, 
-                            (SELECT count(dv.is_upvote) 
-                            FROM votes dv WHERE dv.replies_id_reply=? AND dv.is_upvote = -1) AS Downvotes
-                            FROM  votes v WHERE v.replies_id_reply=? AND v.is_upvote = 1;''',
-                            (reply_id, reply_id))), None)
-    return result
\ No newline at end of file
+        return await update_vote(user_id, reply, vote)
+
+async def new_vote(user_id: int, reply: Reply, vote: int):
+    async with transaction():
+        await insert_query(
+            'insert into votes (replies_id_reply, users_id_user, is_upvote) values (?, ?, ?);',
+            (reply.id, user_id, vote)
+            )
+        await _move_vote(reply.id, 0, vote)
+        await _touch_topic(reply.topic_id)
+        tallies = await _vote_tallies(reply.id)
+    page_cache.invalidate(page_cache.topic_tag(reply.topic_id))
+    return tallies
+
+async def update_vote(user_id: int, reply: Reply, vote: int):
+    async with transaction():
+        previous = await _locked_vote(user_id, reply.id)
+        if previous is not None:
+            await update_query('update votes set is_upvote = ? where replies_id_reply = ? and users_id_user = ?;',
+                            (vote, reply.id, user_id)
+                            )
+            await _move_vote(reply.id, previous, vote)
+            await _touch_topic(reply.topic_id)
+        tallies = await _vote_tallies(reply.id)
+    page_cache.invalidate(page_cache.topic_tag(reply.topic_id))
+    return tallies
+
+async def remove_vote(reply: Reply, user_id: int):
+    async with transaction():
+        previous = await _locked_vote(user_id, reply.id)
+        if previous is not None:
+            await update_query('delete from votes where replies_id_reply = ? and users_id_user = ?;',
+                            (reply.id, user_id)
+                            )
+            await _move_vote(reply.id, previous, 0)
+            await _touch_topic(reply.topic_id)
+        tallies = await _vote_tallies(reply.id)
+    page_cache.invalidate(page_cache.topic_tag(reply.topic_id))
+    return tallies
+
+async def _locked_vote(user_id: int, reply_id: int) -> int | None:
+    '''the user's current vote, with its row locked until the transaction ends'''
+    return next((el[0] for el in await read_query(
+        'SELECT is_upvote FROM votes WHERE users_id_user=? and replies_id_reply=? FOR UPDATE;',
+        (user_id, reply_id))), None)
+
+async def _move_vote(reply_id: int, old: int, new: int):
+    '''keep replies.upvotes/downvotes in step with a vote going from old to new (1 up, -1 down, 0 none)'''
+    up = (new == 1) - (old == 1)
+    down = (new == -1) - (old == -1)
+    if up or down:
+        await update_query('UPDATE replies SET upvotes = upvotes + ?, downvotes = downvotes + ? WHERE id_reply = ?;',
+                        (up, down, reply_id)
+                        )
+
+async def _vote_tallies(reply_id: int):
+    return next((el for el in await read_query('SELECT upvotes, downvotes FROM replies WHERE id_reply = ?;',
+                            (reply_id,))), None)
+
+async def repair_vote_tallies(reply_id: int | None = None) -> int:
+    '''recompute replies.upvotes and downvotes from the votes table; returns the number of replies changed'''
+    query = '''UPDATE replies r
+                LEFT JOIN (SELECT replies_id_reply, SUM(is_upvote = 1) AS upvotes, SUM(is_upvote = -1) AS downvotes
+                           FROM votes GROUP BY replies_id_reply) v ON v.replies_id_reply = r.id_reply
+                SET r.upvotes = COALESCE(v.upvotes, 0), r.downvotes = COALESCE(v.downvotes, 0)'''
+    params = ()
+    if reply_id is not None:
+        query += ' WHERE r.id_reply = ?'
+        params = (reply_id,)
+    changed = await update_query(query, params)
+    if changed:
+        page_cache.clear()
+    return changed
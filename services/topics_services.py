@@ -1,157 +1,234 @@
-from data.database import read_query, insert_query, update_query
-from models.topic import Topic, TopicResponse
+from contextlib import aclosing
+from data.async_database import read_query, insert_query, update_query, stream_query
+from services import access_services
+from services.users_services import UsernameLoader
+from models.topic import Topic, TopicReplyRow, TopicResponse, TopicRow
 from models.user import User
-from models.reply import Reply
+from models.reply import Reply, ReplyRow
+from fastapi import HTTPException
+from common import page_cache, pagination
+import common.responses as responses
+import re
+from datetime import datetime
 
 
-def view_all_topics(
-        search_in_title: str = '',
+# the listings of view_all_topics, filtered and ordered by search_query
+TOPICS_SELECT = '''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author,
+                   t.reply_count AS replies, t.is_locked 
+                   FROM topics t'''
+REPLIES_SELECT = '''SELECT r.id_reply, r.content, r.topics_id_topic, r.users_id_user, r.created_on, r.is_best, 
+                    r.upvotes, r.downvotes 
+                    FROM replies r JOIN topics t ON t.id_topic = r.topics_id_topic'''
+TOPIC_VERSION_QUERY = 'SELECT version, COALESCE(updated_on, created_on) FROM topics WHERE id_topic = ?'
+
+
+def _fulltext_terms(words: list[str]) -> str:
+    '''MATCH ... AGAINST boolean-mode string matching any of the words as a prefix'''
+    terms = (re.sub(r'\W', '', word) for word in words)
+    return ' '.join(f'{term}*' for term in terms if term)
+
+
+def search_query(select: str, match_column: str, id_column: str, created_column: str, categories: frozenset[int] | None,
+                 search: str, sort_by_date: bool, paginated: bool, position, offset: int):
+    '''Browsing pages by keyset on (created_on, id) or (id), starting after position.
+    Relevance-ranked search has to score every match anyway, so it pages by offset.
+    categories are the readable category ids, None for no restriction.'''
+    where, where_params, order, order_params = [], [], [], []
+    if categories is not None:
+        condition, params = access_services.category_filter('t.id_category', categories)
+        where.append(condition)
+        where_params.extend(params)
+    if search:
+        # served by the FULLTEXT indexes; ranked by relevance, newest first among equals
+        where.append(f'MATCH({match_column}) AGAINST (? IN BOOLEAN MODE)')
+        where_params.append(search)
+        order.append(f'MATCH({match_column}) AGAINST (? IN BOOLEAN MODE) DESC')
+        order_params.append(search)
+        if sort_by_date:
+            order.append(f'{created_column} DESC')
+        order.append(f'{id_column} DESC')
+    else:
+        columns, descending = ((created_column, id_column), True) if sort_by_date else ((id_column,), False)
+        if position is not None:
+            pagination.check_position(position, (datetime, int) if sort_by_date else (int,))
+            condition, params = pagination.keyset(columns, position, descending)
+            where.append(condition)
+            where_params.extend(params)
+        order.extend(f'{column} {"DESC" if descending else "ASC"}' for column in columns)
+
+    query = select
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += ' ORDER BY ' + ', '.join(order)
+    params = where_params + order_params
+    if paginated:
+        query += ' LIMIT ? OFFSET ?'
+        params.extend([pagination.PAGE_SIZE, offset])
+    return query, tuple(params)
+
+
+def _position(item, sort_by_date: bool) -> list:
+    return [item.created_on, item.id] if sort_by_date else [item.id]
+
+
+async def view_all_topics(
+        search_in_title: list[str] | str = '',
         include_topics: bool = True,
         include_replies: bool = True,
         sort_by_date: bool = False,
         paginated: bool = True,
         user: User | None = None,
-        default_page: int = 1
-        ) -> list[Topic|Reply] | list:
-    data = []
-    params = [f'%{x}%' for x in search_in_title] if search_in_title else []
-
-    if user and user.is_admin:
-        topics_query =  '''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, 
-                        (select username from users where id_user = t.id_author) as id_author,
-                        (SELECT count(*) from replies WHERE topics_id_topic = t.id_topic) as replies, t.is_locked 
-                        FROM topics t 
-                        '''
-        replies_query = '''SELECT * FROM replies '''
-    
-        if search_in_title:
-            topics_query += 'WHERE'
-            replies_query += 'WHERE'
-        topics_query += ' or '.join(" t.title like ?" for _ in search_in_title)
-        replies_query += ' or '.join(" content like ?" for _ in search_in_title)
-        
-        if sort_by_date:
-            topics_query += 'ORDER BY created_on DESC'
-            replies_query += 'ORDER BY created_on DESC'
+        default_page: int = 1,
+        cursor: str | None = None,
+        usernames: UsernameLoader | None = None,
+        ) -> tuple[list[Topic|Reply], str | None]:
+    '''Returns one page of topics and/or replies and the cursor of the next page (None on the last one).
+    The cursor keeps a separate position for the topics and the replies; default_page is only used without one.'''
+    search = _fulltext_terms(search_in_title) if search_in_title else ''
+    position = pagination.decode_cursor(cursor) or {}
+    offset = position.get('offset', 0) if isinstance(position, dict) else None
+    if not cursor:
+        offset = (default_page - 1) * pagination.PAGE_SIZE
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=responses.BadRequest().status_code, detail="Invalid cursor")
 
-        if paginated:
-            topics_query += ' LIMIT 10 OFFSET ?0'
-            replies_query += ' LIMIT 10 OFFSET ?0'
-            params.append(default_page - 1)
-    
-        if include_topics: 
-            data.extend([Topic.from_query_result(*row) for row in read_query(topics_query, tuple(params))])
-        if include_replies: 
-            data.extend([Reply.from_query_result(*row) for row in read_query(replies_query, tuple(params))])
-        
-        return data
-    else:
-        if not search_in_title:
-            search_in_title = ['']
-        topic_params = []
-        reply_params = []
-        topic_params.extend([' AND ' + ' or '.join(f' t.title like "%{x}%"' for x in search_in_title),
-                            user if user else 'NULL',
-                            ' AND ' + ' or '.join(f' t.title like "%{x}%"' for x in search_in_title)
-                            ])
-        reply_params.extend([' AND ' + ' or '.join(f" content like '%{x}%'" for x in search_in_title),
-                            user if user else 'NULL',
-                            ' AND ' + ' or '.join(f" content like '%{x}%'" for x in search_in_title)
-                            ])
-        topics_query =  f'''
-            (SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, 
-            (select username from users where id_user = t.id_author) as id_author,
-            (SELECT count(*) FROM replies WHERE topics_id_topic = t.id_topic) AS replies, t.is_locked 
-            FROM topics t where (t.id_category) NOT IN (SELECT categories_id_category FROM private_categories)
-            {topic_params[0]} )
-            UNION 
-            (SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, 
-            (select username from users where id_user = t.id_author) as id_author,
-            (SELECT count(*) FROM replies WHERE topics_id_topic = t.id_topic) AS replies, t.is_locked 
-            FROM topics t WHERE (t.id_category, {topic_params[1]}) IN (SELECT categories_id_category, users_id_user FROM private_categories)
-            {topic_params[2]} )
-            '''
-        replies_query = f'''
-            (SELECT r.id_reply, r.content, r.topics_id_topic, r.users_id_user, r.created_on, r.is_best FROM replies r 
-            JOIN topics t ON t.id_topic = r.topics_id_topic
-            WHERE (t.id_category) NOT IN (SELECT categories_id_category FROM private_categories) 
-            {reply_params[0]} )
-            UNION
-            (SELECT r.id_reply, r.content, r.topics_id_topic, r.users_id_user, r.created_on, r.is_best FROM replies r 
-            JOIN topics t ON t.id_topic = r.topics_id_topic
-            WHERE (t.id_category, {reply_params[1]}) IN (SELECT categories_id_category, users_id_user FROM private_categories) 
-            {reply_params[2]} )'''
+    categories = await access_services.readable_categories(user)
+    topics, replies = [], []
+    # a list that ran out on an earlier page is marked done, so it doesn't start over
+    if include_topics and not position.get('topics_done'): 
+        topics_sql, params = search_query(TOPICS_SELECT,
+                        't.title', 't.id_topic', 't.created_on', categories, search, sort_by_date, paginated,
+                        position.get('topics'), offset)
+        rows = await read_query(topics_sql, params)
+        author_names = await (usernames or UsernameLoader()).load_many(row[5] for row in rows)
+        topics = [Topic.from_query_result(*row[:5], author_names[row[5]], *row[6:]) for row in rows]
+    if include_replies and not position.get('replies_done'): 
+        replies_sql, params = search_query(REPLIES_SELECT,
+                        'r.content', 'r.id_reply', 'r.created_on', categories, search, sort_by_date, paginated,
+                        position.get('replies'), offset)
+        replies = [Reply.from_query_result(*row) for row in await read_query(replies_sql, params)]
 
-        if sort_by_date:
-            topics_query += 'ORDER BY created_on DESC'
-            replies_query += 'ORDER BY created_on DESC'
-    
-        if paginated:
-            topics_query += (f' LIMIT 10 OFFSET {default_page - 1}0')
-            replies_query += (f' LIMIT 10 OFFSET {default_page - 1}0')
-    
+    next_cursor = None
+    topics_full, replies_full = len(topics) == pagination.PAGE_SIZE, len(replies) == pagination.PAGE_SIZE
+    if paginated and (topics_full or replies_full):
+        if search:
+            next_position = {'offset': offset + pagination.PAGE_SIZE}
+        else:
+            next_position = {}
+            if topics_full:
+                next_position['topics'] = _position(topics[-1], sort_by_date)
+            if replies_full:
+                next_position['replies'] = _position(replies[-1], sort_by_date)
+        next_position['topics_done'] = not topics_full
+        next_position['replies_done'] = not replies_full
+        next_cursor = pagination.encode_cursor(next_position)
 
-        if include_topics: 
-            data.extend([Topic.from_query_result(*row) for row in read_query(topics_query)])
-        if include_replies: 
-            data.extend([Reply.from_query_result(*row) for row in read_query(replies_query)])
+    return topics + replies, next_cursor
 
-        return data
+async def stream_all_topics(
+        search_in_title: list[str] | str = '',
+        include_topics: bool = True,
+        include_replies: bool = True,
+        sort_by_date: bool = False,
+        user: User | None = None,
+        ):
+    '''Every matching topic and then reply as its row is read, for the unpaginated listing; no list of them is built.
+    Author names come from a join, UsernameLoader would need all the rows first.'''
+    search = _fulltext_terms(search_in_title) if search_in_title else ''
+    categories = await access_services.readable_categories(user)
+    if include_topics:
+        topics_sql, params = search_query('''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, u.username,
+                        t.reply_count AS replies, t.is_locked 
+                        FROM topics t LEFT JOIN users u ON u.id_user = t.id_author''',
+                        't.title', 't.id_topic', 't.created_on', categories, search, sort_by_date, False, None, 0)
+        async with aclosing(stream_query(topics_sql, params)) as rows:
+            async for row in rows:
+                yield TopicRow.from_query_result(*row)
+    if include_replies:
+        replies_sql, params = search_query(REPLIES_SELECT,
+                        'r.content', 'r.id_reply', 'r.created_on', categories, search, sort_by_date, False, None, 0)
+        async with aclosing(stream_query(replies_sql, params)) as rows:
+            async for row in rows:
+                yield ReplyRow.from_query_result(*row)
 
-def get_topic_by_id(id: int) -> Topic | None:
-    data = read_query(
-                '''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author, NULL AS replies, t.is_locked 
+async def get_topic_header(id: int) -> Topic | None:
+    '''the topic row alone, replies holding its reply count - enough for the permission checks'''
+    data = await read_query(
+                '''SELECT t.id_topic, t.title, t.created_on, t.text, t.id_category, t.id_author, t.reply_count AS replies, t.is_locked 
                 FROM topics t 
                 WHERE t.id_topic = ?;''',
                 (id,)
                 )
-    topic = next((Topic.from_query_result(*row) for row in data), None)
+    return next((Topic.from_query_result(*row) for row in data), None)
+
+async def get_topic_version(id: int) -> tuple[int, datetime] | None:
+    '''(version, updated_on) of the topic page, read before deciding to load the replies at all'''
+    data = await read_query(TOPIC_VERSION_QUERY, (id,))
+    return next((tuple(row) for row in data), None)
 
+async def get_topic_by_id(id: int, cursor: str | None = None, page_size: int = pagination.PAGE_SIZE) -> tuple[Topic | None, str | None]:
+    '''the topic with one page of its replies, newest first, and the cursor of the next page'''
+    topic = await get_topic_header(id)
     if topic:
-        topic = get_topic_replies(topic)
-        return topic
-    return None
+        return await get_topic_replies(topic, cursor, page_size)
+    return None, None
+
+async def get_topic_replies(topic: Topic, cursor: str | None = None, page_size: int = pagination.PAGE_SIZE) -> tuple[Topic, str | None]:
+    '''One page of replies after cursor, by keyset on (created_on, id_reply) so the page costs the same
+    at any depth of a long topic; the (topics_id_topic, created_on) index serves it.'''
+    replies = await read_query(*replies_query(topic.id, cursor, page_size))
+    topic.replies = [TopicResponse.replies_from_query_results(*row) for row in replies]
+    return topic, pagination.next_cursor(topic.replies, _reply_position, page_size)
 
-def get_topic_replies(topic: Topic) -> Topic:
-    replies = read_query('''
+def stream_topic_replies(topic: Topic, cursor: str | None = None, page_size: int = pagination.PAGE_SIZE) -> pagination.StreamedPage:
+    '''the page of get_topic_replies, its rows read as the topic page loops over them'''
+    sql, params = replies_query(topic.id, cursor, page_size)
+    return pagination.StreamedPage(_reply_rows(sql, params), _reply_position, page_size)
+
+async def _reply_rows(sql: str, params: tuple):
+    async with aclosing(stream_query(sql, params)) as rows:
+        async for row in rows:
+            yield TopicReplyRow.replies_from_query_results(*row)
+
+def _reply_position(reply) -> list:
+    return [reply.created, reply.id]
+
+def replies_query(topic_id: int, cursor: str | None, page_size: int) -> tuple[str, tuple]:
+    where, params = 'r.topics_id_topic = ?', [topic_id]
+    position = pagination.decode_cursor(cursor, (datetime, int))
+    if position is not None:
+        condition, position_params = pagination.keyset(('r.created_on', 'r.id_reply'), position, descending=True)
+        where += f' AND {condition}'
+        params.extend(position_params)
+    return f'''
                 SELECT r.content AS Reply, u.username AS User, r.created_on AS 'Post date', 
-                (SELECT count(*) FROM votes v WHERE v.replies_id_reply = r.id_reply AND v.is_upvote=1) AS Upvotes, 
-                (SELECT count(*) FROM votes dv WHERE dv.replies_id_reply = r.id_reply AND dv.is_upvote=-1) AS Downvotes,
+                r.upvotes AS Upvotes, r.downvotes AS Downvotes,
                 r.is_best AS 'Best Reply', r.id_reply, r.topics_id_topic
                 FROM replies r
                 JOIN users u ON u.id_user = r.users_id_user
-                WHERE r.topics_id_topic = ?
-                order by r.created_on desc''',
-                (topic.id,)
-                )        
-    topic.replies = [TopicResponse.replies_from_query_results(*row) for row in replies]
-    return topic
+                WHERE {where}
+                order by r.created_on desc, r.id_reply desc
+                LIMIT ?''', tuple(params + [page_size])
 
-def topic_is_in_a_private_category(topic: Topic):
+async def topic_is_in_a_private_category(topic: Topic):
     '''check topic's category status'''
-    result = read_query('''SELECT categories_id_category
+    result = await read_query('''SELECT categories_id_category
                         FROM private_categories 
                         WHERE categories_id_category = ?''', (topic.category_id,))
     
     return next(((row) for row in result), None)
 
-def user_has_write_access(topic: Topic, user: User):
+async def user_has_write_access(topic: Topic, user: User):
     '''check if the user has write access if a category is private'''
-    result = read_query('''
-                        SELECT categories_id_category, users_id_user, has_write_access 
-                        FROM private_categories 
-                        WHERE categories_id_category = ? AND users_id_user = ?''',
-                        (topic.category_id, user.id))
-    if result and result[0][-1] == 1:
-        return True
-    return False
-
-def create_topic(topic: Topic) -> Topic: 
-    topic.id = insert_query('''
-                INSERT INTO topics (title, created_on, text, id_category, id_author, is_locked) 
-                VALUES (?, ?, ?, ?, ?, ?)''', 
-                (topic.title, topic.created_on, topic.text, topic.category_id, topic.author_id, topic.is_locked)
+    return await access_services.can_write(user, topic.category_id)
+
+async def create_topic(topic: Topic) -> Topic: 
+    topic.id = await insert_query('''
+                INSERT INTO topics (title, created_on, text, id_category, id_author, is_locked, updated_on) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)''', 
+                (topic.title, topic.created_on, topic.text, topic.category_id, topic.author_id, topic.is_locked, topic.created_on)
                 )
+    page_cache.invalidate(page_cache.TOPICS_TAG, page_cache.category_tag(topic.category_id))
     return Topic.from_query_result(
             topic.id, 
             topic.title,
@@ -163,7 +240,7 @@ def create_topic(topic: Topic) -> Topic:
             topic.is_locked
             )
 
-def edit_topic(
+async def edit_topic(
         topic: Topic, 
         new_title: str | None = None, 
         new_text: str | None = None
@@ -173,26 +250,40 @@ def edit_topic(
     if not new_text:
         new_text = topic.text
 
-    update_query('update topics set title = ?, text = ?  where title LIKE ?;',
-                     (new_title, new_text, topic.title))
+    await update_query('update topics set title = ?, text = ?, version = version + 1, updated_on = ?  where title LIKE ?;',
+                     (new_title, new_text, datetime.utcnow(), topic.title))
+    page_cache.invalidate(page_cache.topic_tag(topic.id))
     
     topic.title, topic.text = new_title, new_text 
 
     return topic
 
-def lock_topic(id: int) -> bool:
-    result = update_query('UPDATE topics SET is_locked = 1 where id_topic = ?;', (id, ))
+async def lock_topic(id: int) -> bool:
+    result = await update_query('UPDATE topics SET is_locked = 1, version = version + 1, updated_on = ? where id_topic = ? AND is_locked = 0;',
+                                (datetime.utcnow(), id))
+    page_cache.invalidate(page_cache.topic_tag(id))
 
     return result == 0
 
-def _count_topics_admin():
-    return next((el for el in read_query('SELECT count(*) FROM topics')), 0)[0]
+async def _count_topics_admin():
+    return next((el for el in await read_query('SELECT count(*) FROM topics')), 0)[0]
+
+async def _count_topics_regular(user: User):
+    condition, params = access_services.category_filter('t.id_category', await access_services.readable_categories(user))
 
-def _count_topics_regular(user_id: int):
+    return next((el for el in await read_query(f'SELECT count(*) FROM topics t WHERE {condition}', tuple(params))), (0,))[0]
 
-    return next((el for el in read_query('''
-                SELECT count(*) FROM topics t
-                where t.id_category not in 
-                (select categories_id_category from private_categories) or t.id_author in 
-                (select users_id_user from private_categories where users_id_user = ?)''',
-                (user_id,))), 0)
\ No newline at end of file
+async def repair_reply_counters(topic_id: int | None = None) -> int:
+    '''recompute topics.reply_count and last_reply_at from the replies table; returns the number of topics changed'''
+    query = '''UPDATE topics t
+                LEFT JOIN (SELECT topics_id_topic, COUNT(*) AS reply_count, MAX(created_on) AS last_reply_at
+                           FROM replies GROUP BY topics_id_topic) r ON r.topics_id_topic = t.id_topic
+                SET t.reply_count = COALESCE(r.reply_count, 0), t.last_reply_at = r.last_reply_at'''
+    params = ()
+    if topic_id is not None:
+        query += ' WHERE t.id_topic = ?'
+        params = (topic_id,)
+    changed = await update_query(query, params)
+    if changed:
+        page_cache.clear()
+    return changed
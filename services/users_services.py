@@ -1,28 +1,58 @@
-from data.database import insert_query, update_query
+from data.async_database import read_query, insert_query, update_query
 from models.user import User
 # import bcrypt
 from datetime import datetime
+from fastapi import Request
 from mariadb import IntegrityError
 import common.auth as auth
 
 
-def register (username:str, password: str):
+async def register (username:str, password: str):
     try:
         auth.check_password(password)
     except AssertionError as error:
         return error
     
     try:
-        hashed_password = auth.get_password_hash(password)
+        hashed_password = await auth.get_password_hash_async(password)
         created = datetime.utcnow()
-        insert_query("insert into users (username, password, created_on) values(?,?,?)",(username, hashed_password,created))
+        await insert_query("insert into users (username, password, created_on) values(?,?,?)",(username, hashed_password,created))
+        auth.invalidate_user(username=username)
         return username, password
     except IntegrityError:
         return 
     
-def set_admin(id: int):  
-    return update_query("update users set is_admin = ? where id_user =?",(1, id))
-        
-        
+async def set_admin(id: int):  
+    result = await update_query("update users set is_admin = ? where id_user =?",(1, id))
+    auth.invalidate_user(user_id=id)
+    return result
 
-    
\ No newline at end of file
+
+class UsernameLoader:
+    '''Resolves user ids to usernames for one request: the ids of a whole page go in one IN (...) query,
+    and names already loaded are not queried again. Share one between the services a request uses.'''
+
+    def __init__(self):
+        self._names: dict[int, str | None] = {}
+
+    async def load_many(self, ids) -> dict[int, str | None]:
+        ids = list(ids)
+        missing = sorted({id for id in ids if id not in self._names})
+        if missing:
+            rows = await read_query(
+                f"SELECT id_user, username FROM users WHERE id_user IN ({', '.join('?' for _ in missing)})",
+                tuple(missing))
+            self._names.update(dict.fromkeys(missing))
+            self._names.update(rows)
+        return {id: self._names[id] for id in ids}
+
+    async def load(self, id: int) -> str | None:
+        return (await self.load_many([id]))[id]
+
+
+def request_usernames(request: Request) -> UsernameLoader:
+    '''the UsernameLoader of this request, kept on request.state so every service the request calls shares it'''
+    loader = getattr(request.state, "usernames", None)
+    if loader is None:
+        loader = request.state.usernames = UsernameLoader()
+    return loader
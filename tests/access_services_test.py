@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import Mock, patch
+from services import access_services
+
+
+def fake_user(id, is_admin=0):
+    return Mock(id=id, is_admin=is_admin)
+
+
+class AccessServicesShould(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        access_services.access_cache.clear()
+
+    async def test_readableCategories_returnsPublicAndPrivate_regularUser(self):
+        # Arrange
+        with patch('services.access_services.read_query', side_effect=[[(1,), (2,)], [(5, 0), (6, 1)]]):
+
+            # Act
+            result = await access_services.readable_categories(fake_user(3))
+
+            # Assert
+            self.assertEqual(frozenset({1, 2, 5, 6}), result)
+
+    async def test_readableCategories_returnsNone_admin(self):
+        # Arrange
+        with patch('services.access_services.read_query') as read_func:
+
+            # Act
+            result = await access_services.readable_categories(fake_user(1, 1))
+
+            # Assert
+            self.assertIsNone(result)
+            read_func.assert_not_called()
+
+    async def test_writableCategories_skipsReadOnlyCategories_regularUser(self):
+        # Arrange
+        with patch('services.access_services.read_query', side_effect=[[(5, 0), (6, 1)], [(1,)]]):
+
+            # Act
+            result = await access_services.writable_categories(fake_user(3))
+
+            # Assert
+            self.assertEqual(frozenset({1, 6}), result)
+
+    async def test_readableCategories_readsCache_secondCall(self):
+        # Arrange
+        with patch('services.access_services.read_query', side_effect=[[(1,)], [(5, 0)]]) as read_func:
+
+            # Act
+            await access_services.readable_categories(fake_user(3))
+            result = await access_services.readable_categories(fake_user(3))
+
+            # Assert
+            self.assertEqual(frozenset({1, 5}), result)
+            self.assertEqual(2, read_func.await_count)
+
+    async def test_readableCategories_rereadsUser_afterInvalidateUser(self):
+        # Arrange
+        with patch('services.access_services.read_query', side_effect=[[(1,)], [(5, 0)], []]) as read_func:
+            await access_services.readable_categories(fake_user(3))
+
+            # Act
+            access_services.invalidate_user(3)
+            result = await access_services.readable_categories(fake_user(3))
+
+            # Assert
+            self.assertEqual(frozenset({1}), result)
+            self.assertEqual(3, read_func.await_count)
+
+    async def test_readableCategories_doesNotCache_whenInvalidatedDuringRead(self):
+        # Arrange
+        private_rows = [[(5, 0)], []]
+
+        async def read(sql, params=()):
+            if 'private_categories' not in sql:
+                return [(1,)]
+            # access revoked and invalidated while the first lookup is still reading
+            access_services.invalidate_user(3)
+            return private_rows.pop(0)
+
+        with patch('services.access_services.read_query', side_effect=read):
+            stale = await access_services.readable_categories(fake_user(3))
+
+            # Act
+            result = await access_services.readable_categories(fake_user(3))
+
+            # Assert
+            self.assertEqual(frozenset({1, 5}), stale)
+            self.assertEqual(frozenset({1}), result)
+
+    def test_categoryFilter_returnsFalse_noCategories(self):
+        # Arrange & Act & Assert
+        self.assertEqual(("FALSE", []), access_services.category_filter("t.id_category", frozenset()))
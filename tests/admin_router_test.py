@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import Mock, patch
+from fastapi import HTTPException
+from routers import admin
+
+
+class AdminRouterShould(unittest.IsolatedAsyncioTestCase):
+
+    async def test_metrics_includesHashingExecutorAndUserCache(self):
+        # Arrange
+        with patch('routers.admin.auth.get_principal', return_value=Mock(is_admin=True)):
+
+            # Act
+            response = await admin.metrics(Mock(headers={}))
+
+            # Assert
+            body = response.body.decode()
+            self.assertIn("forum_hashing_executor_queued ", body)
+            self.assertIn("forum_user_cache_hits ", body)
+
+    async def test_metrics_raisesUnauthorized_notAdmin(self):
+        # Arrange
+        with patch('routers.admin.auth.get_principal', return_value=Mock(is_admin=False)):
+
+            # Act & Assert
+            with self.assertRaises(HTTPException) as context:
+                await admin.metrics(Mock(headers={}))
+            self.assertEqual(401, context.exception.status_code)
+
+    async def test_metrics_acceptsScraperToken_withoutSession(self):
+        # Arrange
+        request = Mock(headers={"authorization": "Bearer scrape-me"})
+        with patch('routers.admin.METRICS_TOKEN', 'scrape-me'), \
+            patch('routers.admin.auth.get_principal', side_effect=AssertionError("no session needed")):
+
+            # Act
+            response = await admin.metrics(request)
+
+            # Assert
+            self.assertEqual(200, response.status_code)
+
+    async def test_metrics_raisesUnauthorized_wrongScraperToken(self):
+        # Arrange
+        request = Mock(headers={"authorization": "Bearer guess"})
+        with patch('routers.admin.METRICS_TOKEN', 'scrape-me'), \
+            patch('routers.admin.auth.get_principal', return_value=Mock(is_admin=False)):
+
+            # Act & Assert
+            with self.assertRaises(HTTPException) as context:
+                await admin.metrics(request)
+            self.assertEqual(401, context.exception.status_code)
+
+    async def test_viewQueryStats_includesHashingExecutorAndUserCache(self):
+        # Arrange
+        with patch('routers.admin.auth.get_principal', return_value=Mock(is_admin=True)):
+
+            # Act
+            result = await admin.view_query_stats(Mock())
+
+            # Assert
+            self.assertIn("queued", result["hashing"])
+            self.assertIn("hits", result["user_cache"])
@@ -1,10 +1,11 @@
 from unittest import TestCase, IsolatedAsyncioTestCase
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from common import auth
 from datetime import datetime
 from jose import  jwt, ExpiredSignatureError
 from passlib.context import CryptContext
 from fastapi import HTTPException
+from common.executor import ExecutorBusy
 
 fake_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -142,65 +143,6 @@ class AuthShould(TestCase):
         # Arrange & Act & Assert
         self.assertEqual(datetime.utcnow(), auth.get_time())
     
-    def test_findUser_findsUser_userExists(self):
-        # Arrange
-        with patch('common.auth.read_query', return_value = generate_fake_users_db()):
-            username = "username0"
-            # Act
-            user = auth.find_user(username)
-            
-            # Assert
-            self.assertEqual(0, user.id)
-            self.assertEqual("username0", user.username)
-            self.assertTrue(fake_pwd_context.verify("2Wsx3edc+", user.password))
-            self.assertEqual(0, user.is_admin)
-    
-    def test_findUser_returnsNone_userDoesntExist(self):
-        # Arrange
-        with patch('common.auth.read_query', return_value = []):
-            username = "username0"
-            # Act
-            user = auth.find_user(username)
-            
-            # Assert
-            self.assertIsNone(user)
-
-    def test_authenticateUser_returnsUser_userExists(self):
-        # Arrange
-        with patch('common.auth.read_query', return_value = generate_fake_users_db()):
-            username = "username0"
-            password = "2Wsx3edc+"
-            # Act
-            user = auth.authenticate_user(username, password)
-            
-            # Assert
-            self.assertEqual(0, user.id)
-            self.assertEqual("username0", user.username)
-            self.assertTrue(fake_pwd_context.verify("2Wsx3edc+", user.password))
-            self.assertEqual(0, user.is_admin)
-    
-    def test_authenticateUser_returnsNone_wrongUsername(self):
-        # Arrange
-        with patch('common.auth.read_query', return_value = []):
-            username = "username5"
-            password = "2Wsx3edc+"
-            # Act
-            user = auth.authenticate_user(username, password)
-            
-            # Assert
-            self.assertIsNone(user)
-    
-    def test_authenticateUser_returnsNone_wrongPassword(self):
-        # Arrange
-        with patch('common.auth.read_query', return_value = []):
-            username = "username0"
-            password = "2Wsx3edc="
-            # Act
-            user = auth.authenticate_user(username, password)
-            
-            # Assert
-            self.assertIsNone(user)
-    
     def test_createAccessToken_createsCorrectAccessToken(self):
         # Arrange
         fake_access_data = {"sub": "username", "is_admin": 0}
@@ -265,7 +207,203 @@ class AuthShould(TestCase):
         self.assertEqual("Incorrect username or password", context.exception.detail)
         self.assertEqual({"WWW-Authenticate": "Bearer"}, context.exception.headers)
 
+    def test_getPrincipal_raisesUnauthorized_noPrincipal(self):
+        # Arrange
+        request = Mock()
+        request.state.principal = None
+
+        # Act & Assert
+        with self.assertRaises(HTTPException) as context:
+            auth.get_principal(request)
+        self.assertEqual(401, context.exception.status_code)
+
 class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
+    def setUp(self):
+        auth.user_cache.clear()
+
+    async def test_findUser_servesCachedUser_secondLookup(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = generate_fake_users_db()) as read_func:
+            username = "username0"
+            # Act
+            first = await auth.find_user(username)
+            second = await auth.find_user(username)
+            
+            # Assert
+            self.assertIs(first, second)
+            read_func.assert_called_once()
+            self.assertEqual(1, auth.user_cache.stats()["hits"])
+    
+    async def test_invalidateUser_dropsCachedUser_byId(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = generate_fake_users_db()) as read_func:
+            username = "username0"
+            await auth.find_user(username)
+            
+            # Act
+            auth.invalidate_user(user_id=0)
+            await auth.find_user(username)
+            
+            # Assert
+            self.assertEqual(2, read_func.call_count)
+    
+    async def test_findUser_sharesEntry_acrossUsernameCase(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = generate_fake_users_db()) as read_func:
+            await auth.find_user("Username0")
+
+            # Act
+            await auth.find_user("username0")
+            auth.invalidate_user(username="USERNAME0")
+            await auth.find_user("username0")
+
+            # Assert
+            self.assertEqual(2, read_func.call_count)
+
+    async def test_findUser_doesNotCache_whenInvalidatedDuringRead(self):
+        # Arrange
+        async def promoted_meanwhile(*args):
+            auth.invalidate_user(user_id=0)
+            return generate_fake_users_db()
+
+        with patch('common.auth.read_query', side_effect=promoted_meanwhile) as read_func:
+            await auth.find_user("username0")
+
+            # Act
+            await auth.find_user("username0")
+
+            # Assert
+            self.assertEqual(2, read_func.call_count)
+
+    async def test_accessTokenMatches_returnsTrue_boundAccessToken(self):
+        # Arrange
+        response = auth.token_response(fake_registered_user(id = 1, username = "username"))
+        binding = jwt.decode(response["refresh_token"], auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("access_token")
+
+        # Act & Assert
+        self.assertTrue(await auth.access_token_matches(response["access_token"], binding))
+        self.assertFalse(await auth.access_token_matches(response["access_token"] + "1", binding))
+
+    async def test_verifyPasswordAsync_raisesServiceUnavailable_hashingPoolBusy(self):
+        # Arrange
+        with patch('common.auth._hashing_executor.run', side_effect=ExecutorBusy("hashing: queue is full")):
+
+            # Act & Assert
+            with self.assertRaises(HTTPException) as context:
+                await auth.verify_password_async("2Wsx3edc+", fake_pwd_context.hash("2Wsx3edc+"))
+            self.assertEqual(503, context.exception.status_code)
+            self.assertEqual({"Retry-After": "1"}, context.exception.headers)
+
+    async def test_decodePrincipal_returnsPrincipal_withoutUserLookup(self):
+        # Arrange
+        with patch('common.auth.find_user') as find_user:
+            access_token = auth.token_response(fake_registered_user(id = 1, username = "username"))["access_token"]
+
+            # Act
+            principal = await auth.decode_principal(access_token)
+
+            # Assert
+            self.assertEqual((1, "username", 0), (principal.id, principal.username, principal.is_admin))
+            find_user.assert_not_called()
+
+    async def test_decodePrincipal_returnsNone_refreshToken(self):
+        # Arrange
+        refresh_token = auth.token_response(fake_registered_user(id = 1, username = "username"))["refresh_token"]
+
+        # Act & Assert
+        self.assertIsNone(await auth.decode_principal(refresh_token))
+
+    async def test_tokenValidationMiddleware_redirectsToRefresh_invalidToken(self):
+        # Arrange
+        app = AsyncMock()
+        middleware = auth.TokenValidationMiddleware(app)
+        scope = {"type": "http", "method": "GET", "path": "/topics/", "query_string": b"",
+                 "headers": [(b"host", b"testserver"), (b"cookie", b"access_token=invalid")]}
+        sent = []
+        async def send(message):
+            sent.append(message)
+
+        # Act
+        await middleware(scope, AsyncMock(), send)
+
+        # Assert
+        app.assert_not_called()
+        self.assertEqual(303, sent[0]["status"])
+
+    async def test_tokenValidationMiddleware_attachesPrincipal_validToken(self):
+        # Arrange
+        app = AsyncMock()
+        middleware = auth.TokenValidationMiddleware(app)
+        access_token = auth.token_response(fake_registered_user(id = 1, username = "username"))["access_token"]
+        scope = {"type": "http", "method": "GET", "path": "/topics/", "query_string": b"",
+                 "headers": [(b"host", b"testserver"), (b"cookie", f"access_token={access_token}".encode())]}
+
+        # Act
+        await middleware(scope, AsyncMock(), AsyncMock())
+
+        # Assert
+        app.assert_awaited_once()
+        self.assertEqual(1, scope["state"]["principal"].id)
+
+    async def test_findUser_findsUser_userExists(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = generate_fake_users_db()):
+            username = "username0"
+            # Act
+            user = await auth.find_user(username)
+            
+            # Assert
+            self.assertEqual(0, user.id)
+            self.assertEqual("username0", user.username)
+            self.assertTrue(fake_pwd_context.verify("2Wsx3edc+", user.password))
+            self.assertEqual(0, user.is_admin)
+    
+    async def test_findUser_returnsNone_userDoesntExist(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = []):
+            username = "username0"
+            # Act
+            user = await auth.find_user(username)
+            
+            # Assert
+            self.assertIsNone(user)
+
+    async def test_authenticateUser_returnsUser_userExists(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = generate_fake_users_db()):
+            username = "username0"
+            password = "2Wsx3edc+"
+            # Act
+            user = await auth.authenticate_user(username, password)
+            
+            # Assert
+            self.assertEqual(0, user.id)
+            self.assertEqual("username0", user.username)
+            self.assertTrue(fake_pwd_context.verify("2Wsx3edc+", user.password))
+            self.assertEqual(0, user.is_admin)
+    
+    async def test_authenticateUser_returnsNone_wrongUsername(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = []):
+            username = "username5"
+            password = "2Wsx3edc+"
+            # Act
+            user = await auth.authenticate_user(username, password)
+            
+            # Assert
+            self.assertIsNone(user)
+    
+    async def test_authenticateUser_returnsNone_wrongPassword(self):
+        # Arrange
+        with patch('common.auth.read_query', return_value = []):
+            username = "username0"
+            password = "2Wsx3edc="
+            # Act
+            user = await auth.authenticate_user(username, password)
+            
+            # Assert
+            self.assertIsNone(user)
+    
     async def test_getCurrentUser_returnsCorrectUser_userExists(self):
         # Arrange
         with patch('common.auth.find_user', return_value = fake_registered_user(1, "username")):
@@ -339,7 +477,7 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             patch('common.auth.read_query', return_value = generate_fake_users_db()):
             fake_access_data = {"sub": fake_registered_user(1, "username").username,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)
             fake_refresh_token = auth.create_refresh_token(fake_access_data)
             
             
@@ -352,13 +490,27 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             self.assertTrue(fake_pwd_context.verify("2Wsx3edc+", user.password))
             self.assertEqual(0, user.is_admin)        
     
+    async def test_refreshAccessToken_refreshesToken_legacyBcryptBinding(self):
+        # Arrange
+        with patch('common.auth.find_user', return_value = fake_registered_user(1, "username")):
+            fake_access_data = {"sub": "username", "is_admin": 0}
+            fake_acess_token = auth.create_access_token(fake_access_data)
+            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_refresh_token = auth.create_refresh_token(fake_access_data)
+
+            # Act
+            user = await auth.refresh_access_token(fake_acess_token, fake_refresh_token)
+
+            # Assert
+            self.assertEqual(1, user.id)
+
     async def test_refreshAccessToken_raisesUnauthorized_notValidRefreshToken(self):
         # Arrange
         with patch('common.auth.find_user', return_value = fake_registered_user(1, "username")), \
             patch('common.auth.read_query', return_value = generate_fake_users_db()):
             fake_access_data = {"sub": fake_registered_user(1, "username").username,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)
             fake_refresh_token = auth.create_refresh_token(fake_access_data)+"1"
          
             
@@ -375,7 +527,7 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             patch('common.auth.read_query', return_value = generate_fake_users_db()):
             fake_access_data = {"sub": fake_registered_user(1, "username").username,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)+"1"
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)+"1"
             fake_refresh_token = auth.create_refresh_token(fake_access_data)
          
             
@@ -392,7 +544,7 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             patch('common.auth.read_query', return_value = generate_fake_users_db()):
             fake_access_data = {"sub": fake_registered_user(1, "username").username,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)
             fake_refresh_token = auth.create_refresh_token(fake_access_data)
          
             
@@ -409,7 +561,7 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             patch('common.auth.read_query', return_value = generate_fake_users_db()):
             fake_access_data = {"sub": None,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)
             fake_refresh_token = auth.create_refresh_token(fake_access_data)
          
             
@@ -427,7 +579,7 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             patch('common.auth.ACCESS_TOKEN_EXPIRE_MINUTES', -1):
             fake_access_data = {"sub": fake_registered_user(1, "username").username,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)
             fake_refresh_token = auth.create_refresh_token(fake_access_data)
          
             
@@ -444,7 +596,7 @@ class AuthAsyncFunctionsShould(IsolatedAsyncioTestCase):
             patch('common.auth.read_query', return_value = generate_fake_users_db()):
             fake_access_data = {"sub": fake_registered_user(1, "username").username,"is_admin": fake_registered_user(1, "username").is_admin}
             fake_acess_token = auth.create_access_token(fake_access_data)
-            fake_access_data["access_token"] = fake_pwd_context.hash(fake_acess_token)
+            fake_access_data["access_token"] = auth.bind_access_token(fake_acess_token)
             fake_refresh_token = auth.create_refresh_token(fake_access_data)
          
             
@@ -0,0 +1,87 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from services import broadcast_services
+
+
+@asynccontextmanager
+async def fake_transaction():
+    yield
+
+
+class BroadcastServicesShould(IsolatedAsyncioTestCase):
+
+    async def test_createBroadcast_storesOutboxRow_queuesDelivery(self):
+        # Arrange
+        queue = asyncio.Queue()
+        with patch('services.broadcast_services.read_query', return_value=[(2500,)]), \
+            patch('services.broadcast_services.insert_query', side_effect=[10, 3]) as insert_func, \
+            patch('services.broadcast_services.transaction', fake_transaction), \
+            patch('services.broadcast_services._queue', queue):
+
+            # Act
+            broadcast = await broadcast_services.create_broadcast(1, "Maintenance", "The forum is down on Sunday")
+
+            # Assert
+            self.assertEqual((3, 10, 2500, 0, "pending"),
+                             (broadcast.id, broadcast.message_id, broadcast.total_recipients, broadcast.delivered, broadcast.status))
+            self.assertEqual(3, queue.get_nowait())
+            self.assertEqual(2, insert_func.await_count)
+
+    async def test_createBroadcast_raisesNotFound_publicCategory(self):
+        # Arrange
+        with patch('services.broadcast_services.read_query', return_value=[(0,)]), \
+            patch('services.broadcast_services.insert_query') as insert_func:
+
+            # Act & Assert
+            with self.assertRaises(HTTPException) as context:
+                await broadcast_services.create_broadcast(1, "Subject", "Content", category_id=4)
+            self.assertEqual(404, context.exception.status_code)
+            insert_func.assert_not_called()
+
+    async def test_deliver_insertsRecipientsInChunks_resumesAfterLastRecipient(self):
+        # Arrange
+        with patch('services.broadcast_services.read_query',
+                   side_effect=[[(10, None, 1)], [(4,)], [(5,), (6,)], [(6,)], [(7,)], [(7,)], []]) as read_func, \
+            patch('services.broadcast_services.update_query', return_value=1) as update_func, \
+            patch('services.broadcast_services.messages_services.add_recipients') as add_func, \
+            patch('services.broadcast_services.transaction', fake_transaction), \
+            patch('services.broadcast_services.BROADCAST_CHUNK_SIZE', 2):
+
+            # Act
+            delivered = await broadcast_services.deliver(3)
+
+            # Assert
+            self.assertEqual(3, delivered)
+            self.assertEqual([(10, [5, 6]), (10, [7])], [call.args for call in add_func.await_args_list])
+            self.assertIn("FOR UPDATE SKIP LOCKED", read_func.await_args_list[1].args[0])
+            self.assertEqual((1, 4, 2), read_func.await_args_list[2].args[1])
+            self.assertEqual((1, 6, 2), read_func.await_args_list[4].args[1])
+            self.assertEqual((2, 6, 3), update_func.await_args_list[0].args[1])
+            self.assertIn("status = 'done'", update_func.await_args_list[-1].args[0])
+
+    async def test_deliver_returnsZero_broadcastNotPending(self):
+        # Arrange
+        with patch('services.broadcast_services.read_query', return_value=[]), \
+            patch('services.broadcast_services.messages_services.add_recipients') as add_func:
+
+            # Act & Assert
+            self.assertEqual(0, await broadcast_services.deliver(3))
+            add_func.assert_not_called()
+
+    async def test_deliver_leavesBroadcast_lockedByAnotherWorker(self):
+        # Arrange
+        with patch('services.broadcast_services.read_query', side_effect=[[(10, None, 1)], []]), \
+            patch('services.broadcast_services.update_query') as update_func, \
+            patch('services.broadcast_services.messages_services.add_recipients') as add_func, \
+            patch('services.broadcast_services.transaction', fake_transaction):
+
+            # Act
+            delivered = await broadcast_services.deliver(3)
+
+            # Assert
+            self.assertEqual(0, delivered)
+            add_func.assert_not_called()
+            update_func.assert_not_called()
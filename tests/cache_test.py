@@ -0,0 +1,65 @@
+from unittest import TestCase
+from unittest.mock import patch
+from common.cache import TTLCache
+
+
+class TTLCacheShould(TestCase):
+    def test_get_returnsStoredValue_countsHit(self):
+        # Arrange
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+
+        # Act & Assert
+        self.assertEqual(1, cache.get("a"))
+        self.assertEqual(1, cache.stats()["hits"])
+
+    def test_get_returnsDefault_countsMiss(self):
+        # Arrange
+        cache = TTLCache(maxsize=2, ttl=60)
+
+        # Act & Assert
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(1, cache.stats()["misses"])
+
+    def test_get_returnsDefault_expiredEntry(self):
+        # Arrange
+        cache = TTLCache(maxsize=2, ttl=60)
+        with patch("common.cache.time.monotonic", return_value=0):
+            cache.set("a", 1)
+
+        # Act
+        with patch("common.cache.time.monotonic", return_value=61):
+            result = cache.get("a")
+
+        # Assert
+        self.assertIsNone(result)
+        self.assertEqual(1, cache.stats()["expirations"])
+
+    def test_set_evictsLeastRecentlyUsed_overMaxsize(self):
+        # Arrange
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        # Act
+        cache.set("c", 3)
+
+        # Assert
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(1, cache.stats()["evictions"])
+
+    def test_popWhere_dropsMatchingValues(self):
+        # Arrange
+        cache = TTLCache(maxsize=3, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        # Act
+        dropped = cache.pop_where(lambda value: value == 2)
+
+        # Assert
+        self.assertEqual(1, dropped)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(1, cache.get("a"))
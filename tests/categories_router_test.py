@@ -12,7 +12,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
         self.client = TestClient(app)
 
     def test_viewCategories_show_categories_to_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_all_categories", return_value=ctd.FAKE_CATEGORIES_ALL_PAGE1_ASC):
 
             token = ctd.FAKE_HEADERS_TOKEN_ADMIN
@@ -25,7 +25,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.FAKE_CATEGORIES_ALL_PAGE1_ASC, response.json())
     
     def test_viewCategories_shows_the_second_page(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_all_categories", return_value=ctd.FAKE_CATEGORIES_ALL_PAGE2_ASC):
 
             token = ctd.FAKE_HEADERS_TOKEN_ADMIN
@@ -38,7 +38,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.FAKE_CATEGORIES_ALL_PAGE2_ASC, response.json())
 
     def test_viewCategories_filters_by_name(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_all_categories", return_value=ctd.FAKE_CATEGORIES_FILTER_BOA):
 
             token = ctd.FAKE_HEADERS_TOKEN_ADMIN
@@ -52,7 +52,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
 
 
     def test_viewCategories_show_categories_to_user(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_user()), \
             patch("routers.categories.categories_services.get_all_categories", return_value=ctd.FAKE_CATEGORIES_USER_PAGE1_ASC):
             
             token = ctd.FAKE_HEADERS_TOKEN_USER
@@ -65,7 +65,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.FAKE_CATEGORIES_USER_PAGE1_ASC, response.json())
 
     def test_viewTopicsByCategoryId_when_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_topics_by_cat_id", return_value=ctd.ALL_FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_ASC_PAGE1):
 
             cat_id = 1
@@ -80,7 +80,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.ALL_FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_ASC_PAGE1, response.json())
 
     def test_viewTopicsByCategoryId_second_admin_page(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_topics_by_cat_id", return_value=ctd.ALL_FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_ASC_PAGE2):
 
             cat_id = 1
@@ -95,7 +95,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.ALL_FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_ASC_PAGE2, response.json())
     
     def test_viewTopicsByCategoryId_desc_second_admin_page(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_topics_by_cat_id", return_value=ctd.ALL_FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_DESC_PAGE2):
 
             cat_id = 1
@@ -110,7 +110,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.ALL_FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_DESC_PAGE2, response.json())
 
     def test_viewTopicsByCategoryId_desc_second_admin_page_TopicTitleFilter(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_topics_by_cat_id", return_value=ctd.FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_DESC_TT_BMW):
 
             cat_id = 1
@@ -125,7 +125,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.FAKE_TOPICS_BY_FAKE_CATEGORY_ID1_CARS_DESC_TT_BMW, response.json())
             
     def test_GetPrivilegedUsersByCat_when_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.get_privileged_users", return_value=ctd.FAKE_PRIVILEGED_USRS_CAT_ID8):
 
             cat_id = 8
@@ -137,7 +137,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.FAKE_PRIVILEGED_USRS_CAT_ID8, response.json())
 
     def test_GetPrivilegedUsersByCat_raises_Unauthorized_when_not_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
 
             cat_id = 8
             token = ctd.FAKE_HEADERS_TOKEN_USER
@@ -148,7 +148,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "You are not admin! You are not authorized to see privileged_users!"}, response.json()) 
     
     def test_createCategory_when_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.create_new_category", return_value=ctd.FAKE_CATEGORY):
 
             token = ctd.FAKE_HEADERS_TOKEN_ADMIN
@@ -160,7 +160,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(fake_category, response.json())
 
     def test_createCategory_raises_CONFLICT_onDuplicateNames(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.create_new_category", return_value=ctd.FAKE_CONFLICT_HTTPException):
 
             token = ctd.FAKE_HEADERS_TOKEN_ADMIN
@@ -171,7 +171,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "Category with name 'Cooking' already exists!", "status_code": 409,"headers": None}, response.json(), )
     
     def test_createCategory_raises_Unauthorized_when_not_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
 
             token = ctd.FAKE_HEADERS_TOKEN_USER
             fake_category = ctd.FAKE_CATEGORY
@@ -182,7 +182,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "Not authorized to create Category!"}, response.json())
 
     def test_changePrivacy_returns_correctly(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.change_category_privacy", return_value=ctd.FAKE_CHANGE_CATEGORY_PRIVACY_TO_PRIVATE_RETURN):
 
             cat_id = 17
@@ -195,7 +195,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual("Category '17' changed status to 'private'.", response.json())
 
     def test_changePrivacy_raises_Unauthorized_when_not_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
 
             cat_id = 17
             token = ctd.FAKE_HEADERS_TOKEN_USER
@@ -207,7 +207,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "Not authorized to change the category status!"}, response.json())
 
     def test_changePrivacy_raises_NotFound_if_no_such_category(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.change_category_privacy", return_value = ctd.NO_CATEGORY_OR_SAME_STATUS):
 
             cat_id = len(ctd.ALL_FAKE_CATEGORIES) + 1
@@ -220,7 +220,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
 
 
     def test_giveUserReadAccess_gives_read_access(self):
-         with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+         with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.give_read_access_to_user", return_value = ctd.SUCCESSFUL_GIVING_READ_ACCESS):
             
             cat_id = 8
@@ -233,7 +233,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.SUCCESSFUL_GIVING_READ_ACCESS, response.json())
     
     def test_giveUserReadAccess_raises_Unauthorized_when_not_admin(self):
-         with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+         with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
             
             cat_id = 8
             user_id = 5
@@ -245,7 +245,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "You are not admin! You are not authorized to give read access!"}, response.json())
 
     def test_giveUserReadAccess_raises_NotFound_if_wrong_cat_id_or_user_id(self):
-         with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+         with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.give_read_access_to_user", return_value = ctd.UNSUCCESSFUL_GIVING_READ_or_WRITE_ACCESS):
             
             cat_id = 42
@@ -257,7 +257,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.UNSUCCESSFUL_GIVING_READ_or_WRITE_ACCESS, response.json())
 
     def test_giveUserReadAccess_gives_write_access(self):
-         with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+         with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.give_write_access_to_user", return_value = ctd.SUCCESSFUL_GIVING_WRITE_ACCESS):
             
             cat_id = 8
@@ -270,7 +270,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.SUCCESSFUL_GIVING_WRITE_ACCESS, response.json())
     
     def test_giveUserReadAccess_raises_Unauthorized_when_not_admin(self):
-         with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+         with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
             
             cat_id = 8
             user_id = 5
@@ -282,7 +282,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "You are not admin! You are not authorized to give write access!"}, response.json())
 
     def test_giveUserReadAccess_raises_NotFound_if_wrong_cat_id_or_user_id(self):
-         with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+         with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.give_write_access_to_user", return_value = ctd.UNSUCCESSFUL_GIVING_READ_or_WRITE_ACCESS):
             
             cat_id = 42
@@ -294,7 +294,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.UNSUCCESSFUL_GIVING_READ_or_WRITE_ACCESS, response.json())
 
     def test_lockCategory_locks_category(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.lock_category_by_id", return_value = ctd.SUCCESSFUL_LOCK_CATEGORY):
 
             cat_id = 6
@@ -306,7 +306,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.SUCCESSFUL_LOCK_CATEGORY, response.json())
 
     def test_lockCategory_raises_Unauthorized_when_not_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
 
             cat_id = 6
             token = ctd.FAKE_HEADERS_TOKEN_USER
@@ -317,7 +317,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail": "You are not admin! You are not authorized to lock categories!"}, response.json())
 
     def test_lockCategory_raises_NotFound_if_wrong_cat_id(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.lock_category_by_id", return_value = ctd.UNSUCCESSFUL_LOCK_CATEGORY):
 
             cat_id = 44
@@ -328,7 +328,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.UNSUCCESSFUL_LOCK_CATEGORY, response.json())
 
     def test_revokeUserAccess_revokes(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.revoke_access", return_value = ctd.SUCCESSFUL_REVOKE_USER_ACCESS):
             
             cat_id = 8
@@ -341,7 +341,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual(ctd.SUCCESSFUL_REVOKE_USER_ACCESS, response.json())
     
     def test_revokeUserAccess_raises_Unauthorized_when_not_admin(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_user()):
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_user()):
             
             cat_id = 8
             user_id = 6
@@ -352,7 +352,7 @@ class CategoriesRouterShould(IsolatedAsyncioTestCase):
             self.assertEqual({"detail":"You are not admin! You are not authorized to revoke user access!"}, response.json())
     
     def test_revokeUserAccess_NotFound_if_wrong_cat_id(self):
-        with patch("common.auth.get_current_user", return_value=urt.fake_registered_admin()), \
+        with patch("common.auth.get_principal", return_value=urt.fake_registered_admin()), \
             patch("routers.categories.categories_services.revoke_access", return_value = ctd.UNSUCCESSFUL_REVOKE_USER_ACCESS):
             
             cat_id = 44
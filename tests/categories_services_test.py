@@ -1,5 +1,6 @@
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch
+from contextlib import asynccontextmanager
 import services.categories_services as cs
 import categories_tests_data as ctd
 import users_router_test as urt
@@ -10,7 +11,12 @@ import mariadb as mdb
 
 
 
-class CategoriesServicesShould(TestCase):
+@asynccontextmanager
+async def fake_transaction():
+    yield
+
+
+class CategoriesServicesShould(IsolatedAsyncioTestCase):
     def test_readCategoryParams_non_private_unlocked(self):
         result = cs.read_category_params(
             ctd.FAKE_CATEGORY_PARAMS_FROM_DB_NON_PRIVATE_UNLOCKED
@@ -27,11 +33,11 @@ class CategoriesServicesShould(TestCase):
 
         self.assertEqual(expected, result)
 
-    def test_readTopicParams_unlocked(self):
+    async def test_readTopicParams_unlocked(self):
         with patch(
             "services.categories_services.find_user_by_id", return_value="Tosho"
         ):
-            result = cs.read_topic_params(ctd.FAKE_TOPIC_PARAMS_FROM_DB_UNLOCKED)
+            result = await cs.read_topic_params(ctd.FAKE_TOPIC_PARAMS_FROM_DB_UNLOCKED)
 
             expected = (
                 11,
@@ -46,11 +52,11 @@ class CategoriesServicesShould(TestCase):
 
             self.assertEqual(expected, result)
 
-    def test_readTopicParams_locked(self):
+    async def test_readTopicParams_locked(self):
         with patch(
             "services.categories_services.find_user_by_id", return_value="Tosho"
         ):
-            result = cs.read_topic_params(ctd.FAKE_TOPIC_PARAMS_FROM_DB_LOCKED)
+            result = await cs.read_topic_params(ctd.FAKE_TOPIC_PARAMS_FROM_DB_LOCKED)
 
             expected = (
                 11,
@@ -105,77 +111,77 @@ class CategoriesServicesShould(TestCase):
 
         self.assertEqual(expected, result)
 
-    def test_findUserById(self):
+    async def test_findUserById(self):
         with patch(
             "services.categories_services.read_query", return_value=[("Tosho",)]
         ):
-            result = cs.find_user_by_id(10)
+            result = await cs.find_user_by_id(10)
 
             expected = "Tosho"
 
             self.assertEqual(expected, result)
 
-    def test_getAllCategories_user_admin_page_1(self):
+    async def test_getAllCategories_user_admin_page_1(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_CATEGORIES_PAGE_1_RAW,
         ):
-            result = cs.get_all_categories(urt.fake_registered_admin(), None, 1)
+            result = await cs.get_all_categories(urt.fake_registered_admin(), None, 1)
 
             expected = ctd.ALL_FAKE_CATEGORIES_PAGE_1_RESULT
 
             self.assertEqual(expected, result)
 
-    def test_getAllCategories_user_admin_page_2(self):
+    async def test_getAllCategories_user_admin_page_2(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_CATEGORIES_PAGE_2_RAW,
         ):
-            result = cs.get_all_categories(urt.fake_registered_admin(), None, 2)
+            result = await cs.get_all_categories(urt.fake_registered_admin(), None, 2)
 
             expected = ctd.ALL_FAKE_CATEGORIES_PAGE_2_RESULT
 
             self.assertEqual(expected, result)
 
-    def test_getAllCategories_user_admin_namefiltered(self):
+    async def test_getAllCategories_user_admin_namefiltered(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_CATEGORIES_FILTERED_NAME_CAR_RAW,
         ):
-            result = cs.get_all_categories(urt.fake_registered_admin(), "car", 1)
+            result = await cs.get_all_categories(urt.fake_registered_admin(), "car", 1)
 
             expected = ctd.ALL_FAKE_CATEGORIES_FILTERED_NAME_CAR_RESULT
 
             self.assertEqual(expected, result)
 
-    def test_getAllCategories_user_not_admin_filtered(self):
+    async def test_getAllCategories_user_not_admin_filtered(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_CATEGORIES_FILTERED_NAME_BO_RAW,
-        ):
-            result = cs.get_all_categories(urt.fake_registered_user(), "bo", 1)
+        ), patch("services.categories_services.access_services.readable_categories", return_value=frozenset({1, 2, 3})):
+            result = await cs.get_all_categories(urt.fake_registered_user(), "bo", 1)
 
             expected = ctd.ALL_FAKE_CATEGORIES_FILTERED_NAME_BO_RESULT
 
             self.assertEqual(expected, result)
 
-    def test_getAllCategories_no_user(self):
+    async def test_getAllCategories_no_user(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_CATEGORIES_NON_PRIVATE_RAW,
-        ):
-            result = cs.get_all_categories(None, None, 1)
+        ), patch("services.categories_services.access_services.readable_categories", return_value=frozenset({1, 2})):
+            result = await cs.get_all_categories(None, None, 1)
 
             expected = ctd.ALL_FAKE_CATEGORIES_NON_PRIVATE_RESULT
 
             self.assertEqual(expected, result)
 
-    def test_getTopicsByCatId_admin_page_1(self):
+    async def test_getTopicsByCatId_admin_page_1(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_TOPICS_PAGE_1_RAW,
-        ), patch("services.categories_services.find_user_by_id", return_value="Kolio"):
-            result = cs.get_topics_by_cat_id(
+        ), patch("services.users_services.read_query", return_value=[(2, "Kolio")]):
+            result = await cs.get_topics_by_cat_id(
                 1, urt.fake_registered_admin(), None, "asc", 1
             )
 
@@ -183,12 +189,12 @@ class CategoriesServicesShould(TestCase):
 
             self.assertEqual(expected, result)
 
-    def test_getTopicsByCatId_admin_page_2(self):
+    async def test_getTopicsByCatId_admin_page_2(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_TOPICS_PAGE_2_RAW,
-        ), patch("services.categories_services.find_user_by_id", return_value="Kolio"):
-            result = cs.get_topics_by_cat_id(
+        ), patch("services.users_services.read_query", return_value=[(2, "Kolio")]):
+            result = await cs.get_topics_by_cat_id(
                 1, urt.fake_registered_admin(), None, "asc", 2
             )
 
@@ -196,12 +202,12 @@ class CategoriesServicesShould(TestCase):
 
             self.assertEqual(expected, result)
 
-    def test_getTopicsByCatId_user_filtered(self):
+    async def test_getTopicsByCatId_user_filtered(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_TOPICS_FILTERED_ALFA_RAW,
-        ), patch("services.categories_services.find_user_by_id", return_value="Kolio"):
-            result = cs.get_topics_by_cat_id(
+        ), patch("services.users_services.read_query", return_value=[(2, "Kolio")]), patch("services.categories_services.access_services.readable_categories", return_value=frozenset({1})):
+            result = await cs.get_topics_by_cat_id(
                 1, urt.fake_registered_user(), "alfa", "asc", 1
             )
 
@@ -209,12 +215,12 @@ class CategoriesServicesShould(TestCase):
 
             self.assertEqual(expected, result)
 
-    def test_getTopicsByCatId_user_sorted_desc_page_2(self):
+    async def test_getTopicsByCatId_user_sorted_desc_page_2(self):
         with patch(
             "services.categories_services.read_query",
             return_value=ctd.ALL_FAKE_TOPICS_SORTED_DESC_PAGE_2_RAW,
-        ), patch("services.categories_services.find_user_by_id", return_value="Kolio"):
-            result = cs.get_topics_by_cat_id(
+        ), patch("services.users_services.read_query", return_value=[(2, "Kolio")]), patch("services.categories_services.access_services.readable_categories", return_value=frozenset({1})):
+            result = await cs.get_topics_by_cat_id(
                 1, urt.fake_registered_user(), "alfa", "asc", 1
             )
 
@@ -222,11 +228,11 @@ class CategoriesServicesShould(TestCase):
 
             self.assertEqual(expected, result)
 
-    def test_getTopicsByCatId_no_topics(self):
+    async def test_getTopicsByCatId_no_topics(self):
         with patch(
             "services.categories_services.read_query", return_value=ctd.EMPTY_LIST
-        ):
-            result = cs.get_topics_by_cat_id(
+        ), patch("services.categories_services.access_services.readable_categories", return_value=frozenset({7})):
+            result = await cs.get_topics_by_cat_id(
                 7, urt.fake_registered_user(), "alfa", "asc", 1
             )
 
@@ -234,11 +240,11 @@ class CategoriesServicesShould(TestCase):
 
             self.assertEqual(expected, result)
 
-    def test_createNewCategory_creates_successfully(self):
+    async def test_createNewCategory_creates_successfully(self):
         with patch(
             "services.categories_services.insert_query", return_value=ctd.FAKE_LASTROWID
-        ):
-            result = cs.create_new_category(ctd.FAKE_CATEGORY_FOR_INSERT, 2)
+        ), patch("services.categories_services.transaction", fake_transaction):
+            result = await cs.create_new_category(ctd.FAKE_CATEGORY_FOR_INSERT, 2)
 
             expected = ctd.CREATE_CATEGORY_SUCCESSFUL_RETURN
 
@@ -247,115 +253,118 @@ class CategoriesServicesShould(TestCase):
                 (result.id, result.access_status, result.name),
             )
 
-    def test_createNewCategory_raises_HTTPException(self):
-        with patch("services.categories_services.insert_query", return_value=0):
+    async def test_createNewCategory_raises_HTTPException(self):
+        with patch("services.categories_services.insert_query", return_value=0), \
+            patch("services.categories_services.transaction", fake_transaction):
             try:
-                cs.create_new_category(ctd.FAKE_CATEGORY_FOR_INSERT, 2)
+                await cs.create_new_category(ctd.FAKE_CATEGORY_FOR_INSERT, 2)
             except HTTPException as e:
                 self.assertEqual(e.status_code, responses.CONFLICT().status_code)
 
-    def test_changeCategoryPrivacy_changes_successfully(self):
+    async def test_changeCategoryPrivacy_changes_successfully(self):
         with patch("services.categories_services.update_query", return_value=1), \
-            patch("services.categories_services.convert_status", return_value=1):
-            result = cs.change_category_privacy(17, "private")
+            patch("services.categories_services.convert_status", return_value=1), \
+            patch("services.categories_services.transaction", fake_transaction):
+            result = await cs.change_category_privacy(17, "private")
 
             expected = ctd.FAKE_CHANGE_CATEGORY_PRIVACY_RESULT
 
             self.assertEqual(200, result.status_code)
             self.assertEqual(expected, result.body.decode("utf-8"))
 
-    def test_changeCategoryPrivacy_raises_HTTPException(self):
+    async def test_changeCategoryPrivacy_raises_HTTPException(self):
         with patch("services.categories_services.update_query", return_value=0), \
-            patch("services.categories_services.convert_status", return_value=1):
+            patch("services.categories_services.convert_status", return_value=1), \
+            patch("services.categories_services.transaction", fake_transaction):
 
             expected = ctd.FAKE_CHANGE_CATEGORY_PRIVACY_EXCEPTION_STRING
 
             with self.assertRaises(HTTPException) as h:
-                cs.change_category_privacy(cat_id=17, privacy_status="private")
+                await cs.change_category_privacy(cat_id=17, privacy_status="private")
             
             self.assertEqual(404, h.exception.status_code)
             self.assertEqual(expected, h.exception.detail)
 
-    def test_giveReadAccessToUser_gives_read_access(self):
+    async def test_giveReadAccessToUser_gives_read_access(self):
         with patch("services.categories_services.update_query", return_value=1):
 
-            result = cs.give_read_access_to_user(user_id=6, cat_id=9)
+            result = await cs.give_read_access_to_user(user_id=6, cat_id=9)
 
             expected = ctd.FAKE_GIVE_READ_ACCESS_RETURN
 
             self.assertEqual(200, result.status_code)
             self.assertEqual(expected, result.body.decode("utf-8"))
 
-    def test_giveReadAccessToUser_raises_HTTPException(self):
+    async def test_giveReadAccessToUser_raises_HTTPException(self):
         with patch("services.categories_services.update_query", return_value=0):
             
             expected = ctd.FAKE_GIVE_READ_ACCESS_EXCEPTION_STRING
 
             with self.assertRaises(HTTPException) as h:
-                cs.give_read_access_to_user(user_id=6, cat_id=9)
+                await cs.give_read_access_to_user(user_id=6, cat_id=9)
             
             self.assertEqual(404, h.exception.status_code)
             self.assertEqual(expected, h.exception.detail)
     
-    def test_giveWriteAccessToUser_gives_Write_access(self):
+    async def test_giveWriteAccessToUser_gives_Write_access(self):
         with patch("services.categories_services.update_query", return_value=1):
 
-            result = cs.give_write_access_to_user(user_id=6, cat_id=9)
+            result = await cs.give_write_access_to_user(user_id=6, cat_id=9)
 
             expected = ctd.FAKE_GIVE_WRITE_ACCESS_RETURN
 
             self.assertEqual(200, result.status_code)
             self.assertEqual(expected, result.body.decode("utf-8"))
     
-    def test_giveWriteAccessToUser_raises_HTTPException(self):
+    async def test_giveWriteAccessToUser_raises_HTTPException(self):
         with patch("services.categories_services.update_query", return_value=0):
             
             expected = ctd.FAKE_GIVE_WRITE_ACCESS_EXCEPTION_STRING
 
             with self.assertRaises(HTTPException) as h:
-                cs.give_read_access_to_user(user_id=6, cat_id=9)
+                await cs.give_read_access_to_user(user_id=6, cat_id=9)
             
             self.assertEqual(404, h.exception.status_code)
             self.assertEqual(expected, h.exception.detail)
     
-    def test_lockCategoryById_locks_category(self):
+    async def test_lockCategoryById_locks_category(self):
         with patch("services.categories_services.update_query", return_value=1):
             
-            result = cs.lock_category_by_id(cat_id=10)
+            result = await cs.lock_category_by_id(cat_id=10)
             
             expected = ctd.FAKE_LOCK_CATEGORY_SUCCESSFUL_STRING
 
             self.assertEqual(200, result.status_code)
             self.assertEqual(expected, result.body.decode("utf-8"))
 
-    def test_lockCategoryById_raises_HTTPExeption(self):
+    async def test_lockCategoryById_raises_HTTPExeption(self):
         with patch("services.categories_services.update_query", return_value=0):
             
             expected = ctd.FAKE_LOCK_CATEGORY_EXCEPTION_STRING
 
             with self.assertRaises(HTTPException) as h:
-                cs.lock_category_by_id(cat_id=10)
+                await cs.lock_category_by_id(cat_id=10)
             
             self.assertEqual(404, h.exception.status_code)
             self.assertEqual(expected, h.exception.detail)
     
-    def test_revokeAccess_revokes_successfully(self):
+    async def test_revokeAccess_revokes_successfully(self):
         with patch("services.categories_services.update_query", return_value=1):
 
             expected = ctd.FAKE_REVOKE_ACCESS_SUCCESSFUL_STRING
 
-            result = cs.revoke_access(user_id=6, cat_id=8)
+            result = await cs.revoke_access(user_id=6, cat_id=8)
 
             self.assertEqual(200, result.status_code)
             self.assertEqual(expected, result.body.decode("utf-8"))
 
-    def test_revokeAccess_raises_HTTPExeption(self):
+    async def test_revokeAccess_raises_HTTPExeption(self):
         with patch("services.categories_services.update_query", return_value=0):
 
             expected = ctd.FAKE_REVOKE_ACCESS_EXCEPTION_STRING
 
             with self.assertRaises(HTTPException) as h:
-                cs.revoke_access(user_id=6, cat_id=8)
+                await cs.revoke_access(user_id=6, cat_id=8)
 
             self.assertEqual(404, h.exception.status_code)
             self.assertEqual(expected, h.exception.detail)
\ No newline at end of file
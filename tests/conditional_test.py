@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from common import conditional, page_cache
+from models.topic import Topic
+from main import app
+
+
+def fake_topic():
+    return Topic.from_query_result(1, "title", datetime(2023, 10, 19), "some topic text", 1, 2, [], False)
+
+
+async def fake_reply_rows(sql, params):
+    yield ("reply text", "user", datetime(2023, 10, 19), 0, 0, 0, 5, 1)
+
+
+class ConditionalShould(unittest.TestCase):
+
+    def test_etagMatches_weakComparison_listAndStar(self):
+        # Arrange & Act & Assert
+        self.assertTrue(conditional.etag_matches('"a", W/"b"', '"b"'))
+        self.assertTrue(conditional.etag_matches('*', '"b"'))
+        self.assertFalse(conditional.etag_matches('"a"', '"b"'))
+        self.assertFalse(conditional.etag_matches(None, '"b"'))
+
+    def test_weakEtag_changesWithVersion(self):
+        # Arrange & Act & Assert
+        self.assertTrue(conditional.weak_etag("topic", 1, 3).startswith('W/"'))
+        self.assertEqual(conditional.weak_etag("topic", 1, 3), conditional.weak_etag("topic", 1, 3))
+        self.assertNotEqual(conditional.weak_etag("topic", 1, 3), conditional.weak_etag("topic", 1, 4))
+
+    def test_httpDate_formatsNaiveUtc(self):
+        # Arrange & Act & Assert
+        self.assertEqual("Thu, 19 Oct 2023 14:21:31 GMT", conditional.http_date(datetime(2023, 10, 19, 14, 21, 31, 500)))
+
+
+class ConditionalViewsShould(unittest.TestCase):
+
+    def setUp(self):
+        page_cache.clear()
+        self.client = TestClient(app)
+
+    def test_viewTopic_returns304_withoutLoadingReplies(self):
+        # Arrange
+        etag = conditional.weak_etag("topic", 1, 7)
+        with patch('services.topics_services.get_topic_version', return_value=(7, datetime(2023, 10, 19))), \
+            patch('services.topics_services.get_topic_header') as get_topic:
+
+            # Act
+            response = self.client.get("/topics/1", headers={"If-None-Match": etag})
+
+            # Assert
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(etag, response.headers["etag"])
+            self.assertEqual("Thu, 19 Oct 2023 00:00:00 GMT", response.headers["last-modified"])
+            get_topic.assert_not_called()
+
+    def test_viewTopic_rendersWithValidators_whenVersionMoved(self):
+        # Arrange
+        with patch('services.topics_services.get_topic_version', return_value=(8, datetime(2023, 10, 19))), \
+            patch('services.topics_services.get_topic_header', return_value=fake_topic()) as get_topic, \
+            patch('services.topics_services.stream_query', side_effect=fake_reply_rows):
+
+            # Act
+            response = self.client.get("/topics/1", headers={"If-None-Match": conditional.weak_etag("topic", 1, 7)})
+
+            # Assert
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(conditional.weak_etag("topic", 1, 8), response.headers["etag"])
+            self.assertIn("reply text", response.text)
+            get_topic.assert_awaited_once()
+
+    def test_viewTopicsByCategory_returns304_ifNotModifiedSince(self):
+        # Arrange
+        with patch('services.access_services.readable_categories', return_value=None), \
+            patch('services.categories_services.get_category_version', return_value=(3, 12, datetime(2023, 10, 19))), \
+            patch('services.categories_services.get_topics_by_cat_id') as get_topics:
+
+            # Act
+            response = self.client.get("/categories/2", headers={"If-Modified-Since": "Fri, 20 Oct 2023 00:00:00 GMT"})
+
+            # Assert
+            self.assertEqual(304, response.status_code)
+            get_topics.assert_not_called()
@@ -0,0 +1,304 @@
+from unittest import TestCase, IsolatedAsyncioTestCase
+import asyncio
+import threading
+from unittest.mock import patch, MagicMock
+from contextlib import aclosing
+from data import database, async_database
+from common import tracing
+from data.pool import ConnectionPool
+
+
+def fake_pool(connect=MagicMock):
+    return ConnectionPool(connect, min_size=0, max_size=2)
+
+
+def streaming_conn(*batches, rest=()):
+    conn = MagicMock()
+    conn.cursor.return_value.fetchmany.side_effect = list(batches) + [[]]
+    conn.cursor.return_value.fetchall.return_value = list(rest)
+    return conn
+
+
+class DatabaseShould(TestCase):
+    def test_readQuery_returnsConnectionToPool(self):
+        # Arrange
+        pool = fake_pool()
+        with patch('data.database._pool', pool):
+            # Act
+            database.read_query('select 1')
+            database.read_query('select 1')
+
+            # Assert
+            self.assertEqual(1, pool.stats()['created'])
+            self.assertEqual(0, pool.stats()['in_use'])
+
+    def test_transaction_runsQueriesOnOneConnection_commitsOnce(self):
+        # Arrange
+        pool = fake_pool()
+        with patch('data.database._pool', pool):
+            # Act
+            with database.transaction():
+                database.insert_query('insert into a values (?)', (1,))
+                database.insert_query('insert into b values (?)', (2,))
+                conn = database._transaction_connection.get()
+
+            # Assert
+            self.assertEqual(1, pool.stats()['created'])
+            self.assertEqual(2, conn.cursor.return_value.execute.call_count)
+            conn.begin.assert_called_once()
+            conn.commit.assert_called_once()
+            conn.rollback.assert_not_called()
+            self.assertIsNone(database._transaction_connection.get())
+
+    def test_insertMany_sendsAllRowsInOneCall(self):
+        # Arrange
+        pool = fake_pool()
+        with patch('data.database._pool', pool):
+            # Act
+            with database.transaction():
+                database.insert_many('insert into a values (?, ?)', [(1, 2), (3, 4)])
+                conn = database._transaction_connection.get()
+
+            # Assert
+            cursor = conn.cursor.return_value
+            cursor.executemany.assert_called_once_with('insert into a values (?, ?)', [(1, 2), (3, 4)])
+            cursor.execute.assert_not_called()
+
+    def test_readQuery_recordsRowsAndErrors_inQueryStats(self):
+        # Arrange
+        pool = fake_pool()
+        stats = database.QueryStats()
+        with patch('data.database._pool', pool), patch('data.database.query_stats', stats):
+            # Act
+            with database.transaction():
+                conn = database._transaction_connection.get()
+                conn.cursor.return_value.__iter__.return_value = iter([(1,), (2,)])
+                database.read_query('select id from a where b = 5')
+                conn.cursor.return_value.execute.side_effect = ValueError()
+                with self.assertRaises(ValueError):
+                    database.read_query('select id from a where b = 6')
+
+            # Assert
+            [entry] = stats.snapshot()
+            self.assertEqual((2, 2, 1), (entry['count'], entry['rows'], entry['errors']))
+
+    def test_readQuery_addsSqlTime_toCurrentTrace(self):
+        # Arrange
+        pool = fake_pool()
+        trace = tracing.Trace("abc")
+        token = tracing.current_trace.set(trace)
+        try:
+            with patch('data.database._pool', pool):
+                # Act
+                database.read_query('select 1')
+                database.read_query('select 2')
+        finally:
+            tracing.current_trace.reset(token)
+
+        # Assert
+        self.assertEqual({"db_wait": 2, "sql": 2}, trace.counts())
+
+    def test_transaction_rollsBack_onException(self):
+        # Arrange
+        pool = fake_pool()
+        with patch('data.database._pool', pool):
+            # Act
+            with self.assertRaises(ValueError):
+                with database.transaction():
+                    database.insert_query('insert into a values (?)', (1,))
+                    conn = database._transaction_connection.get()
+                    raise ValueError()
+
+            # Assert
+            conn.commit.assert_not_called()
+            conn.rollback.assert_called_once()
+            self.assertEqual(0, pool.stats()['in_use'])
+
+    def test_rowStream_fetchesInBatches_recordsOnClose(self):
+        # Arrange
+        conn = streaming_conn([(1,), (2,)], [(3,)])
+        pool = fake_pool(lambda: conn)
+        stats = database.QueryStats()
+        with patch('data.database._pool', pool), patch('data.database.query_stats', stats):
+            # Act
+            stream = database.RowStream('select id from a where b = ?', (5,))
+            batches = [stream.fetch(2), stream.fetch(2), stream.fetch(2)]
+            in_use = pool.stats()['in_use']
+            stream.close()
+            stream.close()
+
+            # Assert
+            self.assertEqual([[(1,), (2,)], [(3,)], []], batches)
+            conn.cursor.assert_called_once_with(buffered=False)
+            conn.cursor.return_value.close.assert_called_once()
+            self.assertEqual((1, 0), (in_use, pool.stats()['in_use']))
+            [entry] = stats.snapshot()
+            self.assertEqual((1, 3), (entry['count'], entry['rows']))
+
+    def test_rowStream_release_returnsConnection_fetchesRestFromMemory(self):
+        # Arrange
+        conn = streaming_conn([(1,)], rest=[(2,), (3,)])
+        pool = fake_pool(lambda: conn)
+        with patch('data.database._pool', pool):
+            stream = database.RowStream('select id from a')
+            first = stream.fetch(1)
+
+            # Act
+            stream.release()
+
+            # Assert
+            self.assertEqual(0, pool.stats()['in_use'])
+            self.assertEqual([[(1,)], [(2,), (3,)], []], [first, stream.fetch(5), stream.fetch(5)])
+            stream.close()
+
+    def test_rowStream_readsRowsIntoMemory_whenStreamsAtLimit(self):
+        # Arrange
+        conn = streaming_conn(rest=[(1,), (2,)])
+        pool = fake_pool(lambda: conn)
+        with patch('data.database._pool', pool), patch('data.database._stream_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+
+            # Act
+            stream = database.RowStream('select id from a')
+
+            # Assert
+            self.assertEqual(0, pool.stats()['in_use'])
+            self.assertEqual([(1,), (2,)], stream.fetch(5))
+            stream.close()
+            slots.release()
+
+
+class AsyncDatabaseShould(IsolatedAsyncioTestCase):
+    async def test_transaction_runsQueriesOnOneConnection_commitsOnce(self):
+        # Arrange
+        pool = fake_pool()
+        with patch('data.database._pool', pool):
+            # Act
+            async with async_database.transaction():
+                await async_database.insert_query('insert into a values (?)', (1,))
+                await async_database.update_query('update b set c = ?', (2,))
+                conn = database._transaction_connection.get()
+
+            # Assert
+            self.assertEqual(1, pool.stats()['created'])
+            self.assertEqual(2, conn.cursor.return_value.execute.call_count)
+            conn.commit.assert_called_once()
+            self.assertEqual(0, pool.stats()['in_use'])
+
+    async def test_streamQuery_releasesConnection_whenStoppedEarly(self):
+        # Arrange
+        conn = streaming_conn([(1,), (2,)], [(3,)])
+        pool = fake_pool(lambda: conn)
+        with patch('data.database._pool', pool):
+            # Act
+            async with aclosing(async_database.stream_query('select id from a', batch_size=2)) as rows:
+                async for row in rows:
+                    break
+
+            # Assert
+            self.assertEqual((1,), row)
+            conn.cursor.return_value.close.assert_called_once()
+            self.assertEqual(0, pool.stats()['in_use'])
+
+    async def test_streamQuery_returnsConnection_cancelledDuringExecute(self):
+        # Arrange
+        running, finish = threading.Event(), threading.Event()
+        conn = streaming_conn()
+        conn.cursor.return_value.execute.side_effect = lambda *args: (running.set(), finish.wait(5))
+        pool = fake_pool(lambda: conn)
+
+        async def read():
+            async with aclosing(async_database.stream_query('select id from a')) as rows:
+                async for row in rows:
+                    pass
+
+        with patch('data.database._pool', pool), patch('data.database._stream_slots', threading.BoundedSemaphore(1)) as slots:
+            task = asyncio.create_task(read())
+            await asyncio.to_thread(running.wait, 5)
+
+            # Act
+            task.cancel()
+            finish.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.05)
+
+            # Assert
+            conn.cursor.return_value.close.assert_called_once()
+            self.assertEqual(0, pool.stats()['in_use'])
+            self.assertTrue(slots.acquire(blocking=False))
+
+    async def test_streamQuery_returnsConnection_atDeadline_whileClientReads(self):
+        # Arrange
+        conn = streaming_conn([(1,)], rest=[(2,), (3,)])
+        pool = fake_pool(lambda: conn)
+        with patch('data.database._pool', pool), patch('data.database.STREAM_TIMEOUT', 0):
+            async with aclosing(async_database.stream_query('select id from a', batch_size=1)) as rows:
+                first = await rows.__anext__()
+
+                # Act
+                await asyncio.sleep(0.1)
+
+                # Assert
+                self.assertEqual(0, pool.stats()['in_use'])
+                self.assertEqual([(1,), (2,), (3,)], [first] + [row async for row in rows])
+
+    async def test_transaction_rollsBack_afterCancelledStatementReturned(self):
+        # Arrange
+        events = []
+        running, finish = threading.Event(), threading.Event()
+        conn = MagicMock()
+
+        def slow_execute(*args):
+            running.set()
+            finish.wait(5)
+            events.append("execute done")
+
+        conn.cursor.return_value.execute.side_effect = slow_execute
+        conn.rollback.side_effect = lambda: events.append("rollback")
+        pool = fake_pool(lambda: conn)
+
+        async def work():
+            async with async_database.transaction():
+                await async_database.update_query('update a set b = 1')
+
+        with patch('data.database._pool', pool):
+            task = asyncio.create_task(work())
+            await asyncio.to_thread(running.wait, 5)
+
+            # Act
+            task.cancel()
+            await asyncio.sleep(0.05)
+            finish.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            # Assert
+            self.assertEqual(["execute done", "rollback"], events)
+            self.assertEqual(0, pool.stats()['in_use'])
+
+    async def test_transaction_returnsConnection_cancelledDuringBegin(self):
+        # Arrange
+        running, finish = threading.Event(), threading.Event()
+        conn = MagicMock()
+        conn.begin.side_effect = lambda: (running.set(), finish.wait(5))
+        pool = fake_pool(lambda: conn)
+
+        async def work():
+            async with async_database.transaction():
+                pass
+
+        with patch('data.database._pool', pool):
+            task = asyncio.create_task(work())
+            await asyncio.to_thread(running.wait, 5)
+
+            # Act
+            task.cancel()
+            finish.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.05)
+
+            # Assert
+            conn.rollback.assert_called_once()
+            self.assertEqual(0, pool.stats()['in_use'])
@@ -0,0 +1,84 @@
+from unittest import IsolatedAsyncioTestCase
+import asyncio
+import contextvars
+import threading
+from common.executor import BoundedExecutor, ExecutorBusy
+
+
+fake_request_id = contextvars.ContextVar("fake_request_id", default=None)
+
+
+class BoundedExecutorShould(IsolatedAsyncioTestCase):
+    async def test_run_returnsResult_fromWorkerThread(self):
+        # Arrange
+        executor = BoundedExecutor("test", max_workers=1)
+
+        # Act
+        result = await executor.run(lambda: threading.current_thread().name)
+
+        # Assert
+        self.assertTrue(result.startswith("test"))
+        self.assertEqual(1, executor.stats()["completed"])
+
+    async def test_run_seesCallerContextVars(self):
+        # Arrange
+        executor = BoundedExecutor("test", max_workers=1)
+        fake_request_id.set("abc")
+
+        # Act
+        result = await executor.run(fake_request_id.get)
+
+        # Assert
+        self.assertEqual("abc", result)
+
+    async def test_run_raisesExecutorBusy_queueFull(self):
+        # Arrange
+        executor = BoundedExecutor("test", max_workers=1, max_pending=0, wait_timeout=0)
+        release = threading.Event()
+        blocked = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        # Act & Assert
+        with self.assertRaises(ExecutorBusy):
+            await executor.run(lambda: None)
+        self.assertEqual(1, executor.stats()["rejected"])
+        release.set()
+        await blocked
+
+    async def test_run_waitsForSlot_queueFull(self):
+        # Arrange
+        executor = BoundedExecutor("test", max_workers=1, max_pending=0)
+        release = threading.Event()
+        blocked = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(executor.run(lambda: "done"))
+        await asyncio.sleep(0.05)
+
+        # Act
+        waiting_before_release = executor.stats()["waiting"]
+        release.set()
+
+        # Assert
+        self.assertEqual(1, waiting_before_release)
+        self.assertEqual("done", await waiting)
+        await blocked
+
+    async def test_run_cancelled_waitsForRunningCall_keepsSlot(self):
+        # Arrange
+        executor = BoundedExecutor("test", max_workers=1)
+        running, finish = threading.Event(), threading.Event()
+        done = []
+        task = asyncio.create_task(executor.run(lambda: (running.set(), finish.wait(5), done.append(True))))
+        await asyncio.to_thread(running.wait, 5)
+
+        # Act
+        task.cancel()
+        await asyncio.sleep(0.05)
+        still_waiting = not task.done()
+        finish.set()
+
+        # Assert
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(still_waiting)
+        self.assertEqual([True], done)
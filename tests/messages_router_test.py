@@ -100,7 +100,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     
     def test_getMessages_returnsValidMessages(self):
             fake_db = generate_fake_messages_db()
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.messages.get_messages', return_value=fake_db):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -118,7 +118,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     
     def test_getMessages_returnsEmptyList_noMessages(self):
             fake_db = []
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.messages.get_messages', return_value=fake_db):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -137,7 +137,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     def test_getConversationsUsers_returnsValidConversations(self):
             fake_db = generate_fake_messages_db()
             output = [[[fake_db[0][0]]]]
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.messages.get_messages_user', return_value=output):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -156,7 +156,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     
     def test_getConversationsUsers_returnsEmptyList_noMessages(self):
             output = []
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.messages.get_messages_user', return_value=output):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -175,7 +175,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     
     def test_getChat_returnsValidMessages(self):
             fake_db = generate_fake_messages_db_chat()
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.messages.get_chat_service', return_value=fake_db):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -193,7 +193,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     
     def test_getChat_returnsEmpty_noMessages(self):
             fake_db = []
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.messages.get_chat_service', return_value=fake_db):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -211,7 +211,7 @@ class MessagesRouterShould(IsolatedAsyncioTestCase):
     
     def test_postMessage_postsMessage_returnsMessgeID(self):
             fake_message = generate_fake_message()
-            with patch('routers.messages.auth.get_current_user', return_value=fake_registered_user()), \
+            with patch('routers.messages.auth.get_principal', return_value=fake_registered_user()), \
                 patch('routers.messages.post_message', return_value=30):
                 # Arrange
                 fake_user_for_test = fake_registered_user()
@@ -1,5 +1,6 @@
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, Mock
+from contextlib import asynccontextmanager
 from common import auth
 from datetime import datetime, timedelta
 from jose import jwt
@@ -88,6 +89,10 @@ def generate_fake_message():
 
 FAKE_RECIPIENTS = ["Kaloyan"]
 
+@asynccontextmanager
+async def fake_transaction():
+    yield
+
 class MessagesServicesShould(IsolatedAsyncioTestCase):
     
     async def test_getMessages_returnsCorrectMessages_userExists_correctParams(self):
@@ -95,40 +100,55 @@ class MessagesServicesShould(IsolatedAsyncioTestCase):
         fake_db = generate_fake_messages_db()
         fake_response = generate_fake_response_db(fake_db)
         with patch('services.messages_services.read_query') as read_func:
-            read_func.side_effect = [[(1,2),(2,1),(1,2)], fake_db]
+            read_func.return_value = [row + (2,) for row in fake_db]
             # act
             response = await messages_services.get_messages(user_id = 1, sort = True, paginated = True, page = 1)
             # Assert
             self.assertEqual(fake_response, response)
+            read_func.assert_awaited_once()
+            self.assertEqual((1, 1, 1, 1, 1, 10), read_func.call_args[0][1])
             
     async def test_getMessages_returnsEmpty_noMessages_userExists_correctParams(self):
         # Arrange
         fake_db = []
         fake_response = []
         with patch('services.messages_services.read_query') as read_func:
-            read_func.side_effect = [[], fake_db]
+            read_func.return_value = fake_db
             # act
             response = await messages_services.get_messages(user_id = 1, sort = True, paginated = True, page = 1)
             # Assert
             self.assertEqual(fake_response, response)
+
+    async def test_getMessages_groupsByCounterparty_pagesEachConversation(self):
+        # Arrange
+        fake_db = generate_fake_messages_db()
+        with patch('services.messages_services.read_query') as read_func:
+            read_func.return_value = [fake_db[0] + (2,), fake_db[1] + (2,), fake_db[2] + (3,)]
+            # act
+            response = await messages_services.get_messages(user_id = 1, sort = True, paginated = True, page = 2)
+            # Assert
+            self.assertEqual([[1, 2], [3]], [[message.id for message in conversation] for conversation in response])
+            self.assertIn("row_number() over (partition by", read_func.call_args[0][0])
+            self.assertEqual((11, 20), read_func.call_args[0][1][-2:])
     
     async def test_getMessagesUser_returnsCorrectMessages_userExists_correctParams(self):
         # Arrange
         fake_db = generate_fake_messages_db()
         fake_response = [generate_fake_response_db(fake_db)]
         with patch('services.messages_services.read_query') as read_func:
-            read_func.side_effect = [[("No subject")*3], fake_db]
+            read_func.return_value = [row + ("Test",) for row in fake_db]
             # act
             response = await messages_services.get_messages_user(user_id = 1, sort = True, paginated = True, page = 1, username='test')
             # Assert
             self.assertEqual(fake_response, response)
+            read_func.assert_awaited_once()
     
     async def test_getMessagesUser_returnsEmpty_NoMessages_userExists_correctParams(self):
         # Arrange
         fake_db = []
-        fake_response = [[[]]]
+        fake_response = [[]]
         with patch('services.messages_services.read_query') as read_func:
-            read_func.side_effect = [[("No subject")*3], fake_db]
+            read_func.return_value = fake_db
             # act
             response = await messages_services.get_messages_user(user_id = 1, sort = True, paginated = True, page = 1, username='test')
             # Assert
@@ -149,7 +169,8 @@ class MessagesServicesShould(IsolatedAsyncioTestCase):
         fake_response = 10
         with patch('services.messages_services.read_query') as read_func:
             read_func.side_effect = [[(5,)], [(3,)]]
-            with patch ('services.messages_services.insert_query') as insert_func:
+            with patch ('services.messages_services.insert_query') as insert_func, \
+                patch('services.messages_services.transaction', fake_transaction):
                 insert_func.side_effect = [10, None]
                 # Act
                 fake_message = generate_fake_message()
@@ -157,12 +178,37 @@ class MessagesServicesShould(IsolatedAsyncioTestCase):
                 # Assert
                 self.assertEqual(fake_response, response)
     
+    async def test_postMessage_insertsAllRecipients_oneBulkInsert(self):
+        # Arrange
+        with patch('services.messages_services.read_query', return_value=[(5,), (6,), (7,)]) as read_func, \
+            patch('services.messages_services.insert_query', return_value=10), \
+            patch('services.messages_services.insert_many', return_value=3) as insert_many_func, \
+            patch('services.messages_services.transaction', fake_transaction):
+            # Act
+            response = await messages_services.post_message(1, "Pesho, Gosho, Tosho, Pesho", "test", "blah blah")
+            # Assert
+            self.assertEqual(10, response)
+            self.assertIn("username in (?, ?, ?)", read_func.call_args[0][0])
+            self.assertEqual([(5, 10), (6, 10), (7, 10)], insert_many_func.call_args[0][1])
+
+    async def test_findUserIds_looksUpInBatches_manyRecipients(self):
+        # Arrange
+        usernames = [f"user{i}" for i in range(2500)]
+        with patch('services.messages_services.read_query', return_value=[(1,)]) as read_func:
+            # Act
+            response = await messages_services.find_user_ids(usernames)
+            # Assert
+            self.assertEqual(3, read_func.await_count)
+            self.assertEqual(500, len(read_func.call_args[0][1]))
+            self.assertEqual([1, 1, 1], response)
+    
     async def test_raisesNotFound_invalidRecipient(self):
         # Arrange
         fake_response = 10
         with patch('services.messages_services.read_query') as read_func:
             read_func.side_effect = [HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No such user(s)"), [(3,)]]
-            with patch ('services.messages_services.insert_query') as insert_func:
+            with patch ('services.messages_services.insert_query') as insert_func, \
+                patch('services.messages_services.transaction', fake_transaction):
                 insert_func.side_effect = [10, None]
                 
                 #Act
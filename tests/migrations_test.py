@@ -0,0 +1,110 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from data import migrations, query_plans
+from services import messages_services
+
+
+def write_migration(directory, version, name, up="SELECT 1;", down="SELECT 2;"):
+    for suffix, sql in (("up", up), ("down", down)):
+        with open(os.path.join(directory, f"{version:04d}_{name}.{suffix}.sql"), "w") as file:
+            file.write(sql)
+
+
+class MigrationsShould(TestCase):
+    def test_splitStatements_ignoresSemicolonsInQuotesAndComments(self):
+        # Arrange
+        sql = '''-- first; comment
+                 UPDATE a SET b = 'x;y';  /* block; comment */
+                 ALTER TABLE `c;d` ADD KEY k (e);'''
+
+        # Act
+        result = migrations.split_statements(sql)
+
+        # Assert
+        self.assertEqual(["UPDATE a SET b = 'x;y'", "ALTER TABLE `c;d` ADD KEY k (e)"], result)
+
+    def test_discover_returnsMigrationsByVersion_shippedScripts(self):
+        # Arrange & Act
+        result = migrations.discover()
+
+        # Assert
+        self.assertEqual(list(range(1, len(result) + 1)), [migration.version for migration in result])
+        for migration in result:
+            for path in (migration.up, migration.down):
+                with open(path, encoding="utf-8") as file:
+                    self.assertTrue(migrations.split_statements(file.read()), path)
+
+    def test_discover_raisesValueError_missingDownScript(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as directory:
+            write_migration(directory, 1, "first")
+            os.remove(os.path.join(directory, "0001_first.down.sql"))
+
+            # Act & Assert
+            with self.assertRaises(ValueError):
+                migrations.discover(directory)
+
+    def test_migrate_appliesPendingUpToTarget_recordsVersions(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as directory:
+            write_migration(directory, 1, "first", up="SELECT 'one';")
+            write_migration(directory, 2, "second", up="SELECT 'two'; SELECT 'two again';")
+            write_migration(directory, 3, "third", up="SELECT 'three';")
+            with patch('data.migrations.database.read_query', return_value=[(1,)]), \
+                patch('data.migrations.database.update_query') as update_func, \
+                patch('data.migrations.database.insert_query') as insert_func:
+
+                # Act
+                result = migrations.migrate(target=2, migrations=migrations.discover(directory))
+
+                # Assert
+                self.assertEqual([2], [migration.version for migration in result])
+                self.assertEqual(["SELECT 'two'", "SELECT 'two again'"], [call.args[0] for call in update_func.call_args_list[1:]])
+                self.assertEqual(2, insert_func.call_args[0][1][0])
+
+    def test_rollback_runsDownScriptsNewestFirst_deletesVersions(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as directory:
+            write_migration(directory, 1, "first", down="SELECT 'undo one';")
+            write_migration(directory, 2, "second", down="SELECT 'undo two';")
+            with patch('data.migrations.database.read_query', return_value=[(1,), (2,)]), \
+                patch('data.migrations.database.update_query') as update_func:
+
+                # Act
+                result = migrations.rollback(steps=2, migrations=migrations.discover(directory))
+
+                # Assert
+                self.assertEqual([2, 1], [migration.version for migration in result])
+                statements = [call.args[0] for call in update_func.call_args_list]
+                self.assertLess(statements.index("SELECT 'undo two'"), statements.index("SELECT 'undo one'"))
+
+
+class QueryPlansShould(TestCase):
+    def test_fullScans_reportsTablesWithTypeAll(self):
+        # Arrange
+        queries = [query_plans.HotQuery("indexed", "SELECT 1", ()), query_plans.HotQuery("scan", "SELECT 2", ())]
+        plans = [[(1, "SIMPLE", "topics", "ref", None, "idx", None, None, 1, None)],
+                 [(1, "SIMPLE", "replies", "ALL", None, None, None, None, 1000, None)]]
+        with patch('data.query_plans.database.read_query', side_effect=plans) as read_func:
+
+            # Act
+            result = query_plans.full_scans(queries)
+
+            # Assert
+            self.assertEqual([("scan", "replies")], result)
+            self.assertEqual("EXPLAIN SELECT 1", read_func.call_args_list[0].args[0])
+
+    def test_hotQueries_buildTheServiceQueries_withAllParams(self):
+        # Arrange
+        conversations_sql, _ = messages_services.conversations_query(1, True, True, 1)
+
+        # Act
+        queries = {query.name: query for query in query_plans.HOT_QUERIES}
+
+        # Assert
+        self.assertEqual(conversations_sql, queries["conversations of a user"].sql)
+        self.assertIn("c.id_category IN (?, ?)", queries["categories a user can read"].sql)
+        for query in queries.values():
+            self.assertEqual(query.sql.count("?"), len(query.params), query.name)
@@ -0,0 +1,177 @@
+import unittest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from common import page_cache
+from common.page_cache import CachedPage, PageCache, PageCacheMiddleware
+
+
+def fake_page(body: bytes = b"<html></html>") -> CachedPage:
+    return CachedPage(200, [(b"content-type", b"text/html")], body, page_cache.etag_for(body))
+
+
+def make_app(cache: PageCache) -> tuple[FastAPI, list]:
+    app = FastAPI()
+    renders = []
+
+    @app.get("/topics/{id}", response_class=HTMLResponse)
+    async def topic(id: int):
+        renders.append(id)
+        return f"<h1>topic {id}</h1>"
+
+    @app.get("/categories/{cat_id}", response_class=HTMLResponse)
+    async def category(cat_id: int):
+        renders.append(cat_id)
+        page_cache.tag(page_cache.topic_tag(7))
+        return f"<h1>category {cat_id}</h1>"
+
+    @app.get("/topics/", response_class=HTMLResponse)
+    async def topics():
+        renders.append("topics")
+
+        async def body():
+            yield b"<ul>"
+            yield b"<li>topic</li>"
+            yield b"</ul>"
+        return StreamingResponse(body(), media_type="text/html")
+
+    @app.get("/users/dashboard", response_class=HTMLResponse)
+    async def dashboard():
+        renders.append("dashboard")
+        return "<h1>dashboard</h1>"
+
+    app.add_middleware(PageCacheMiddleware, cache=cache)
+    return app, renders
+
+
+class PageCacheMiddlewareShould(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = PageCache()
+        app, self.renders = make_app(self.cache)
+        self.client = TestClient(app)
+
+    def test_call_servesSecondAnonymousRequest_fromCache(self):
+        # Act
+        first = self.client.get("/topics/1?b=2&a=1")
+        second = self.client.get("/topics/1?a=1&b=2")
+
+        # Assert
+        self.assertEqual([1], self.renders)
+        self.assertEqual(("miss", "hit"), (first.headers["x-page-cache"], second.headers["x-page-cache"]))
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(first.headers["etag"], second.headers["etag"])
+
+    def test_call_keysPagesByHost(self):
+        # Act
+        self.client.get("/topics/1", headers={"Host": "evil.example"})
+        response = self.client.get("/topics/1")
+
+        # Assert
+        self.assertEqual([1, 1], self.renders)
+        self.assertEqual("miss", response.headers["x-page-cache"])
+
+    def test_call_forwardsStreamedPage_storesItOnceComplete(self):
+        # Act
+        first = self.client.get("/topics/")
+        second = self.client.get("/topics/")
+
+        # Assert
+        self.assertEqual(["topics"], self.renders)
+        self.assertEqual(("miss", "hit"), (first.headers["x-page-cache"], second.headers["x-page-cache"]))
+        self.assertEqual("<ul><li>topic</li></ul>", second.text)
+        self.assertIn("etag", second.headers)
+
+    def test_call_returns304_whenEtagMatches(self):
+        # Arrange
+        etag = self.client.get("/topics/1").headers["etag"]
+
+        # Act
+        response = self.client.get("/topics/1", headers={"If-None-Match": f"W/{etag}"})
+
+        # Assert
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+
+    def test_call_treatsGuestTokenAsAnonymous_bypassesSignedInUsers(self):
+        # Act
+        self.client.get("/topics/1", cookies={"access_token": "dummy_access_token"})
+        self.client.get("/topics/1")
+        signed_in = self.client.get("/topics/1", cookies={"access_token": "a.real.token"})
+
+        # Assert
+        self.assertEqual([1, 1], self.renders)
+        self.assertNotIn("x-page-cache", signed_in.headers)
+
+    def test_call_skipsRoutesNotListed(self):
+        # Act
+        self.client.get("/users/dashboard")
+        self.client.get("/users/dashboard")
+
+        # Assert
+        self.assertEqual(["dashboard", "dashboard"], self.renders)
+
+    def test_invalidate_dropsPagesTaggedByView(self):
+        # Arrange
+        self.client.get("/categories/2")
+        self.client.get("/topics/3")
+
+        # Act
+        dropped = self.cache.invalidate(page_cache.topic_tag(7))
+        self.client.get("/categories/2")
+        self.client.get("/topics/3")
+
+        # Assert
+        self.assertEqual(1, dropped)
+        self.assertEqual([2, 3, 2], self.renders)
+
+
+class PageCacheShould(unittest.TestCase):
+
+    def test_set_evictsLeastRecentlyUsed_overByteBudget(self):
+        # Arrange
+        page = fake_page(b"x" * 1000)
+        cache = PageCache(max_bytes=PageCache.size(page) * 2, max_entry_bytes=10000)
+        cache.set("a", page, {"topics"}, cache.generation)
+        cache.set("b", page, {"topics"}, cache.generation)
+        cache.get("a")
+
+        # Act
+        cache.set("c", page, {"topics"}, cache.generation)
+
+        # Assert
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((2, 1), (cache.stats()["entries"], cache.stats()["evictions"]))
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_set_refuses_pageRenderedBeforeInvalidation(self):
+        # Arrange
+        cache = PageCache()
+        generation = cache.generation
+        cache.invalidate("topic:1")
+
+        # Act & Assert
+        self.assertFalse(cache.set("a", fake_page(), {"topic:1"}, generation))
+
+    def test_set_refuses_pageOverEntryLimit(self):
+        # Arrange
+        cache = PageCache(max_entry_bytes=100)
+
+        # Act & Assert
+        self.assertFalse(cache.set("a", fake_page(b"x" * 1000), set(), cache.generation))
+
+    def test_get_returnsNone_expiredPage(self):
+        # Arrange
+        cache = PageCache(ttl=60)
+        with patch("common.page_cache.time.monotonic", return_value=0):
+            cache.set("a", fake_page(), set(), cache.generation)
+
+        # Act
+        with patch("common.page_cache.time.monotonic", return_value=61):
+            result = cache.get("a")
+
+        # Assert
+        self.assertIsNone(result)
+        self.assertEqual(0, cache.stats()["bytes"])
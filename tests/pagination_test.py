@@ -0,0 +1,44 @@
+from unittest import TestCase
+from datetime import datetime
+from fastapi import HTTPException
+from common import pagination
+
+
+class PaginationShould(TestCase):
+    def test_decodeCursor_returnsEncodedPosition_withDatetime(self):
+        # Arrange
+        position = [datetime(2023, 10, 19, 10, 6, 45), 7]
+
+        # Act
+        result = pagination.decode_cursor(pagination.encode_cursor(position))
+
+        # Assert
+        self.assertEqual(position, result)
+
+    def test_decodeCursor_raisesBadRequest_tamperedCursor(self):
+        # Arrange & Act & Assert
+        with self.assertRaises(HTTPException) as context:
+            pagination.decode_cursor("not-a-cursor!")
+        self.assertEqual(400, context.exception.status_code)
+
+    def test_decodeCursor_raisesBadRequest_wrongValueTypes(self):
+        # Arrange
+        cursors = [pagination.encode_cursor(position) for position in (["2023-10-19", 7], [datetime(2023, 10, 19)], {"a": 1})]
+
+        # Act & Assert
+        for cursor in cursors:
+            with self.assertRaises(HTTPException) as context:
+                pagination.decode_cursor(cursor, (datetime, int))
+            self.assertEqual(400, context.exception.status_code)
+
+    def test_keyset_returnsExpandedCondition_descending(self):
+        # Arrange & Act
+        condition, params = pagination.keyset(("t.created_on", "t.id_topic"), ["2023-10-19", 7], descending=True)
+
+        # Assert
+        self.assertEqual("((t.created_on < ?) OR (t.created_on = ? AND t.id_topic < ?))", condition)
+        self.assertEqual(["2023-10-19", "2023-10-19", 7], params)
+
+    def test_nextCursor_returnsNone_lastPage(self):
+        # Arrange & Act & Assert
+        self.assertIsNone(pagination.next_cursor([1, 2, 3], lambda item: [item]))
@@ -0,0 +1,100 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import threading
+from data.pool import ConnectionPool, PoolTimeout
+
+
+def fake_connect():
+    return Mock()
+
+
+class ConnectionPoolShould(TestCase):
+    def test_acquire_reusesReleasedConnection(self):
+        # Arrange
+        pool = ConnectionPool(fake_connect, min_size=0, max_size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+
+        # Act
+        reused = pool.acquire()
+
+        # Assert
+        self.assertIs(conn, reused)
+        self.assertEqual(1, pool.stats()['created'])
+        self.assertEqual(1, pool.stats()['reused'])
+
+    def test_open_preopensMinSizeConnections(self):
+        # Arrange
+        connect = Mock(side_effect=fake_connect)
+        pool = ConnectionPool(connect, min_size=3, max_size=5)
+
+        # Act
+        pool.open()
+
+        # Assert
+        self.assertEqual(3, connect.call_count)
+        self.assertEqual(3, pool.stats()['idle'])
+
+    def test_acquire_raisesPoolTimeout_poolExhausted(self):
+        # Arrange
+        pool = ConnectionPool(fake_connect, min_size=0, max_size=1, checkout_timeout=0.05)
+        pool.acquire()
+
+        # Act & Assert
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(1, pool.stats()['timeouts'])
+
+    def test_acquire_waitsForReleasedConnection_poolExhausted(self):
+        # Arrange
+        pool = ConnectionPool(fake_connect, min_size=0, max_size=1, checkout_timeout=2)
+        conn = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(conn,)).start()
+
+        # Act
+        reused = pool.acquire()
+
+        # Assert
+        self.assertIs(conn, reused)
+        self.assertEqual(1, pool.stats()['waits'])
+
+    def test_acquire_replacesConnection_failedHealthCheck(self):
+        # Arrange
+        pool = ConnectionPool(fake_connect, min_size=0, max_size=1, ping_after=0)
+        broken = pool.acquire()
+        broken.ping.side_effect = Exception('gone away')
+        pool.release(broken)
+
+        # Act
+        conn = pool.acquire()
+
+        # Assert
+        self.assertIsNot(broken, conn)
+        broken.close.assert_called_once()
+        self.assertEqual(1, pool.stats()['health_check_failures'])
+
+    def test_release_closesIdleConnections_pastIdleTimeout(self):
+        # Arrange
+        pool = ConnectionPool(fake_connect, min_size=1, max_size=3, idle_timeout=0)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+
+        # Act
+        pool.release(second)
+
+        # Assert
+        self.assertEqual(1, pool.stats()['size'])
+        first.close.assert_called_once()
+
+    def test_close_closesIdleConnections(self):
+        # Arrange
+        pool = ConnectionPool(fake_connect, min_size=2, max_size=2)
+        pool.open()
+
+        # Act
+        pool.close()
+
+        # Assert
+        self.assertEqual(0, pool.stats()['size'])
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
@@ -0,0 +1,49 @@
+from unittest import TestCase
+from data.query_stats import QueryStats, fingerprint, prometheus_lines
+
+
+class QueryStatsShould(TestCase):
+    def test_fingerprint_replacesLiterals_foldsInLists(self):
+        # Arrange
+        sql = """SELECT id_user FROM users us1
+                 WHERE username IN (?, ?, ?) AND is_admin = 1 AND name = 'Pesho'"""
+
+        # Act & Assert
+        self.assertEqual("select id_user from users us1 where username in (...) and is_admin = ? and name = ?",
+                         fingerprint(sql))
+
+    def test_record_addsUpCallsOfOneQuery_differentInListLengths(self):
+        # Arrange
+        stats = QueryStats(slow_query_seconds=1)
+
+        # Act
+        stats.record("select 1 from a where b in (?)", (1,), 0.5, 0.25, 1)
+        stats.record("select 1 from a where b in (?, ?)", (1, 2), 0.5, 0.5, 2)
+
+        # Assert
+        [entry] = stats.snapshot()
+        self.assertEqual((2, 3, 0.75, 0.5, 1.0, 0), (entry['count'], entry['rows'], entry['seconds'],
+                                                    entry['max_seconds'], entry['acquire_seconds'], entry['slow']))
+
+    def test_record_logsStatementAndParams_slowQuery(self):
+        # Arrange
+        stats = QueryStats(slow_query_seconds=0.1)
+
+        # Act
+        with self.assertLogs("data.slow_queries", level="WARNING") as logs:
+            stats.record("select *\n  from topics where id_topic = ?", (7,), 0, 0.2, 1)
+
+        # Assert
+        self.assertIn("select * from topics where id_topic = ? params=(7,)", logs.output[0])
+        self.assertEqual(1, stats.snapshot()[0]['slow'])
+
+    def test_prometheusLines_escapesQueryLabel(self):
+        # Arrange
+        stats = QueryStats()
+        stats.record('select `a"b` from c', (), 0, 0.1, 1)
+
+        # Act
+        lines = prometheus_lines(stats)
+
+        # Assert
+        self.assertIn('forum_db_queries_total{query="select `a\\"b` from c"} 1', lines)
@@ -1,10 +1,88 @@
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+from contextlib import asynccontextmanager
+from datetime import datetime
+from models.reply import Reply
 from services import replies_services
 
 
-class RepliesServiceShould(unittest.TestCase):
+@asynccontextmanager
+async def fake_transaction():
+    yield
 
-    pass
 
-    # 
\ No newline at end of file
+def fake_reply():
+    return Reply(content="Reply content", topic_id=1, user_id=2, created_on=datetime(2023, 10, 19))
+
+
+class RepliesServiceShould(unittest.IsolatedAsyncioTestCase):
+
+    async def test_createReply_bumpsTopicCounters_insertsReply(self):
+        # Arrange
+        with patch('services.replies_services.transaction', fake_transaction), \
+            patch('services.replies_services.update_query', return_value=1) as update_func, \
+            patch('services.replies_services.insert_query', return_value=5) as insert_func:
+
+            # Act
+            reply = await replies_services.create_reply(fake_reply())
+
+            # Assert
+            self.assertEqual(5, reply.id)
+            self.assertIn("reply_count = reply_count + 1", update_func.call_args[0][0])
+            insert_func.assert_awaited_once()
+
+    async def test_createReply_doesNotInsert_topicLocked(self):
+        # Arrange
+        with patch('services.replies_services.transaction', fake_transaction), \
+            patch('services.replies_services.update_query', return_value=0), \
+            patch('services.replies_services.insert_query') as insert_func:
+
+            # Act
+            reply = await replies_services.create_reply(fake_reply())
+
+            # Assert
+            self.assertIsNone(reply.id)
+            insert_func.assert_not_called()
+
+    async def test_createReply_invalidatesCachedPagesOfTopic(self):
+        # Arrange
+        with patch('services.replies_services.transaction', fake_transaction), \
+            patch('services.replies_services.update_query', return_value=1), \
+            patch('services.replies_services.insert_query', return_value=5), \
+            patch('common.page_cache.invalidate') as invalidate_func:
+
+            # Act
+            await replies_services.create_reply(fake_reply())
+
+            # Assert
+            invalidate_func.assert_called_once_with("topic:1", "topics")
+
+    async def test_updateVote_movesVoteBetweenTallies_upToDown(self):
+        # Arrange
+        reply = fake_reply()
+        reply.id = 5
+        with patch('services.replies_services.transaction', fake_transaction), \
+            patch('services.replies_services.read_query', side_effect=[[(1,)], [(0, 1)]]), \
+            patch('services.replies_services.update_query', return_value=1) as update_func:
+
+            # Act
+            tallies = await replies_services.update_vote(2, reply, -1)
+
+            # Assert
+            self.assertEqual((0, 1), tallies)
+            self.assertEqual((-1, 1, 5), update_func.call_args_list[1][0][1])
+
+    async def test_removeVote_leavesTallies_noVoteToRemove(self):
+        # Arrange
+        reply = fake_reply()
+        reply.id = 5
+        with patch('services.replies_services.transaction', fake_transaction), \
+            patch('services.replies_services.read_query', side_effect=[[], [(3, 1)]]), \
+            patch('services.replies_services.update_query') as update_func:
+
+            # Act
+            tallies = await replies_services.remove_vote(reply, 2)
+
+            # Assert
+            self.assertEqual((3, 1), tallies)
+            update_func.assert_not_called()
@@ -0,0 +1,153 @@
+import logging
+import unittest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from common import request_metrics, tracing
+from common.request_metrics import RequestMetricsMiddleware, RouteMetrics
+
+
+def make_app(metrics: RouteMetrics) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/topics/{id}")
+    async def topic(id: int):
+        tracing.add("sql", 0.002)
+        with tracing.span("render"):
+            pass
+        return {"id": id, "trace": tracing.current_trace_id()}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(RequestMetricsMiddleware, metrics=metrics)
+    return app
+
+
+class RequestMetricsMiddlewareShould(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = RouteMetrics()
+        self.client = TestClient(make_app(self.metrics), raise_server_exceptions=False)
+
+    def test_call_recordsByRouteTemplate_notRawPath(self):
+        # Act
+        self.client.get("/topics/1")
+        self.client.get("/topics/2")
+        self.client.get("/nowhere")
+
+        # Assert
+        routes = {(entry['method'], entry['route']): entry for entry in self.metrics.snapshot()}
+        self.assertEqual({("GET", "/topics/{id}"), ("GET", "unmatched")}, set(routes))
+        entry = routes[("GET", "/topics/{id}")]
+        self.assertEqual(2, entry['count'])
+        self.assertEqual({200: 2}, entry['statuses'])
+        self.assertEqual(0, entry['in_flight'])
+        self.assertEqual(2, sum(entry['buckets']))
+        self.assertAlmostEqual(0.004, entry['phases']['sql'])
+        self.assertIn('render', entry['phases'])
+        self.assertEqual({404: 1}, routes[("GET", "unmatched")]['statuses'])
+
+    def test_call_returnsTraceHeaders_withBreakdown(self):
+        # Act
+        response = self.client.get("/topics/1")
+
+        # Assert
+        self.assertEqual(response.json()['trace'], response.headers['x-trace-id'])
+        self.assertIn('sql;dur=2.0;desc="1x"', response.headers['server-timing'])
+        self.assertIn('total;dur=', response.headers['server-timing'])
+
+    def test_call_keepsIncomingRequestId_whenValid(self):
+        # Act
+        kept = self.client.get("/topics/1", headers={"X-Request-ID": "proxy-42"})
+        replaced = self.client.get("/topics/1", headers={"X-Request-ID": "bad id\n"})
+
+        # Assert
+        self.assertEqual("proxy-42", kept.headers['x-trace-id'])
+        self.assertNotEqual("bad id\n", replaced.headers['x-trace-id'])
+
+    def test_call_counts500_whenEndpointRaises(self):
+        # Act
+        self.client.get("/boom")
+
+        # Assert
+        entry = self.metrics.snapshot()[0]
+        self.assertEqual({500: 1}, entry['statuses'])
+        self.assertEqual(0, entry['in_flight'])
+
+    def test_call_logsSlowRequest_withTraceId(self):
+        # Act
+        with patch('common.request_metrics.SLOW_REQUEST_SECONDS', 0), \
+                self.assertLogs("common.slow_requests", logging.WARNING) as logs:
+            response = self.client.get("/topics/7")
+
+        # Assert
+        self.assertIn(response.headers['x-trace-id'], logs.output[0])
+        self.assertIn("/topics/{id}", logs.output[0])
+        self.assertIn("sql 2.0 ms", logs.output[0])
+
+
+class RouteMetricsShould(unittest.TestCase):
+
+    def test_prometheusLines_cumulativeBuckets(self):
+        # Arrange
+        metrics = RouteMetrics(buckets=(0.1, 1.0))
+        metrics.started("GET", "/topics/{id}")
+        metrics.finished("GET", "/topics/{id}", 200, 0.05, {"sql": 0.01})
+        metrics.started("GET", "/topics/{id}")
+        metrics.finished("GET", "/topics/{id}", 200, 0.5, {})
+
+        # Act
+        lines = request_metrics.prometheus_lines(metrics)
+
+        # Assert
+        labels = 'method="GET",route="/topics/{id}"'
+        self.assertIn(f'forum_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1', lines)
+        self.assertIn(f'forum_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', lines)
+        self.assertIn(f'forum_http_request_duration_seconds_count{{{labels}}} 2', lines)
+        self.assertIn(f'forum_http_requests_total{{{labels},status="200"}} 2', lines)
+        self.assertIn(f'forum_http_request_phase_seconds_total{{{labels},phase="sql"}} 0.01', lines)
+
+    def test_reset_keepsInFlightGauge(self):
+        # Arrange
+        metrics = RouteMetrics()
+        metrics.started("GET", "/a")
+        metrics.started("GET", "/b")
+        metrics.finished("GET", "/b", 200, 0.1, {})
+
+        # Act
+        metrics.reset()
+
+        # Assert
+        snapshot = metrics.snapshot()
+        self.assertEqual(1, len(snapshot))
+        self.assertEqual(("/a", 1, 0), (snapshot[0]['route'], snapshot[0]['in_flight'], snapshot[0]['count']))
+
+
+class TraceShould(unittest.TestCase):
+
+    def test_span_addsNothing_outsideRequest(self):
+        # Act
+        with tracing.span("sql"):
+            pass
+
+        # Assert
+        self.assertIsNone(tracing.current_trace.get())
+
+    def test_span_addsPhase_toCurrentTrace(self):
+        # Arrange
+        trace = tracing.Trace("abc")
+        token = tracing.current_trace.set(trace)
+
+        # Act
+        try:
+            with tracing.span("auth"):
+                pass
+            with tracing.span("auth"):
+                pass
+        finally:
+            tracing.current_trace.reset(token)
+
+        # Assert
+        self.assertEqual({"auth": 2}, trace.counts())
@@ -0,0 +1,95 @@
+import asyncio
+import glob
+import os
+import unittest
+from common import templating, tracing
+from routers.categories import templates as categories_templates
+from routers.topics import templates as topics_templates
+from routers.users import templates as users_templates
+
+
+class TemplatingShould(unittest.TestCase):
+
+    def test_templates_shareOneEnvironment_acrossRouters(self):
+        # Arrange & Act & Assert
+        self.assertIs(templating.environment, topics_templates.env)
+        self.assertIs(templating.environment, categories_templates.env)
+        self.assertIs(templating.environment, users_templates.env)
+
+    def test_getTemplate_looksUpNamesInRouterDirectory(self):
+        # Act
+        topic = topics_templates.get_template("view_topic.html")
+        dashboard = users_templates.get_template("dashboard.html")
+
+        # Assert
+        self.assertEqual("topic_templates/view_topic.html", topic.name)
+        self.assertEqual("dashboard.html", dashboard.name)
+
+    def test_preload_compilesEveryTemplate(self):
+        # Arrange
+        expected = len(glob.glob(os.path.join(templating.TEMPLATES_DIR, "**", "*.html"), recursive=True))
+
+        # Act
+        count = templating.preload()
+
+        # Assert
+        self.assertEqual(expected, count)
+        self.assertEqual(expected, templating.template_stats()["templates"])
+
+    def test_render_addsRenderSpan_toCurrentTrace(self):
+        # Arrange
+        trace = tracing.Trace("abc")
+        token = tracing.current_trace.set(trace)
+
+        # Act
+        try:
+            templating.environment.from_string("{{ 1 + 1 }}").render()
+        finally:
+            tracing.current_trace.reset(token)
+
+        # Assert
+        self.assertEqual({"render": 1}, trace.counts())
+
+    def test_renderChunks_loopsOverRowsAsTheyArrive(self):
+        # Arrange
+        async def rows():
+            for row in range(3):
+                yield row
+
+        template = templating.streaming_environment.from_string("{% for row in rows %}<li>{{ row }}</li>{% endfor %}")
+
+        async def render():
+            return b"".join([chunk async for chunk in templating._render_chunks(template, {"rows": rows()})])
+
+        # Act
+        html = asyncio.run(render())
+
+        # Assert
+        self.assertEqual(b"<li>0</li><li>1</li><li>2</li>", html)
+
+    def test_renderChunks_closesRows_whenClientLeavesEarly(self):
+        # Arrange
+        closed = []
+
+        async def rows():
+            try:
+                for row in range(100):
+                    yield "x" * templating.STREAM_CHUNK_BYTES
+            finally:
+                closed.append(True)
+
+        template = templating.streaming_environment.from_string("{% for row in rows %}{{ row }}{% endfor %}")
+
+        async def first_chunk():
+            context = {"rows": rows()}
+            chunks = templating._render_chunks(template, context)
+            chunk = await chunks.__anext__()
+            await chunks.aclose()
+            return chunk
+
+        # Act
+        chunk = asyncio.run(first_chunk())
+
+        # Assert
+        self.assertEqual(templating.STREAM_CHUNK_BYTES, len(chunk))
+        self.assertEqual([True], closed)
@@ -123,7 +123,7 @@ class TopicsRouterShould(TestCase):
     def test_viewAllTopicsInACategory_raisesUnauthorisedErrorWithoutToken(self):
         # Arrange
         with (
-            patch('common.auth.get_current_user', return_value=urt.fake_registered_user()),
+            patch('routers.topics.get_optional_principal', return_value=urt.fake_registered_user()),
             patch('services.topics_services.view_all_topics')): 
                                  
         # Act
@@ -135,8 +135,8 @@ class TopicsRouterShould(TestCase):
     def test_viewAllTopicsInACategory_returnsEmtpyListWhenNoTopics(self):
         # Arrange
         with (
-            patch('common.auth.get_current_user', return_value=urt.fake_registered_user()),
-            patch('services.topics_services.view_all_topics', return_value = [])): 
+            patch('routers.topics.get_optional_principal', return_value=urt.fake_registered_user()),
+            patch('services.topics_services.view_all_topics', return_value = ([], None))): 
             token = ctd.FAKE_HEADERS_TOKEN_USER                    
         # Act
             response = self.client.get("/topics", headers=token)
@@ -150,9 +150,9 @@ class TopicsRouterShould(TestCase):
     def test_viewAllTopicsInACategory_returnsListWithTopics(self):
         # Arrange
         with (
-            patch('common.auth.get_current_user', return_value=urt.fake_registered_user()), 
+            patch('routers.topics.get_optional_principal', return_value=urt.fake_registered_user()), 
             patch('services.topics_services.view_all_topics', 
-                  return_value=[fake_topic])):
+                  return_value=([fake_topic], None))):
             token = ctd.FAKE_HEADERS_TOKEN_USER      
         # Act
             response = self.client.get("/topics", headers=token)
@@ -164,7 +164,7 @@ class TopicsRouterShould(TestCase):
     def test_viewTopic_returnsNotFound_ifTopicWithIdThatIsNotFound(self):
         # Arrange
         with (patch('routers.topics'), 
-              patch('services.topics_services.get_topic_by_id', return_value=None)):           
+              patch('services.topics_services.get_topic_header', return_value=None)):           
         # Act
             response = self.client.get("/topics/3")
             
@@ -175,7 +175,7 @@ class TopicsRouterShould(TestCase):
     def test_viewTopic_returnsTopic_ifTopicWithNoRepliesIsFound(self):
         # Arrange
         with (patch('routers.topics'), 
-              patch('services.topics_services.get_topic_by_id', return_value=fake_topic)):           
+              patch('services.topics_services.get_topic_header', return_value=fake_topic)):           
         # Act
             response = self.client.get("/topics/1")
             expected = fake_topic
@@ -188,7 +188,7 @@ class TopicsRouterShould(TestCase):
     def test_viewTopic_returnsTopic_ifTopicWithRepliesIsFound(self):
         # Arrange
         with (patch('routers.topics'), 
-              patch('services.topics_services.get_topic_by_id', return_value=fake_topic_with_replies)):           
+              patch('services.topics_services.get_topic_header', return_value=fake_topic_with_replies)):           
         # Act
             response = self.client.get("/topics/4")
             expected = fake_topic_with_replies
@@ -202,7 +202,7 @@ class TopicsRouterShould(TestCase):
 #   
     def test_postTopic_returnsTopic(self):
         # Arrange
-        with (patch('common.auth.get_current_user', return_value=urt.fake_registered_admin()),
+        with (patch('routers.topics.get_optional_principal', return_value=urt.fake_registered_admin()),
               patch('services.topics_services.user_has_write_access', return_value=True),
               patch('services.topics_services.create_topic', return_value=[])):
 
@@ -1,10 +1,143 @@
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+from datetime import datetime
 from services import topics_services
 
 
-class TopicsServiceShould(unittest.TestCase):
+def fake_user(id, is_admin):
+    user = Mock()
+    user.id = id
+    user.is_admin = is_admin
+    return user
 
-    pass
 
-    # 
\ No newline at end of file
+class TopicsServiceShould(unittest.IsolatedAsyncioTestCase):
+
+    def test_fulltextTerms_returnsPrefixTerms_dropsBooleanOperators(self):
+        # Arrange & Act & Assert
+        self.assertEqual("forum* Трифон*", topics_services._fulltext_terms(["+forum", "Трифон", "-*"]))
+
+    async def test_viewAllTopics_searchesFulltext_rankedByRelevance(self):
+        # Arrange
+        with patch('services.topics_services.read_query', return_value=[]) as read_func, \
+            patch('services.access_services.readable_categories', return_value=frozenset({4, 2})):
+
+            # Act
+            await topics_services.view_all_topics(search_in_title=["forum"], include_replies=False,
+                                                  user=fake_user(3, 0), default_page=2)
+
+            # Assert
+            sql, params = read_func.call_args[0]
+            self.assertIn("MATCH(t.title) AGAINST (? IN BOOLEAN MODE) DESC", sql)
+            self.assertNotIn("like", sql)
+            self.assertIn("t.id_category IN (?, ?)", sql)
+            self.assertEqual((2, 4, "forum*", "forum*", 10, 10), params)
+
+    async def test_viewAllTopics_skipsVisibilityFilter_admin(self):
+        # Arrange
+        with patch('services.topics_services.read_query', return_value=[]) as read_func:
+
+            # Act
+            await topics_services.view_all_topics(include_replies=False, paginated=False, user=fake_user(1, 1))
+
+            # Assert
+            sql, params = read_func.call_args[0]
+            self.assertNotIn("t.id_category IN", sql)
+            self.assertEqual((), params)
+
+    async def test_viewAllTopics_continuesAfterCursor_sortedByDate(self):
+        # Arrange
+        created_on = datetime(2023, 10, 19)
+        rows = [(id, f"title{id}", created_on, "some topic text", 1, 2, 0, 0) for id in range(20, 10, -1)]
+        with patch('services.topics_services.read_query', return_value=rows) as read_func, \
+            patch('services.users_services.read_query', return_value=[(2, "author")]):
+
+            # Act
+            first_page, cursor = await topics_services.view_all_topics(include_replies=False, sort_by_date=True,
+                                                                       user=fake_user(1, 1))
+            await topics_services.view_all_topics(include_replies=False, sort_by_date=True,
+                                                  user=fake_user(1, 1), cursor=cursor)
+
+            # Assert
+            sql, params = read_func.call_args[0]
+            self.assertEqual(10, len(first_page))
+            self.assertIn("(t.created_on < ?) OR (t.created_on = ? AND t.id_topic < ?)", sql)
+            self.assertEqual((created_on, created_on, 11, 10, 0), params)
+
+    async def test_viewAllTopics_loadsAuthorsOnce_perPage(self):
+        # Arrange
+        rows = [(id, f"title{id}", datetime(2023, 10, 19), "some topic text", 1, id % 2, 0, 0) for id in range(1, 5)]
+        with patch('services.topics_services.read_query', return_value=rows), \
+            patch('services.users_services.read_query', return_value=[(0, "even"), (1, "odd")]) as users_func:
+
+            # Act
+            topics, _ = await topics_services.view_all_topics(include_replies=False, user=fake_user(1, 1))
+
+            # Assert
+            self.assertEqual(["odd", "even", "odd", "even"], [topic.author_id for topic in topics])
+            self.assertEqual(((0, 1),), users_func.call_args[0][1:])
+
+    async def test_getTopicHeader_loadsNoReplies(self):
+        # Arrange
+        row = (1, "title", datetime(2023, 10, 19), "some topic text", 1, 2, 50000, 0)
+        with patch('services.topics_services.read_query', return_value=[row]) as read_func:
+
+            # Act
+            topic = await topics_services.get_topic_header(1)
+
+            # Assert
+            read_func.assert_called_once()
+            self.assertNotIn("replies r", read_func.call_args[0][0])
+            self.assertEqual(50000, topic.replies)
+
+    async def test_getTopicReplies_pagesByKeyset_afterCursor(self):
+        # Arrange
+        created_on = datetime(2023, 10, 19)
+        topic = topics_services.Topic.from_query_result(1, "title", created_on, "some topic text", 1, 2, 3, 0)
+        rows = [("reply text", "user", created_on, 0, 0, 0, id, 1) for id in range(30, 27, -1)]
+        with patch('services.topics_services.read_query', return_value=rows) as read_func:
+
+            # Act
+            topic, cursor = await topics_services.get_topic_replies(topic, page_size=3)
+            _, last_cursor = await topics_services.get_topic_replies(topic, cursor, page_size=5)
+
+            # Assert
+            sql, params = read_func.call_args[0]
+            self.assertEqual([30, 29, 28], [reply.id for reply in topic.replies])
+            self.assertIn("(r.created_on < ?) OR (r.created_on = ? AND r.id_reply < ?)", sql)
+            self.assertEqual((1, created_on, created_on, 28, 5), params)
+            self.assertIsNone(last_cursor)
+
+    async def test_streamTopicReplies_readsRowsInLoop_setsNextCursorAfter(self):
+        # Arrange
+        created_on = datetime(2023, 10, 19)
+        topic = topics_services.Topic.from_query_result(1, "title", created_on, "some topic text", 1, 2, 3, 0)
+
+        async def rows(sql, params):
+            for id in range(30, 27, -1):
+                yield ("reply text", "user", created_on, 0, 0, 1, id, 1)
+
+        with patch('services.topics_services.stream_query', side_effect=rows) as stream_func:
+
+            # Act
+            page = topics_services.stream_topic_replies(topic, page_size=3)
+            cursor_before = page.next_cursor
+            replies = [reply async for reply in page]
+
+            # Assert
+            self.assertEqual((1, 3), stream_func.call_args[0][1])
+            self.assertEqual([30, 29, 28], [reply.id for reply in replies])
+            self.assertTrue(replies[0].is_best)
+            self.assertIsNone(cursor_before)
+            self.assertEqual([created_on, 28], topics_services.pagination.decode_cursor(page.next_cursor))
+
+    async def test_getTopicById_returnsNone_whenTopicNotFound(self):
+        # Arrange
+        with patch('services.topics_services.read_query', return_value=[]) as read_func:
+
+            # Act
+            result = await topics_services.get_topic_by_id(1)
+
+            # Assert
+            self.assertEqual((None, None), result)
+            read_func.assert_called_once()
@@ -79,7 +79,7 @@ def generate_fake_access_token(fake_user_for_test):
 
 
 def generate_fake_refresh_token(fake_user_for_test, fake_access_token):
-    fake_modified_access_token = fake_pwd_context.hash(fake_access_token)
+    fake_modified_access_token = auth.bind_access_token(fake_access_token)
     fake_refresh_token_expires = fixed_now + \
         timedelta(minutes=auth.REFRESH_TOKEN_EXPIRE_MINUTES)
     fake_refresh_data = {"sub": fake_user_for_test.username,
@@ -96,7 +96,7 @@ class UsersRouterShould(IsolatedAsyncioTestCase):
     def test_registerUser_registersUser_whenCorrect(self):
         with patch('common.auth.get_time', return_value=fixed_now), \
                 patch('routers.users.users_services.register', return_value=fake_registration()),\
-                patch('routers.users.auth.authenticate_user', return_value=fake_user()):
+                patch('routers.users.auth.find_user', return_value=fake_user()):
             # Arrange
             form_data = fake_data
 
@@ -243,7 +243,7 @@ class UsersRouterShould(IsolatedAsyncioTestCase):
 
     def test_getUser_changesUserToAdmin_requestFromAdmin_validUser(self):
             with patch('common.auth.get_time', return_value=fixed_now), \
-                    patch('routers.users.auth.get_current_user', return_value=fake_registered_admin()), \
+                    patch('routers.users.auth.get_principal', return_value=fake_registered_admin()), \
                     patch('routers.users.auth.find_user', return_value=fake_registered_user()), \
                     patch('routers.users.users_services.set_admin', return_value=1):
                 # Arrange
@@ -262,7 +262,7 @@ class UsersRouterShould(IsolatedAsyncioTestCase):
     
     def test_getUser_raisesUnauthorized_requestNotFromAdmin_validUser(self):
             with patch('common.auth.get_time', return_value=fixed_now), \
-                    patch('routers.users.auth.get_current_user', return_value=fake_registered_user()), \
+                    patch('routers.users.auth.get_principal', return_value=fake_registered_user()), \
                     patch('routers.users.auth.find_user', return_value=fake_registered_user()), \
                     patch('routers.users.users_services.set_admin', return_value=1):
                 # Arrange
@@ -281,7 +281,7 @@ class UsersRouterShould(IsolatedAsyncioTestCase):
     
     def test_getUser_raisesBadrequest_requestFromAdmin_notValidUser(self):
             with patch('common.auth.get_time', return_value=fixed_now), \
-                    patch('routers.users.auth.get_current_user', return_value=fake_registered_admin()), \
+                    patch('routers.users.auth.get_principal', return_value=fake_registered_admin()), \
                     patch('routers.users.auth.find_user', return_value=None), \
                     patch('routers.users.users_services.set_admin', return_value=1):
                 # Arrange
@@ -1,37 +1,62 @@
-from unittest import TestCase
-from unittest.mock import patch
+from unittest import IsolatedAsyncioTestCase
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 from services import users_services
 from mariadb import IntegrityError
 
 
-class UsersServicesShould(TestCase):  
+class UsersServicesShould(IsolatedAsyncioTestCase):  
        
-    def test_Register_RegistersUser_validUserNamePassword(self):
+    async def test_Register_RegistersUser_validUserNamePassword(self):
         # Arrange
         with patch('services.users_services.insert_query', return_value = True):
             username = "username"
             password = "2Wsx3edc+"
             
             # Act
-            returned = users_services.register(username, password)
+            returned = await users_services.register(username, password)
 
             # Assert
             self.assertEqual((username, password), returned)
     
-    def test_Register_raisesAssertionError_notValidPassword(self):
+    async def test_Register_raisesAssertionError_notValidPassword(self):
         # Arrange
         with patch('services.users_services.insert_query', return_value = True):
             username = "username"
             password = "2Wsx3edc"
             
             # Act & Assert
-            self.assertIsInstance(users_services.register(username, password), AssertionError)
+            self.assertIsInstance(await users_services.register(username, password), AssertionError)
     
-    def test_Register_returnsNone_usernameExistsRaisesIntegrityError(self):
+    async def test_Register_returnsNone_usernameExistsRaisesIntegrityError(self):
         # Arrange
         with patch('services.users_services.insert_query', side_effect=IntegrityError):
             username = "username"
             password = "2Wsx3edc+"
             
             # Act & Assert
-            self.assertIsNone(users_services.register(username, password))
\ No newline at end of file
+            self.assertIsNone(await users_services.register(username, password))
+    async def test_usernameLoader_queriesOnlyUnseenIds_cachesNames(self):
+        # Arrange
+        loader = users_services.UsernameLoader()
+        with patch('services.users_services.read_query', side_effect=[[(1, "Pesho"), (2, "Gosho")], [(3, "Tosho")]]) as read_func:
+
+            # Act
+            await loader.load_many([2, 1, 2])
+            result = await loader.load_many([1, 3, 4])
+
+            # Assert
+            self.assertEqual({1: "Pesho", 3: "Tosho", 4: None}, result)
+            self.assertEqual((3, 4), read_func.call_args[0][1])
+            self.assertEqual(2, read_func.await_count)
+
+    def test_requestUsernames_returnsOneLoaderPerRequest(self):
+        # Arrange
+        first, second = Mock(state=SimpleNamespace()), Mock(state=SimpleNamespace())
+
+        # Act
+        loader = users_services.request_usernames(first)
+
+        # Assert
+        self.assertIs(loader, users_services.request_usernames(first))
+        self.assertIsNot(loader, users_services.request_usernames(second))